@@ -17,6 +17,8 @@ from cd_data_store import bp as cd_data_bp
 from factory_data import factory_bp
 from user_routes import user_bp
 from user_auth import user_auth
+from query_stats import add_query_stats_header
+from request_profiler import init_profiler
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -34,6 +36,11 @@ app.register_blueprint(user_tech_bp, url_prefix='/user_tech')
 app.register_blueprint(cd_data_bp)
 app.register_blueprint(user_auth, url_prefix='/auth')
 
+# Per-request query count and DB time headers for every blueprint
+app.after_request(add_query_stats_header)
+# Latency/CPU/DB percentiles per endpoint at /admin/profiling
+init_profiler(app)
+
 # Set configuration from utils
 app.config.update({
     'DB_HOST': Config.DB_HOST,
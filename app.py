@@ -11,6 +11,8 @@ from factory_data import factory_bp
 from user_routes import user_bp
 from user_auth import user_auth
 from view_master_data import view_bp
+from query_stats import add_query_stats_header
+from request_profiler import init_profiler
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'
@@ -29,6 +31,11 @@ app.register_blueprint(cd_data_bp)
 app.register_blueprint(user_auth)
 app.register_blueprint(view_bp)
 
+# Per-request query count and DB time headers for every blueprint
+app.after_request(add_query_stats_header)
+# Latency/CPU/DB percentiles per endpoint at /admin/profiling
+init_profiler(app)
+
 @app.route('/')
 def home():
     """Simple homepage with link to admin portal"""
@@ -4,7 +4,11 @@ import pandas as pd
 import os
 import re
 import pymysql
-from utils import Config, Constants, get_db_connection, load_eor_data
+from utils import Config, Constants, get_db_connection
+from eor_directory import lookup_employee
+from filter_options import record_master_data_options, filter_options_changed
+from hours_summary import refresh_employee_hours
+from metrics_cache import invalidate_metrics_cache
 
 attendance_bp = Blueprint('attendance', __name__, 
                          template_folder='templates',
@@ -29,16 +33,8 @@ def get_cd_month(date_obj):
 def get_employee_details(per_no):
     """Get employee details from EOR database"""
     try:
-        eor_data = load_eor_data()
-        if not eor_data:
-            return None
-        # Find employee in EOR data
-        emp = None
-        for record in eor_data:
-            if str(record.get('per_no', '')).strip() == str(per_no).strip():
-                emp = record
-                break
-        
+        # O(1) lookup in the shared EOR directory
+        emp = lookup_employee(per_no)
         if not emp:
             return None
         return {
@@ -170,8 +166,10 @@ def calculate_learning_hours(program_hours, day1, day2, day3):
 
 def get_program_by_qr(qr_code):
     """Get program details by QR code"""
+    conn = None
     try:
-        with get_db_connection().cursor(pymysql.cursors.DictCursor) as cursor:
+        conn = get_db_connection()
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
             cursor.execute("""
                 SELECT 
                     id AS program_id, training_name, pmo_training_category, pl_category,
@@ -214,11 +212,16 @@ def get_program_by_qr(qr_code):
     except Exception as e:
         current_app.logger.error(f"Error fetching program by QR: {e}")
         return None
+    finally:
+        if conn:
+            conn.close()
 
 def get_program_by_id(program_id):
     """Get program details by program ID"""
+    conn = None
     try:
-        with get_db_connection().cursor(pymysql.cursors.DictCursor) as cursor:
+        conn = get_db_connection()
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
             cursor.execute("""
                 SELECT 
                     id AS program_id, training_name, pmo_training_category, pl_category,
@@ -261,6 +264,9 @@ def get_program_by_id(program_id):
     except Exception as e:
         current_app.logger.error(f"Error fetching program by ID {program_id}: {e}")
         return None
+    finally:
+        if conn:
+            conn.close()
 
 def save_attendance(data):
     """Save attendance record to database"""
@@ -333,6 +339,7 @@ def save_attendance(data):
                         last_updated = NOW()
                     WHERE id = %s
                 """, (calculated_hours, data.get('email'), data.get('cordi_name'), existing['id']))
+                record_master_data_options(cursor, {'learning_hours': calculated_hours})
             else:
                 # Insert new record
                 cursor.execute("""
@@ -385,8 +392,19 @@ def save_attendance(data):
                     clean_value(data.get('cordi_name')),
                     clean_value(data.get('email'))
                 ))
+                record_master_data_options(cursor, {
+                    'calendar_month': clean_value(data.get('calendar_month')),
+                    'month_report_pmo_21_20': clean_value(data.get('month_report_pmo_21_20')),
+                    'month_cd_key_26_25': clean_value(data.get('month_cd_key_26_25')),
+                    'learning_hours': calculated_hours,
+                    'start_date': start_date
+                })
             
+            # Keep the hours summary in step within the same transaction
+            refresh_employee_hours(cursor, [data['per_no']])
             conn.commit()
+            filter_options_changed()
+            invalidate_metrics_cache()
             return {'success': True, 'learning_hours': calculated_hours}, True
             
     except Exception as e:
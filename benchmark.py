@@ -0,0 +1,517 @@
+"""Benchmarks of the dashboard, export, attendance and TNI entry points.
+
+Runs against a separate database on the local MySQL/MariaDB server (never the
+one the apps use), filled with synthetic data by benchmark_data:
+
+    python benchmark.py generate --scale 100k     # 10k, 100k, 1m or a row count
+    python benchmark.py run --repeat 5
+    python benchmark.py run --compare benchmark_results/<earlier run>.json
+    python benchmark.py all --scale 10k           # generate, then run
+
+``generate`` creates the benchmark database, copies the table definitions
+from the application database (``--schema-from``), applies db_migrations and
+replaces the data. ``run`` times each benchmark ``--repeat`` times after
+``--warmup`` untimed runs, with the metrics caches cleared before every run
+except for the ``*_cached`` / ``*_unchanged`` cases, and writes a JSON file
+with the timings, query counts (from query_stats), row counts, git commit and
+settings to ``benchmark_results/``. ``--compare`` prints the median change of
+every benchmark against an earlier file.
+
+save_attendance rows written by a run are deleted again afterwards.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pymysql
+
+import benchmark_data
+from utils import Config, connect_db, db_pool
+
+APP_DATABASE = Config.DB_NAME
+DEFAULT_DATABASE = 'masterdata_bench'
+RESULTS_DIR = 'benchmark_results'
+RESULTS_FORMAT = 1
+
+# Table definitions copied from the application database
+SCHEMA_TABLES = ('master_data', 'eor_data', 'tni_data', 'training_targets', 'training_names',
+                 'training_programs', 'nominations', 'feedback_responses')
+# Tables emptied before new data is generated
+DATA_TABLES = SCHEMA_TABLES + ('final_tni_data', 'tni_training_hashes',
+                               'employee_hours_summary', 'filter_options')
+
+BENCHMARKS = []
+
+
+def benchmark(name, http=False, warm=False):
+    """Register a benchmark; ``warm`` keeps the caches between runs, ``http``
+    cases return the test client response"""
+    def decorator(func):
+        BENCHMARKS.append({'name': name, 'func': func, 'http': http, 'warm': warm})
+        return func
+    return decorator
+
+
+def use_database(database, schema_from=APP_DATABASE):
+    if database in (schema_from, APP_DATABASE):
+        raise SystemExit(f"Refusing to benchmark against {database}: "
+                         f"benchmarks replace the data of the database they run on")
+    Config.DB_NAME = database
+    db_pool.clear()
+
+
+def _server_connection():
+    return pymysql.connect(
+        host=Config.DB_HOST,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        charset='utf8mb4',
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+
+def prepare_database(database, schema_from):
+    """Create the benchmark database with the application's table definitions"""
+    conn = _server_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}` CHARACTER SET utf8mb4")
+            for table in SCHEMA_TABLES:
+                try:
+                    cursor.execute(f"CREATE TABLE IF NOT EXISTS `{database}`.`{table}` "
+                                   f"LIKE `{schema_from}`.`{table}`")
+                except pymysql.MySQLError as e:
+                    print(f"Could not copy {table} from {schema_from}: {str(e)}")
+        conn.commit()
+    finally:
+        conn.close()
+
+    from db_migrations import run_migrations
+    from tni_shared import create_final_tni_data_table
+    create_final_tni_data_table()
+    run_migrations()
+
+
+def table_counts(tables=DATA_TABLES):
+    conn = connect_db()
+    counts = {}
+    try:
+        with conn.cursor() as cursor:
+            for table in tables:
+                try:
+                    cursor.execute(f"SELECT COUNT(*) AS row_count FROM {table}")
+                    counts[table] = cursor.fetchone()['row_count']
+                except pymysql.MySQLError:
+                    counts[table] = None
+    finally:
+        conn.close()
+    return counts
+
+
+def generate(args):
+    rows = benchmark_data.parse_scale(args.scale)
+    prepare_database(args.database, args.schema_from)
+
+    conn = connect_db()
+    try:
+        with conn.cursor() as cursor:
+            for table in DATA_TABLES:
+                try:
+                    cursor.execute(f"TRUNCATE TABLE {table}")
+                except pymysql.MySQLError as e:
+                    print(f"Could not empty {table}: {str(e)}")
+            cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        conn.commit()
+
+        start = time.perf_counter()
+        print(f"Generating {rows} master_data rows in {args.database} (seed {args.seed})")
+        counts = benchmark_data.generate_dataset(conn, rows, seed=args.seed, years=args.years,
+                                                 chunk_size=Config.BULK_INSERT_CHUNK_SIZE)
+        for table, count in counts.items():
+            print(f"  {table}: {count} rows")
+
+        with conn.cursor() as cursor:
+            for table in counts:
+                cursor.execute(f"ANALYZE TABLE {table}")
+                cursor.fetchall()
+        print(f"Generated in {time.perf_counter() - start:.1f}s")
+    finally:
+        conn.close()
+
+    from filter_options import rebuild_filter_options
+    from hours_summary import rebuild_employee_hours_summary
+    rebuild_filter_options()
+    rebuild_employee_hours_summary()
+
+
+def reset_caches():
+    from eor_directory import invalidate_eor_directory
+    from filter_options import filter_options_changed
+    from metrics_cache import invalidate_metrics_cache
+    invalidate_metrics_cache()
+    filter_options_changed()
+    invalidate_eor_directory()
+
+
+def _fetch(query, params=None):
+    conn = connect_db()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _attendance_requests(program, count):
+    """save_attendance payloads for on-roll employees not yet in ``program``"""
+    employees = _fetch("""
+        SELECT e.per_no, e.participants_name, e.bc_no, e.gender, e.employee_group,
+               e.department, e.factory
+        FROM eor_data e
+        WHERE NOT EXISTS (
+            SELECT 1 FROM master_data m
+            WHERE m.program_id = %s AND m.per_no = e.per_no
+        )
+        ORDER BY e.per_no
+        LIMIT %s
+    """, (program['id'], count))
+    payloads = []
+    for index, employee in enumerate(employees):
+        payloads.append(dict(
+            employee,
+            program_id=program['id'],
+            training_name=program['training_name'],
+            pmo_training_category=program['pmo_training_category'],
+            pl_category=program['pl_category'],
+            brsr_sq_123_category=program['brsr_sq_123_category'],
+            calendar_need_base_reschedule=program['program_type'],
+            tni_non_tni=program['tni_status'],
+            location_hall=program['location_hall'],
+            faculty_1=program['faculty_1'],
+            start_date=program['start_date'].strftime('%Y-%m-%d'),
+            end_date=program['end_date'].strftime('%Y-%m-%d'),
+            start_time=program['start_time'],
+            end_time=program['end_time'],
+            learning_hours=float(program['learning_hours'] or 8),
+            calendar_month=program['start_date'].strftime('%B'),
+            mobile_no=f"9{index:09d}",
+            cordi_name='Benchmark Coordinator',
+            email='',
+            current_day=1,
+        ))
+    return payloads
+
+
+def build_context(app, args):
+    """Inputs shared by the benchmarks, looked up once in the benchmark data"""
+    import view_master_data
+
+    factory = _fetch("""
+        SELECT factory, COUNT(*) AS row_count FROM eor_data
+        WHERE factory IS NOT NULL AND factory != ''
+        GROUP BY factory ORDER BY row_count DESC LIMIT 1
+    """)
+    factory = factory[0]['factory'] if factory else ''
+    trainings = _fetch("""
+        SELECT tp.id FROM training_programs tp
+        WHERE tp.start_date <= CURDATE()
+        AND EXISTS (
+            SELECT 1 FROM tni_data t
+            WHERE t.factory = %s AND t.training_name = tp.training_name
+        )
+        ORDER BY tp.start_date DESC, tp.id DESC
+        LIMIT 1
+    """, (factory,))
+    programs = _fetch("""
+        SELECT * FROM training_programs
+        WHERE start_date <= CURDATE()
+        ORDER BY start_date DESC, id DESC
+        LIMIT 1
+    """)
+    attendance = []
+    if programs:
+        attendance = _attendance_requests(programs[0], args.repeat + args.warmup)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+        session['role'] = 'Admin'
+        session['username'] = 'benchmark'
+        session['factory_location'] = factory
+
+    return {
+        'app': app,
+        'client': client,
+        'filters': view_master_data.get_current_filters({}),
+        'fiscal_year': benchmark_data.current_fiscal_year(),
+        'factory': factory,
+        'training_id': trainings[0]['id'] if trainings else None,
+        'attendance': attendance,
+        'attended': [],
+    }
+
+
+def cleanup_attendance(ctx):
+    """Delete the master_data rows written by the save_attendance benchmark"""
+    if not ctx['attended']:
+        return
+    from hours_summary import refresh_employee_hours
+    conn = connect_db()
+    try:
+        with conn.cursor() as cursor:
+            for program_id, per_no in ctx['attended']:
+                cursor.execute("DELETE FROM master_data WHERE program_id = %s AND per_no = %s",
+                               (program_id, per_no))
+            refresh_employee_hours(cursor, [per_no for _, per_no in ctx['attended']])
+        conn.commit()
+    finally:
+        conn.close()
+    reset_caches()
+
+
+@benchmark('calculate_dashboard_metrics')
+def bench_dashboard_metrics(ctx):
+    from view_master_data import calculate_dashboard_metrics
+    calculate_dashboard_metrics(dict(ctx['filters']))
+
+
+@benchmark('calculate_dashboard_metrics_cached', warm=True)
+def bench_dashboard_metrics_cached(ctx):
+    from view_master_data import calculate_dashboard_metrics
+    calculate_dashboard_metrics(dict(ctx['filters']))
+
+
+@benchmark('get_training_wise_metrics')
+def bench_training_wise_metrics(ctx):
+    from view_master_data import get_training_wise_metrics
+    get_training_wise_metrics(dict(ctx['filters']))
+
+
+@benchmark('download_excel', http=True)
+def bench_download_excel(ctx):
+    return ctx['client'].get('/download_excel')
+
+
+@benchmark('save_attendance')
+def bench_save_attendance(ctx):
+    from attendance_app import save_attendance
+    if not ctx['attendance']:
+        raise RuntimeError("No employees left to mark attendance for")
+    data = ctx['attendance'].pop()
+    result, success = save_attendance(data)
+    if not success:
+        raise RuntimeError(f"save_attendance failed: {result}")
+    ctx['attended'].append((data['program_id'], data['per_no']))
+
+
+@benchmark('process_training_data_full')
+def bench_process_training_data(ctx):
+    from tni_shared import process_training_data
+    process_training_data(ctx['fiscal_year'], full=True)
+
+
+@benchmark('process_training_data_unchanged', warm=True)
+def bench_process_training_data_unchanged(ctx):
+    from tni_shared import process_training_data
+    process_training_data(ctx['fiscal_year'])
+
+
+@benchmark('ciro_dashboard', http=True)
+def bench_ciro_dashboard(ctx):
+    return ctx['client'].get('/ciro/dashboard')
+
+
+@benchmark('factory_data_view', http=True)
+def bench_factory_data(ctx):
+    return ctx['client'].get('/factory-data/')
+
+
+@benchmark('factory_data_training', http=True)
+def bench_factory_data_training(ctx):
+    if ctx['training_id'] is None:
+        raise RuntimeError(f"No held training with TNI nominations for {ctx['factory']}")
+    return ctx['client'].post('/factory-data/', data={'training_id': ctx['training_id']})
+
+
+def _parse_db_header(value):
+    """'count=12; time_ms=34.5' (X-DB-Queries) -> (12, 34.5)"""
+    fields = dict(part.strip().split('=', 1) for part in (value or '').split(';') if '=' in part)
+    return int(fields.get('count', 0)), float(fields.get('time_ms', 0.0))
+
+
+def _run_once(ctx, case):
+    """(wall ms, queries, db ms, response bytes) of one run"""
+    if case['http']:
+        start = time.perf_counter()
+        response = case['func'](ctx)
+        body = response.get_data()
+        wall_ms = (time.perf_counter() - start) * 1000
+        if response.status_code >= 300:
+            raise RuntimeError(f"HTTP {response.status_code} from {case['name']}")
+        queries, db_ms = _parse_db_header(response.headers.get('X-DB-Queries'))
+        return wall_ms, queries, db_ms, len(body)
+
+    from query_stats import request_query_summary
+    with ctx['app'].test_request_context(f"/benchmark/{case['name']}"):
+        start = time.perf_counter()
+        case['func'](ctx)
+        wall_ms = (time.perf_counter() - start) * 1000
+        summary = request_query_summary()
+    return wall_ms, summary['count'], summary['total_ms'], None
+
+
+def _percentile(sorted_values, pct):
+    # Nearest rank, as on the profiling page
+    index = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def run_case(ctx, case, repeat, warmup):
+    runs = []
+    for iteration in range(warmup + repeat):
+        if not case['warm']:
+            reset_caches()
+        measured = _run_once(ctx, case)
+        if iteration >= warmup:
+            runs.append(measured)
+
+    wall = sorted(run[0] for run in runs)
+    result = {
+        'runs_ms': [round(run[0], 2) for run in runs],
+        'min_ms': round(wall[0], 2),
+        'median_ms': round(statistics.median(wall), 2),
+        'p95_ms': round(_percentile(wall, 95), 2),
+        'max_ms': round(wall[-1], 2),
+        'mean_ms': round(statistics.mean(wall), 2),
+        'queries': int(statistics.median(run[1] for run in runs)),
+        'db_ms': round(statistics.median(run[2] for run in runs), 2),
+        'cached': case['warm'],
+    }
+    if case['http']:
+        result['response_bytes'] = runs[-1][3]
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _server_version():
+    rows = _fetch("SELECT VERSION() AS version")
+    return rows[0]['version'] if rows else None
+
+
+def run(args):
+    from admin_app import app
+    from view_master_data import view_bp
+    if view_bp.name not in app.blueprints:
+        app.register_blueprint(view_bp)
+    app.config['TESTING'] = True
+
+    only = set(args.only.split(',')) if args.only else None
+    cases = [case for case in BENCHMARKS if only is None or case['name'] in only]
+    ctx = build_context(app, args)
+    results = {}
+    try:
+        for case in cases:
+            print(f"{case['name']} ...", end=' ', flush=True)
+            try:
+                results[case['name']] = run_case(ctx, case, args.repeat, args.warmup)
+                print(f"median {results[case['name']]['median_ms']} ms, "
+                      f"{results[case['name']]['queries']} queries")
+            except Exception as e:
+                results[case['name']] = {'error': str(e)}
+                print(f"failed: {str(e)}")
+    finally:
+        cleanup_attendance(ctx)
+
+    report = {
+        'format': RESULTS_FORMAT,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'server_version': _server_version(),
+        'database': Config.DB_NAME,
+        'rows': table_counts(),
+        'settings': {
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'factory': ctx['factory'],
+            'fiscal_year': ctx['fiscal_year'],
+            'db_pool_max_size': Config.DB_POOL_MAX_SIZE,
+        },
+        'benchmarks': results,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        rows = report['rows'].get('master_data') or 0
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{rows}rows.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+    return report
+
+
+def compare(previous, current):
+    """Print the median change of every benchmark between two result files"""
+    if previous.get('rows') != current.get('rows'):
+        print("Warning: the two runs used different data; row counts differ")
+    print(f"{'benchmark':36} {'before ms':>12} {'after ms':>12} {'change':>9} {'queries':>15}")
+    for name, after in current['benchmarks'].items():
+        before = previous.get('benchmarks', {}).get(name)
+        if not before or 'median_ms' not in before or 'median_ms' not in after:
+            print(f"{name:36} {'-':>12} {after.get('median_ms', '-'):>12}")
+            continue
+        change = ((after['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+                  if before['median_ms'] else 0.0)
+        queries = f"{before['queries']} -> {after['queries']}"
+        print(f"{name:36} {before['median_ms']:>12} {after['median_ms']:>12} "
+              f"{change:>+8.1f}% {queries:>15}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('command', choices=('generate', 'run', 'all'))
+    parser.add_argument('--database', default=DEFAULT_DATABASE,
+                        help=f"benchmark database (default {DEFAULT_DATABASE})")
+    parser.add_argument('--schema-from', default=APP_DATABASE,
+                        help=f"database whose tables are copied (default {APP_DATABASE})")
+    parser.add_argument('--scale', default='10k', help="master_data rows: 10k, 100k, 1m or a number")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--years', type=int, default=3, help="fiscal years of history to generate")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--only', help="comma-separated benchmark names")
+    parser.add_argument('--label', help="free text stored in the results file")
+    parser.add_argument('--output', help="results file (default benchmark_results/<time>_<rows>rows.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    use_database(args.database, args.schema_from)
+    if args.command in ('generate', 'all'):
+        generate(args)
+    if args.command in ('run', 'all'):
+        run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""Synthetic data for the benchmark database, modeled on Mastercsv.csv.
+
+Each generated session copies a random row of the master CSV for its training
+(name, PMO/PL/BRSR categories, hours, hall, faculties, times, program type,
+TNI flag) and each generated employee copies a random row for its gender,
+employee group, department, factory and BC no, so the value distributions
+and the training/factory mix follow the real data while per_no and names
+are synthetic. Everything is seeded, so the same scale and seed always give
+the same rows.
+
+Row counts scale with the number of master_data rows:
+
+* training sessions of SESSION_SIZE participants (training_programs, plus a
+  few upcoming sessions without attendance);
+* about EMPLOYEES_PER_ROW employees per row, all on roll in eor_data except
+  for LEFT_EMPLOYEE_SHARE who attended and have since left;
+* TNI_ROWS_PER_ROW nominations per row in tni_data, spread over the fiscal
+  years, with a training_targets row per training and year;
+* FEEDBACK_ROWS_PER_ROW CIRO feedback responses per row.
+
+generate_dataset() only fills tables that already exist in the connected
+database (see benchmark.prepare_database()); columns missing from a table
+are left out of its inserts.
+"""
+import csv
+import os
+import random
+from datetime import date, datetime, timedelta
+
+MASTER_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Mastercsv.csv')
+
+SESSION_SIZE = (10, 50)
+EMPLOYEES_PER_ROW = 0.45
+LEFT_EMPLOYEE_SHARE = 0.05
+TNI_ROWS_PER_ROW = 0.25
+FEEDBACK_ROWS_PER_ROW = 0.3
+UPCOMING_SESSIONS = 40
+TARGET_COVERAGE = 0.8  # Annual target as a share of the nominations
+BATCH_SIZE = 30
+FEEDBACK_SCORES = (1, 2, 3, 3, 4, 4, 4, 5, 5, 5)
+
+TRAINING_FIELDS = ('training_name', 'pmo_training_category', 'pl_category', 'brsr_sq_123_category',
+                   'calendar_need_base_reschedule', 'tni_non_tni', 'location_hall',
+                   'faculty_1', 'faculty_2', 'faculty_3', 'start_time', 'end_time', 'learning_hours')
+EMPLOYEE_FIELDS = ('per_no', 'participants_name', 'bc_no', 'gender', 'employee_group',
+                   'department', 'factory')
+
+_CSV_COLUMNS = {
+    'training_name': 'Training Name',
+    'pmo_training_category': 'PMO Training Category',
+    'pl_category': 'PL Category',
+    'brsr_sq_123_category': 'BRSR SQ 1,2,3 Category',
+    'calendar_need_base_reschedule': 'Calendar/Need base/Reschedule',
+    'tni_non_tni': 'TNI / NON TNI',
+    'location_hall': 'Location Hall',
+    'faculty_1': 'Faculty 1',
+    'faculty_2': 'Faculty 2',
+    'faculty_3': 'Faculty 3',
+    'start_time': 'Start Time',
+    'end_time': 'End Time',
+    'learning_hours': 'Learning hours',
+    'bc_no': 'BC No',
+    'gender': 'Gender',
+    'employee_group': 'Employee group',
+    'department': 'Department',
+    'factory': 'Factory',
+}
+
+MASTER_DATA_COLUMNS = ('program_id', 'calendar_month', 'month_report_pmo_21_20', 'month_cd_key_26_25',
+                       'start_date', 'end_date', 'start_time', 'end_time', 'learning_hours',
+                       'training_name', 'pmo_training_category', 'pl_category', 'brsr_sq_123_category',
+                       'calendar_need_base_reschedule', 'tni_non_tni', 'location_hall',
+                       'faculty_1', 'faculty_2', 'faculty_3', 'faculty_4',
+                       'per_no', 'participants_name', 'bc_no', 'gender', 'employee_group',
+                       'department', 'factory', 'mobile_no', 'cordi_name', 'email',
+                       'day_1_attendance', 'day_2_attendance', 'day_3_attendance')
+TRAINING_PROGRAM_COLUMNS = ('id', 'training_name', 'pmo_training_category', 'pl_category',
+                            'brsr_sq_123_category', 'location_hall', 'start_date', 'end_date',
+                            'start_time', 'end_time', 'learning_hours', 'program_type', 'tni_status',
+                            'faculty_1', 'faculty_2', 'faculty_3', 'faculty_4', 'created_at',
+                            'qr_valid_from', 'qr_valid_to', 'qr_active', 'duration_days')
+EOR_COLUMNS = ('per_no', 'participants_name', 'factory', 'department', 'gender',
+               'employee_group', 'employee_subgroup', 'bc_no')
+TNI_COLUMNS = ('per_no', 'name', 'factory', 'bc_no', 'training_name', 'hours', 'year')
+TARGET_COLUMNS = ('training_name', 'pmo_category', 'pl_category', 'target_year',
+                  'target', 'batch_size', 'is_total', 'is_grand_total')
+TRAINING_NAME_COLUMNS = ('Training_Name', 'PMO_Training_Category', 'PL_Category')
+FEEDBACK_SCORE_COLUMNS = ('sec1_q1', 'sec1_q2', 'sec2_q1', 'sec2_q2', 'sec2_q3', 'sec3_q1',
+                          'sec5_q1', 'sec5_q2', 'sec6_q1', 'sec6_q2', 'sec7_q1', 'sec7_q2')
+FEEDBACK_COLUMNS = (('program_title', 'program_date', 'participants_name')
+                    + tuple(f"trainer{n}_{field}" for n in range(1, 5)
+                            for field in ('name', 'q1', 'q2', 'q3', 'q4'))
+                    + FEEDBACK_SCORE_COLUMNS)
+
+
+def parse_scale(value):
+    """'10k' / '100k' / '1m' / '25000' -> number of master_data rows"""
+    text = str(value).strip().lower().replace('_', '')
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1000, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1000000, text[:-1]
+    rows = int(float(text) * multiplier)
+    if rows <= 0:
+        raise ValueError(f"Scale must be positive: {value}")
+    return rows
+
+
+def current_fiscal_year(today=None):
+    """Start year of the April-March fiscal year containing today"""
+    today = today or date.today()
+    return today.year if today.month >= 4 else today.year - 1
+
+
+def _clean(value):
+    value = (value or '').strip()
+    return None if value in ('', '-') else value
+
+
+def _parse_time(value):
+    value = _clean(value)
+    if not value:
+        return None
+    for fmt in ('%I:%M:%S %p', '%I:%M %p', '%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%H:%M:%S')
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_hours(value):
+    try:
+        return float(_clean(value) or 0) or 4.0
+    except ValueError:
+        return 4.0
+
+
+def load_profile(path=MASTER_CSV):
+    """Training and employee templates read from the master CSV"""
+    trainings, employees = [], []
+    with open(path, newline='', encoding='utf-8', errors='replace') as f:
+        reader = csv.DictReader(f)
+        # Some headers carry trailing spaces ("Faculty 1 ")
+        reader.fieldnames = [name.strip() for name in reader.fieldnames]
+        for row in reader:
+            values = {field: _clean(row.get(column)) for field, column in _CSV_COLUMNS.items()}
+            if not values['training_name'] or not values['factory']:
+                continue
+            values['start_time'] = _parse_time(row.get('Start Time')) or '10:30:00'
+            values['end_time'] = _parse_time(row.get('End Time')) or '14:30:00'
+            values['learning_hours'] = _parse_hours(row.get('Learning hours'))
+            trainings.append(tuple(values[field] for field in TRAINING_FIELDS))
+            employees.append(values)
+    if not trainings:
+        raise ValueError(f"No usable rows in {path}")
+    return {'trainings': trainings, 'employees': employees}
+
+
+def _month_label(day, cutoff):
+    """Reporting month of a date for a cycle that rolls over on ``cutoff``"""
+    if day.day >= cutoff:
+        day = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return day.strftime('%B')
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class DatasetWriter:
+    """Bulk-inserts generated rows, keeping only the columns each table has"""
+
+    def __init__(self, conn, chunk_size):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.counts = {}
+        self._columns = {}
+
+    def table_columns(self, table):
+        if table not in self._columns:
+            with self.conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COLUMN_NAME AS column_name
+                    FROM information_schema.COLUMNS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                """, (table,))
+                self._columns[table] = {row['column_name'].lower() for row in cursor.fetchall()}
+        return self._columns[table]
+
+    def insert(self, table, columns, rows):
+        existing = self.table_columns(table)
+        if not existing:
+            print(f"Skipping {table}: table does not exist")
+            # Still draw the rows so later tables get the same random values
+            for _ in rows:
+                pass
+            return 0
+        keep = [index for index, column in enumerate(columns) if column.lower() in existing]
+        names = [columns[index] for index in keep]
+        query = (f"INSERT INTO {table} ({', '.join(names)}) "
+                 f"VALUES ({', '.join(['%s'] * len(names))})")
+        inserted = 0
+        with self.conn.cursor() as cursor:
+            for chunk in _chunks(rows, self.chunk_size):
+                cursor.executemany(query, [tuple(row[index] for index in keep) for row in chunk])
+                inserted += len(chunk)
+                self.conn.commit()
+        self.counts[table] = self.counts.get(table, 0) + inserted
+        return inserted
+
+
+def _make_employees(rng, profile, count):
+    templates = profile['employees']
+    employees = []
+    for index in range(count):
+        template = rng.choice(templates)
+        employees.append((str(500000 + index), f"Employee {index + 1:07d}")
+                         + tuple(template[field] for field in EMPLOYEE_FIELDS[2:]))
+    return employees
+
+
+def _make_sessions(rng, profile, rows, years):
+    """(program row, participant count) pairs until ``rows`` attendances"""
+    first_year = current_fiscal_year() - years + 1
+    period_start = date(first_year, 4, 1)
+    period_days = max((date.today() - period_start).days, 1)
+    sessions = []
+    remaining = rows
+    while remaining > 0:
+        training = dict(zip(TRAINING_FIELDS, rng.choice(profile['trainings'])))
+        start = period_start + timedelta(days=rng.randrange(period_days))
+        size = min(rng.randint(*SESSION_SIZE), remaining)
+        sessions.append((training, start, size))
+        remaining -= size
+    for _ in range(UPCOMING_SESSIONS):
+        training = dict(zip(TRAINING_FIELDS, rng.choice(profile['trainings'])))
+        sessions.append((training, date.today() + timedelta(days=rng.randint(1, 60)), 0))
+    return sessions
+
+
+def _program_row(program_id, training, start):
+    valid_from = datetime.combine(start, datetime.min.time())
+    return (
+        program_id, training['training_name'], training['pmo_training_category'],
+        training['pl_category'], training['brsr_sq_123_category'], training['location_hall'],
+        start, start, training['start_time'], training['end_time'], training['learning_hours'],
+        training['calendar_need_base_reschedule'], training['tni_non_tni'],
+        training['faculty_1'], training['faculty_2'], training['faculty_3'], None,
+        valid_from, valid_from, valid_from + timedelta(days=1), False, 1,
+    )
+
+
+def _attendance_rows(rng, sessions, employees, attended):
+    for program_id, (training, start, size) in enumerate(sessions, start=1):
+        labels = (start.strftime('%B'), _month_label(start, 21), _month_label(start, 26))
+        for employee in rng.sample(employees, min(size, len(employees))):
+            attended.add(employee[0])
+            yield (
+                program_id, *labels,
+                start, start, training['start_time'], training['end_time'], training['learning_hours'],
+                training['training_name'], training['pmo_training_category'], training['pl_category'],
+                training['brsr_sq_123_category'], training['calendar_need_base_reschedule'],
+                training['tni_non_tni'], training['location_hall'],
+                training['faculty_1'], training['faculty_2'], training['faculty_3'], None,
+                *employee,
+                f"9{rng.randrange(10 ** 9):09d}", 'Benchmark Coordinator', None,
+                True, False, False,
+            )
+
+
+def _tni_rows(rng, profile, employees, rows, years, nominations):
+    first_year = current_fiscal_year() - years + 1
+    seen = set()
+    for _ in range(rows):
+        training = rng.choice(profile['trainings'])
+        employee = rng.choice(employees)
+        year = first_year + rng.randrange(years)
+        key = (employee[0], training[0], year)
+        if key in seen:
+            continue
+        seen.add(key)
+        nominations[(training[0], year)] = nominations.get((training[0], year), 0) + 1
+        yield (employee[0], employee[1], employee[6], employee[2], training[0], training[12], year)
+
+
+def _target_rows(profile, nominations):
+    categories = {training[0]: training for training in profile['trainings']}
+    for (training_name, year), count in sorted(nominations.items()):
+        training = categories[training_name]
+        yield (training_name, training[1], training[2], year,
+               max(int(count * TARGET_COVERAGE), 1), BATCH_SIZE, False, False)
+
+
+def _feedback_rows(rng, sessions, rows):
+    held = [session for session in sessions if session[2]]
+    for index in range(rows):
+        training, start, _ = rng.choice(held)
+        trainers = []
+        for n in range(1, 5):
+            name = training.get(f"faculty_{n}")
+            scores = [rng.choice(FEEDBACK_SCORES) for _ in range(4)] if name else [None] * 4
+            trainers.extend([name or ''] + scores)
+        yield ((training['training_name'], start, f"Participant {index + 1:07d}")
+               + tuple(trainers)
+               + tuple(rng.choice(FEEDBACK_SCORES) for _ in FEEDBACK_SCORE_COLUMNS))
+
+
+def generate_dataset(conn, rows, seed=42, years=3, chunk_size=1000, csv_path=MASTER_CSV):
+    """Fill the (empty) benchmark tables; returns the row count per table"""
+    rng = random.Random(seed)
+    profile = load_profile(csv_path)
+    writer = DatasetWriter(conn, chunk_size)
+
+    employees = _make_employees(rng, profile, max(int(rows * EMPLOYEES_PER_ROW), 100))
+    sessions = _make_sessions(rng, profile, rows, years)
+
+    writer.insert('training_programs', TRAINING_PROGRAM_COLUMNS,
+                  (_program_row(program_id, training, start)
+                   for program_id, (training, start, _) in enumerate(sessions, start=1)))
+
+    attended = set()
+    writer.insert('master_data', MASTER_DATA_COLUMNS,
+                  _attendance_rows(rng, sessions, employees, attended))
+
+    left = {employee[0] for employee in rng.sample(employees, int(len(employees) * LEFT_EMPLOYEE_SHARE))
+            if employee[0] in attended}
+    writer.insert('eor_data', EOR_COLUMNS,
+                  ((employee[0], employee[1], employee[6], employee[5], employee[3],
+                    employee[4], employee[4], employee[2])
+                   for employee in employees if employee[0] not in left))
+
+    nominations = {}
+    writer.insert('tni_data', TNI_COLUMNS,
+                  _tni_rows(rng, profile, employees, int(rows * TNI_ROWS_PER_ROW), years, nominations))
+    writer.insert('training_targets', TARGET_COLUMNS, _target_rows(profile, nominations))
+
+    names = {}
+    for training in profile['trainings']:
+        names.setdefault(training[0], (training[0], training[1], training[2]))
+    writer.insert('training_names', TRAINING_NAME_COLUMNS, (names[name] for name in sorted(names)))
+
+    writer.insert('feedback_responses', FEEDBACK_COLUMNS,
+                  _feedback_rows(rng, sessions, int(rows * FEEDBACK_ROWS_PER_ROW)))
+    return writer.counts
@@ -2,9 +2,10 @@
 from flask import Blueprint, request, jsonify, render_template, flash, redirect, url_for
 import pandas as pd
 import pymysql
-from utils import get_db_connection
+from utils import Config, get_db_connection
+from excel_ingest import ExcelRowStream
+from metrics_cache import invalidate_metrics_cache
 import os
-from datetime import datetime
 
 bp = Blueprint('cd_data_store', __name__, url_prefix='/cd_data_store')
 
@@ -57,65 +58,163 @@ def validate_file(file):
     
     return True, 'File validated'
 
-def validate_columns(df, required_columns):
+def validate_columns(columns, required_columns):
     """Validate if Excel contains required columns"""
-    missing = [col for col in required_columns if col not in df.columns]
+    missing = [col for col in required_columns if col not in columns]
     return missing
 
-def clean_value(value):
-    """Clean data values"""
-    if pd.isna(value):
-        return None
-    if isinstance(value, (int, float)):
-        return str(value)
-    return str(value).strip()
+def clean_column(series):
+    """Clean a column of cell values: None for blanks, otherwise the stripped text"""
+    cleaned = series.astype(str).str.strip()
+    return cleaned.where(series.notna(), None)
 
-def parse_date(date_val):
-    """Parse date from various formats"""
-    if pd.isna(date_val):
-        return None
+def parse_date_column(series):
+    """Parse a column of dates: 'YYYY-MM-DD' text and date-time cells become dates, anything else None"""
+    parsed = pd.Series(None, index=series.index, dtype=object)
+    present = series.notna()
+    is_text = present & series.map(lambda value: isinstance(value, str))
+    is_datetime = present & ~is_text & series.map(lambda value: hasattr(value, 'date'))
+    
+    if is_text.any():
+        dates = pd.to_datetime(series[is_text], format='%Y-%m-%d', errors='coerce')
+        parsed[is_text] = dates.dt.date
+    if is_datetime.any():
+        dates = pd.to_datetime(series[is_datetime], errors='coerce')
+        parsed[is_datetime] = dates.dt.date
+    return parsed.where(parsed.notna(), None)
+
+def process_data(rows, table_config):
+    """Process Excel rows, (excel_row_number, row_dict) pairs, for database insertion
+    
+    The rows are cleaned column by column as one DataFrame rather than cell by
+    cell. Returns (processed, errors) like before: valid rows as dicts, and one
+    "Row N: ..." message per rejected row.
+    """
+    if not rows:
+        return [], []
+    columns = table_config['columns']
+    # dtype=object keeps integer cells as ints instead of widening them to floats
+    df = pd.DataFrame([row for _, row in rows], index=[number for number, _ in rows], dtype=object)
     
     try:
-        if isinstance(date_val, str):
-            return datetime.strptime(date_val, '%Y-%m-%d').date()
-        elif isinstance(date_val, datetime):
-            return date_val.date()
-        elif hasattr(date_val, 'date'):
-            return date_val.date()
-        else:
-            return None
-    except (ValueError, TypeError):
-        return None
+        data = pd.DataFrame(index=df.index)
+        for col in columns:
+            if col not in df.columns:
+                data[col] = None
+            elif col == 'doj':
+                data[col] = parse_date_column(df[col])
+            else:
+                data[col] = clean_column(df[col])
+        
+        # Check required fields
+        required = table_config['required_columns']
+        missing = pd.DataFrame({req: data[req].isna() | (data[req] == '') for req in required})
+        rejected = missing.any(axis=1)
+    except Exception as e:
+        return [], [f"Rows {rows[0][0]}-{rows[-1][0]}: Error - {str(e)}"]
+    
+    errors = [f"Row {row_number}: Missing {', '.join(flags.index[flags])}"
+              for row_number, flags in missing[rejected].iterrows()]
+    processed = data[~rejected].to_dict('records')
+    return processed, errors
 
-def process_data(df, table_config):
-    """Process Excel data for database insertion"""
-    processed = []
-    errors = []
+class ChunkedInsertWriter:
+    """Multi-row INSERT writer for one CD table.
+    
+    Each write() sends one chunk through executemany(), which pymysql turns
+    into a single multi-row INSERT. Progress is logged per chunk; a chunk that
+    fails is recorded in ``errors`` as "<label>: <error>" and later chunks are
+    still attempted so every bad chunk is reported. The caller commits or
+    rolls back.
+    """
     
-    for idx, row in df.iterrows():
+    def __init__(self, cursor, table_name, total=None):
+        self.cursor = cursor
+        self.table_name = table_name
+        self.total = total
+        self.sql = insert_sql(table_name)
+        self.inserted = 0
+        self.errors = []
+    
+    def write(self, data, label):
         try:
-            data_row = {}
-            for col in table_config['columns']:
-                if col in df.columns:
-                    if col == 'doj':
-                        data_row[col] = parse_date(row[col])
-                    else:
-                        data_row[col] = clean_value(row[col])
-                else:
-                    data_row[col] = None
+            self.cursor.executemany(self.sql, row_values(self.table_name, data))
+        except pymysql.MySQLError as e:
+            self.errors.append(f"{label}: {str(e)}")
+            return False
+        self.inserted += len(data)
+        of_total = f" of {self.total}" if self.total else ""
+        print(f"{self.table_name}: inserted {self.inserted}{of_total} records")
+        return True
+
+def insert_sql(table_name):
+    """INSERT statement for one row of table_name"""
+    columns = TABLE_CONFIGS[table_name]['columns']
+    placeholders = ', '.join(['%s'] * len(columns))
+    columns_str = ', '.join(columns)
+    return f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
+
+def row_values(table_name, data):
+    """Parameter tuples for insert_sql(), in column order"""
+    columns = TABLE_CONFIGS[table_name]['columns']
+    return [tuple(row.get(col) for col in columns) for row in data]
+
+def ingest_upload(file, table_name):
+    """Stream an uploaded workbook into table_name.
+    
+    Rows are read, validated and inserted one chunk at a time inside a single
+    transaction, so memory stays bounded by the chunk size. If any row fails
+    validation the transaction is rolled back, so a bad file still inserts
+    nothing. Returns a dict whose 'status' is one of read_error,
+    missing_columns, invalid, empty, db_error or ok.
+    """
+    table_config = TABLE_CONFIGS[table_name]
+    try:
+        stream = ExcelRowStream(file)
+    except Exception as e:
+        return {'status': 'read_error', 'message': f'Error reading Excel: {str(e)}'}
+    
+    with stream:
+        missing = validate_columns(stream.columns, table_config['required_columns'])
+        if missing:
+            return {'status': 'missing_columns', 'missing': missing}
+        
+        conn = get_db_connection()
+        valid_records = 0
+        errors = []
+        try:
+            with conn.cursor() as cursor:
+                writer = ChunkedInsertWriter(cursor, table_name)
+                for chunk in stream.chunks(Config.BULK_INSERT_CHUNK_SIZE):
+                    processed, chunk_errors = process_data(chunk, table_config)
+                    errors.extend(chunk_errors)
+                    valid_records += len(processed)
+                    # Keep validating after the first error, but stop writing
+                    if not errors and processed:
+                        writer.write(processed, f"Rows {chunk[0][0]}-{chunk[-1][0]}")
+            
+            if errors:
+                conn.rollback()
+                return {'status': 'invalid', 'errors': errors, 'valid_records': valid_records}
+            if writer.errors:
+                conn.rollback()
+                return {'status': 'db_error', 'errors': writer.errors,
+                        'message': f"Database error: {writer.errors[0]}"}
+            if not valid_records:
+                conn.rollback()
+                return {'status': 'empty'}
             
-            # Check required fields
-            missing_req = [req for req in table_config['required_columns'] if not data_row.get(req)]
-            if missing_req:
-                errors.append(f"Row {idx+2}: Missing {', '.join(missing_req)}")
-                continue
-                
-            processed.append(data_row)
-                
+            conn.commit()
+            invalidate_metrics_cache(f"{table_name} data inserted")
+            return {'status': 'ok', 'count': valid_records,
+                    'message': f"Inserted {valid_records} records into {table_name}"}
+        
         except Exception as e:
-            errors.append(f"Row {idx+2}: Error - {str(e)}")
-    
-    return processed, errors
+            conn.rollback()
+            return {'status': 'db_error', 'message': f"Database error: {str(e)}"}
+        
+        finally:
+            conn.close()
 
 def insert_data(table_name, data):
     """Insert data into specified table"""
@@ -123,17 +222,17 @@ def insert_data(table_name, data):
     cursor = conn.cursor()
     
     try:
-        columns = TABLE_CONFIGS[table_name]['columns']
-        placeholders = ', '.join(['%s'] * len(columns))
-        columns_str = ', '.join(columns)
-        
-        sql = f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
-        
-        for row in data:
-            values = [row.get(col) for col in columns]
-            cursor.execute(sql, values)
+        writer = ChunkedInsertWriter(cursor, table_name, total=len(data))
+        chunk_size = Config.BULK_INSERT_CHUNK_SIZE
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start:start + chunk_size]
+            writer.write(chunk, f"Records {start + 1}-{start + len(chunk)}")
+        if writer.errors:
+            conn.rollback()
+            return False, f"Database error: {writer.errors[0]}"
         
         conn.commit()
+        invalidate_metrics_cache(f"{table_name} data inserted")
         return True, f"Inserted {len(data)} records into {table_name}"
         
     except Exception as e:
@@ -172,38 +271,23 @@ def upload_data():
             flash(msg, 'danger')
             return redirect(url_for('cd_data_store.upload_page'))
         
-        # Read Excel
-        try:
-            df = pd.read_excel(file)
-        except Exception as e:
-            flash(f'Error reading Excel: {str(e)}', 'danger')
-            return redirect(url_for('cd_data_store.upload_page'))
-        
-        # Validate columns
-        required = TABLE_CONFIGS[table_name]['required_columns']
-        missing = validate_columns(df, required)
-        if missing:
-            flash(f'Missing columns: {", ".join(missing)}', 'danger')
-            return redirect(url_for('cd_data_store.upload_page'))
-        
-        # Process data
-        processed_data, errors = process_data(df, TABLE_CONFIGS[table_name])
+        # Read, validate and insert the sheet in streamed chunks
+        result = ingest_upload(file, table_name)
+        status = result['status']
         
-        if errors:
+        if status == 'read_error':
+            flash(result['message'], 'danger')
+        elif status == 'missing_columns':
+            flash(f'Missing columns: {", ".join(result["missing"])}', 'danger')
+        elif status == 'invalid':
+            errors = result['errors']
             flash(f'Found {len(errors)} errors in data. First error: {errors[0]}', 'warning')
-            return redirect(url_for('cd_data_store.upload_page'))
-        
-        if not processed_data:
+        elif status == 'empty':
             flash('No valid data to process', 'warning')
-            return redirect(url_for('cd_data_store.upload_page'))
-        
-        # Insert data
-        success, msg = insert_data(table_name, processed_data)
-        
-        if success:
-            flash(msg, 'success')
+        elif status == 'ok':
+            flash(result['message'], 'success')
         else:
-            flash(msg, 'danger')
+            flash(result['message'], 'danger')
             
         return redirect(url_for('cd_data_store.upload_page'))
             
@@ -228,43 +312,39 @@ def api_upload_data(table_name):
         if not is_valid:
             return jsonify({'success': False, 'message': msg}), 400
         
-        # Read Excel
-        try:
-            df = pd.read_excel(file)
-        except Exception as e:
-            return jsonify({'success': False, 'message': f'Error reading Excel: {str(e)}'}), 400
+        # Read, validate and insert the sheet in streamed chunks
+        result = ingest_upload(file, table_name)
+        status = result['status']
         
-        # Validate columns
-        required = TABLE_CONFIGS[table_name]['required_columns']
-        missing = validate_columns(df, required)
-        if missing:
-            return jsonify({'success': False, 'message': f'Missing columns: {missing}'}), 400
+        if status == 'read_error':
+            return jsonify({'success': False, 'message': result['message']}), 400
         
-        # Process data
-        processed_data, errors = process_data(df, TABLE_CONFIGS[table_name])
+        if status == 'missing_columns':
+            return jsonify({'success': False, 'message': f'Missing columns: {result["missing"]}'}), 400
         
-        if errors:
+        if status == 'invalid':
             return jsonify({
                 'success': False, 
                 'message': 'Data validation errors',
-                'errors': errors[:5],
-                'valid_records': len(processed_data)
+                'errors': result['errors'][:5],
+                'valid_records': result['valid_records']
             }), 400
         
-        if not processed_data:
+        if status == 'empty':
             return jsonify({'success': False, 'message': 'No valid data to process'}), 400
         
-        # Insert data
-        success, msg = insert_data(table_name, processed_data)
-        
-        if success:
+        if status == 'ok':
             return jsonify({
                 'success': True,
-                'message': msg,
-                'records_processed': len(processed_data)
+                'message': result['message'],
+                'records_processed': result['count']
             }), 200
         else:
-            return jsonify({'success': False, 'message': msg}), 500
+            return jsonify({
+                'success': False,
+                'message': result['message'],
+                'errors': result.get('errors', [])[:5]
+            }), 500
             
     except Exception as e:
         return jsonify({'success': False, 'message': f'Unexpected error: {str(e)}'}), 500
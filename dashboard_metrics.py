@@ -0,0 +1,1283 @@
+"""Aggregate queries behind the master data dashboards.
+
+The dashboard cards used to be computed by pulling every filtered
+master_data row into Python and summing learning hours, unique learners,
+TNI matches, pending EOR and the SHE/PMO hour buckets record by record.
+This module pushes all of that into a fixed, small set of GROUP BY /
+conditional-aggregate queries that run on a single connection, so the
+cost of a dashboard render no longer grows with the number of attendance
+rows shipped to the app server.
+
+Both the admin (view_master_data) and the user technician blueprints build
+their metrics on top of these helpers.
+"""
+from collections import defaultdict
+from datetime import datetime, date
+
+import pymysql
+
+from utils import get_db_connection
+from metrics_cache import request_memoized, cached_metrics
+
+SHE_CATEGORY = 'SHE (Safety+Health)'
+
+MONTH_ORDER = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+CATEGORIES = ['PMO', 'CESS', 'Digital', 'Functional Skills',
+              'Professional Skills', SHE_CATEGORY, 'Sustainability']
+
+PL_CATEGORIES = ['PL1', 'PL2', 'PL3']
+
+MONTH_FILTER_KEYS = ('calendar_month', 'month_range_start', 'month_range_end',
+                     'month_report_pmo_21_20', 'month_cd_key_26_25')
+
+FISCAL_MONTH_ORDER = ['April', 'May', 'June', 'July', 'August', 'September',
+                      'October', 'November', 'December', 'January', 'February', 'March']
+
+
+def current_fiscal_year():
+    """Fiscal year (April-March) of today's date, e.g. 2025 for FY 2025-26"""
+    now = datetime.now()
+    return now.year if now.month >= 4 else now.year - 1
+
+
+def get_month_index(month_name=None):
+    """Calculate fiscal month index (April=1, May=2, ..., March=12 but capped at 10)"""
+    if month_name:
+        try:
+            # Find the index in fiscal order, capped at 10 for January-March
+            return min(FISCAL_MONTH_ORDER.index(month_name) + 1, 10)
+        except ValueError:
+            # If month not found, fall back to current month
+            pass
+
+    current_month = datetime.now().month
+    if current_month >= 4:  # April to December
+        return current_month - 3
+    return min(current_month + 9, 10)  # Cap at 10 for January
+
+
+def parse_fiscal_year(fiscal_year):
+    """Return the fiscal year as an int, accepting 2025, "2025" or "FY 2025-26"."""
+    if not fiscal_year:
+        return None
+    if isinstance(fiscal_year, str) and fiscal_year.startswith("FY "):
+        return int(fiscal_year.split()[1].split('-')[0])
+    return int(fiscal_year)
+
+
+def fiscal_year_range(fiscal_year):
+    """Half-open [1 April, next 1 April) date range of a fiscal year"""
+    return date(fiscal_year, 4, 1), date(fiscal_year + 1, 4, 1)
+
+
+def fiscal_year_sql(fiscal_year, column='start_date'):
+    """Sargable fiscal-year predicate: a start_date range instead of YEAR()/MONTH()"""
+    start, end = fiscal_year_range(fiscal_year)
+    return f"{column} >= %s AND {column} < %s", [start, end]
+
+
+def _parse_date(date_val):
+    """Parse the date formats accepted by the dashboard filter form"""
+    if not date_val:
+        return None
+    if isinstance(date_val, date):
+        return date_val
+    for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(date_val, fmt).date()
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def _months_in_range(month_range_start, month_range_end):
+    """Calendar months covered by a (possibly year-wrapping) month range"""
+    if not month_range_start or not month_range_end:
+        return []
+    try:
+        start_idx = MONTH_ORDER.index(month_range_start)
+        end_idx = MONTH_ORDER.index(month_range_end)
+    except ValueError:
+        return []
+    if start_idx > end_idx:
+        return MONTH_ORDER[start_idx:] + MONTH_ORDER[:end_idx + 1]
+    return MONTH_ORDER[start_idx:end_idx + 1]
+
+
+def learning_hours_sql(alias=''):
+    """SQL expression for the learning hours credited to one master_data row.
+
+    The manual learning_hours value wins when it is set and non-zero. The
+    attendance-based fallback is driven by the program hours, which are the
+    same learning_hours column, so a blank or zero value credits 0 hours.
+    Keeping the rule in SQL lets SUM/GROUP BY run inside MySQL.
+    """
+    return f"TRUNCATE(IFNULL({alias}learning_hours, 0), 0)"
+
+
+def keyset_page_sql(after_id=None, before_id=None, page_size=200):
+    """Seek condition, ORDER BY and LIMIT for keyset pagination on master_data.id.
+
+    Pages run newest first. ``after_id`` continues below the last row of the
+    current page and ``before_id`` goes back above its first row, so every
+    page is an index seek however deep it is. One extra row is fetched to
+    tell whether another page exists.
+    """
+    limit_sql = f" LIMIT {int(page_size) + 1}"
+    if before_id:
+        return " AND id > %s", [before_id], " ORDER BY id ASC" + limit_sql
+    if after_id:
+        return " AND id < %s", [after_id], " ORDER BY id DESC" + limit_sql
+    return "", [], " ORDER BY id DESC" + limit_sql
+
+
+def keyset_page(rows, after_id=None, before_id=None, page_size=200, key='sr_no'):
+    """Trim a keyset_page_sql() result to one page.
+
+    Returns (rows, next_cursor, prev_cursor); a cursor is None when there is
+    no page in that direction.
+    """
+    rows = list(rows)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before_id:
+        rows.reverse()
+        next_cursor = rows[-1][key] if rows else None
+        prev_cursor = rows[0][key] if rows and has_more else None
+    else:
+        next_cursor = rows[-1][key] if has_more else None
+        prev_cursor = rows[0][key] if rows and after_id else None
+    return rows, next_cursor, prev_cursor
+
+
+def master_data_conditions(filters, alias=''):
+    """Build the " AND ..." clauses applied by apply_standard_filters().
+
+    Returns (sql, params). ``alias`` is prefixed to every column so the same
+    filters can be applied to a joined/correlated master_data reference.
+    """
+    a = alias
+    sql = ""
+    params = []
+
+    fiscal_year = parse_fiscal_year(filters.get('fiscal_year'))
+    if fiscal_year:
+        range_sql, range_params = fiscal_year_sql(fiscal_year, f"{a}start_date")
+        sql += f" AND {range_sql}"
+        params.extend(range_params)
+
+    for key, column in (('per_no', 'per_no'), ('bc_no', 'bc_no')):
+        if filters.get(key):
+            sql += f" AND {a}{column} = %s"
+            params.append(filters[key])
+
+    if filters.get('gender') and filters['gender'] != 'All':
+        sql += f" AND {a}gender = %s"
+        params.append(filters['gender'])
+
+    for key, column in (('calendar_month', 'calendar_month'),
+                        ('month_report_pmo_21_20', 'month_report_pmo_21_20'),
+                        ('month_cd_key_26_25', 'month_cd_key_26_25'),
+                        ('tni_status', 'tni_non_tni'),
+                        ('training_name', 'training_name'),
+                        ('employee_group', 'employee_group'),
+                        ('factory', 'factory')):
+        if filters.get(key):
+            sql += f" AND {a}{column} = %s"
+            params.append(filters[key])
+
+    start_date = _parse_date(filters.get('start_date'))
+    end_date = _parse_date(filters.get('end_date'))
+    if filters.get('start_date') and filters.get('end_date') and start_date and end_date:
+        sql += f" AND {a}start_date >= %s AND {a}end_date <= %s"
+        params.extend([start_date, end_date])
+
+    pl_category = filters.get('pl_category')
+    if pl_category and pl_category != 'All':
+        sql += f" AND {a}pl_category = %s"
+        params.append(pl_category)
+
+    pmo_category = filters.get('pmo_training_category')
+    if pmo_category and pmo_category != 'All':
+        if pmo_category == 'PMO':
+            sql += f" AND {a}pmo_training_category != '{SHE_CATEGORY}'"
+        else:
+            sql += f" AND {a}pmo_training_category = %s"
+            params.append(pmo_category)
+
+    months = _months_in_range(filters.get('month_range_start'), filters.get('month_range_end'))
+    if months:
+        sql += f" AND {a}calendar_month IN ({','.join(['%s'] * len(months))})"
+        params.extend(months)
+
+    return sql, params
+
+
+def target_conditions(filters):
+    """Filters applied to final_tni_data t JOIN training_targets tt"""
+    sql = ""
+    params = []
+    fiscal_year = parse_fiscal_year(filters.get('fiscal_year'))
+    if fiscal_year:
+        sql += " AND t.year = %s AND tt.target_year = %s"
+        params.extend([fiscal_year, fiscal_year])
+    for key in ('factory', 'training_name', 'bc_no'):
+        if filters.get(key):
+            sql += f" AND t.{key} = %s"
+            params.append(filters[key])
+
+    pmo_category = filters.get('pmo_training_category')
+    if pmo_category == 'PMO':
+        sql += f" AND tt.pmo_category != '{SHE_CATEGORY}'"
+    elif pmo_category and pmo_category != 'All':
+        sql += " AND tt.pmo_category = %s"
+        params.append(pmo_category)
+
+    if filters.get('pl_category') and filters['pl_category'] != 'All':
+        sql += " AND tt.pl_category = %s"
+        params.append(filters['pl_category'])
+    return sql, params
+
+
+def tni_category_sql(selector, fiscal_year, alias='t.'):
+    """Membership test of a TNI row's training in a pmo category via training_targets.
+
+    Returns (sql, params); 'PMO' selects every non-SHE category.
+    """
+    if selector == 'PMO':
+        sql = f"{alias}training_name IN (SELECT training_name FROM training_targets WHERE pmo_category != '{SHE_CATEGORY}'"
+        params = []
+    else:
+        sql = f"{alias}training_name IN (SELECT training_name FROM training_targets WHERE pmo_category = %s"
+        params = [selector]
+    if fiscal_year:
+        sql += " AND target_year = %s"
+        params.append(fiscal_year)
+    return sql + ")", params
+
+
+def tni_conditions(filters, alias='t.'):
+    """Filters applied to tni_data; categories resolve through training_targets"""
+    a = alias
+    sql = ""
+    params = []
+    fiscal_year = parse_fiscal_year(filters.get('fiscal_year'))
+    if fiscal_year:
+        sql += f" AND {a}year = %s"
+        params.append(fiscal_year)
+    for key in ('factory', 'training_name', 'bc_no'):
+        if filters.get(key):
+            sql += f" AND {a}{key} = %s"
+            params.append(filters[key])
+
+    pmo_category = filters.get('pmo_training_category')
+    if pmo_category and pmo_category != 'All':
+        category_sql, category_params = tni_category_sql(pmo_category, fiscal_year, a)
+        sql += f" AND {category_sql}"
+        params.extend(category_params)
+
+    if filters.get('pl_category') and filters['pl_category'] != 'All':
+        sql += f" AND {a}training_name IN (SELECT training_name FROM training_targets WHERE pl_category = %s"
+        params.append(filters['pl_category'])
+        if fiscal_year:
+            sql += " AND target_year = %s"
+            params.append(fiscal_year)
+        sql += ")"
+    return sql, params
+
+
+def tni_match_conditions(filters):
+    """Extra conditions on master_data m for a TNI row to count as matched"""
+    sql = ""
+    params = []
+    fiscal_year = parse_fiscal_year(filters.get('fiscal_year'))
+    if fiscal_year:
+        range_sql, range_params = fiscal_year_sql(fiscal_year, "m.start_date")
+        sql += f" AND {range_sql}"
+        params.extend(range_params)
+    if filters.get('employee_group'):
+        sql += " AND m.employee_group = %s"
+        params.append(filters['employee_group'])
+    return sql, params
+
+
+def eor_conditions(filters, alias='e.'):
+    """Filters shared by the EOR headcount and the pending-EOR anti-join"""
+    a = alias
+    sql = ""
+    params = []
+    for key in ('factory', 'gender'):
+        if filters.get(key) and filters[key] != 'All':
+            sql += f" AND {a}{key} = %s"
+            params.append(filters[key])
+    for key in ('employee_group', 'bc_no'):
+        if filters.get(key):
+            sql += f" AND {a}{key} = %s"
+            params.append(filters[key])
+    return sql, params
+
+
+def fetch_master_totals(cursor, filters):
+    """Participant count, learning hours and unique permanent learners in one pass"""
+    where_sql, params = master_data_conditions(filters)
+    cursor.execute(f"""
+        SELECT
+            COUNT(id) AS total_records,
+            SUM({learning_hours_sql()}) AS learning_hours,
+            COUNT(DISTINCT CASE WHEN employee_group = 'PERMANENT'
+                                 AND per_no IS NOT NULL AND per_no != ''
+                                THEN per_no END) AS unique_learners
+        FROM master_data
+        WHERE 1=1 {where_sql}
+    """, params)
+    row = cursor.fetchone() or {}
+    return {
+        'total_records': int(row.get('total_records') or 0),
+        'learning_hours': int(row.get('learning_hours') or 0),
+        'unique_learners': int(row.get('unique_learners') or 0)
+    }
+
+
+def fetch_target_totals(cursor, filters):
+    """Target hours, learners and nominations from final_tni_data"""
+    where_sql, params = target_conditions(filters)
+    cursor.execute(f"""
+        SELECT
+            SUM(t.hours) AS target_hours,
+            COUNT(DISTINCT t.per_no) AS target_unique_learners,
+            COUNT(*) AS target
+        FROM final_tni_data t
+        JOIN training_targets tt ON t.training_name = tt.training_name
+        WHERE 1=1 {where_sql}
+    """, params)
+    row = cursor.fetchone() or {}
+    return {
+        'target_hours': row.get('target_hours') or 0,
+        'target_unique_learners': row.get('target_unique_learners') or 0,
+        'target': row.get('target') or 0
+    }
+
+
+def fetch_tni_totals(cursor, filters):
+    """TNI totals plus matched/remaining counts as correlated EXISTS aggregates.
+
+    matched_count counts TNI rows with an attendance record for the same
+    employee, factory and training in the selected fiscal year (and employee
+    group); remaining_count counts TNI rows with no attendance record at all,
+    exactly as the old JOIN / LEFT JOIN ... IS NULL pair did.
+    """
+    match_sql, match_params = tni_match_conditions(filters)
+    where_sql, where_params = tni_conditions(filters)
+    cursor.execute(f"""
+        SELECT
+            COUNT(*) AS tni_total_count,
+            COUNT(DISTINCT t.per_no) AS tni_unique_learners,
+            SUM(EXISTS (
+                SELECT 1 FROM master_data m
+                WHERE m.per_no = t.per_no
+                  AND m.factory = t.factory
+                  AND m.training_name = t.training_name
+                  {match_sql}
+            )) AS matched_count,
+            SUM(NOT EXISTS (
+                SELECT 1 FROM master_data m
+                WHERE m.per_no = t.per_no
+                  AND m.factory = t.factory
+                  AND m.training_name = t.training_name
+            )) AS remaining_count
+        FROM tni_data t
+        WHERE 1=1 {where_sql}
+    """, match_params + where_params)
+    row = cursor.fetchone() or {}
+    tni_metrics = {
+        'tni_total_count': int(row.get('tni_total_count') or 0),
+        'tni_unique_learners': int(row.get('tni_unique_learners') or 0),
+        'matched_count': int(row.get('matched_count') or 0),
+        'remaining_count': int(row.get('remaining_count') or 0)
+    }
+    if (tni_metrics['tni_total_count']
+            and tni_metrics['matched_count'] + tni_metrics['remaining_count'] != tni_metrics['tni_total_count']):
+        print(f"Warning: TNI counts don't match. Total: {tni_metrics['tni_total_count']}, "
+              f"Matched: {tni_metrics['matched_count']}, Remaining: {tni_metrics['remaining_count']}")
+    return tni_metrics
+
+
+def pending_eor_sql(filters):
+    """Anti-join predicate on eor_data e: never trained as PERMANENT under the filters.
+
+    Returns (sql, params). The correlated NOT EXISTS seeks the per_no-leading
+    master_data index, so pending EOR is decided in MySQL row by row instead
+    of diffing per_no sets in Python.
+    """
+    trained_sql, trained_params = eor_conditions(filters, 'm.')
+    return f"""NOT EXISTS (
+                SELECT 1 FROM master_data m
+                WHERE m.per_no = e.per_no
+                  AND m.employee_group = 'PERMANENT'
+                  {trained_sql}
+            )""", trained_params
+
+
+def fetch_eor_totals(cursor, filters):
+    """EOR headcount and pending EOR (never trained as PERMANENT) via an anti-join"""
+    eor_sql, eor_params = eor_conditions(filters, 'e.')
+    pending_sql, pending_params = pending_eor_sql(filters)
+    cursor.execute(f"""
+        SELECT
+            COUNT(DISTINCT e.per_no) AS eor_count,
+            COUNT(DISTINCT CASE WHEN {pending_sql} THEN e.per_no END) AS pending_eor_count
+        FROM eor_data e
+        WHERE e.per_no IS NOT NULL AND e.per_no != '' {eor_sql}
+    """, pending_params + eor_params)
+    row = cursor.fetchone() or {}
+    return {
+        'eor_count': int(row.get('eor_count') or 0),
+        'pending_eor_count': int(row.get('pending_eor_count') or 0)
+    }
+
+
+# Filters employee_hours_summary cannot answer: they narrow master_data
+# below the (per_no, fiscal_year, employee_group) grain of the summary
+HOURS_SUMMARY_UNSUPPORTED_FILTERS = (
+    'per_no', 'bc_no', 'calendar_month', 'month_report_pmo_21_20', 'month_cd_key_26_25',
+    'tni_status', 'training_name', 'factory', 'start_date', 'end_date',
+    'month_range_start', 'month_range_end', 'gender', 'pl_category', 'pmo_training_category',
+)
+
+
+def hours_summary_conditions(filters):
+    """Filters as (sql, params) on employee_hours_summary, or None.
+
+    None means the filters go below the summary's grain and the hours have
+    to be summed from master_data.
+    """
+    for key in HOURS_SUMMARY_UNSUPPORTED_FILTERS:
+        value = filters.get(key)
+        if value and value != 'All':
+            return None
+    sql = ""
+    params = []
+    fiscal_year = parse_fiscal_year(filters.get('fiscal_year'))
+    if fiscal_year:
+        sql += " AND fiscal_year = %s"
+        params.append(fiscal_year)
+    if filters.get('employee_group'):
+        sql += " AND employee_group = %s"
+        params.append(filters['employee_group'])
+    return sql, params
+
+
+def fetch_hours_buckets(cursor, filters):
+    """Per-employee SHE/PMO hour thresholds for PERMANENT staff, counted in SQL"""
+    hours_filters = dict(filters)
+    hours_filters['employee_group'] = 'PERMANENT'
+    bucket_keys = ('total_employees', 'she_6plus', 'pmo_10plus', 'completed_16', 'cumulative_16plus')
+    buckets_sql = """
+            COUNT(*) AS total_employees,
+            SUM(she_hours >= 6) AS she_6plus,
+            SUM(pmo_hours >= 10) AS pmo_10plus,
+            SUM(she_hours >= 6 AND pmo_hours >= 10) AS completed_16,
+            SUM(she_hours + pmo_hours >= 16) AS cumulative_16plus
+    """
+
+    summary = hours_summary_conditions(hours_filters)
+    if summary is not None:
+        summary_sql, summary_params = summary
+        try:
+            cursor.execute(f"""
+                SELECT {buckets_sql}
+                FROM (
+                    SELECT per_no, SUM(she_hours) AS she_hours, SUM(pmo_hours) AS pmo_hours
+                    FROM employee_hours_summary
+                    WHERE 1=1 {summary_sql}
+                    GROUP BY per_no
+                ) employee_hours
+            """, summary_params)
+            row = cursor.fetchone() or {}
+            return {key: int(row.get(key) or 0) for key in bucket_keys}
+        except pymysql.MySQLError as e:
+            print(f"Hours summary unavailable, summing master_data: {str(e)}")
+
+    where_sql, params = master_data_conditions(hours_filters)
+    hours = learning_hours_sql()
+    cursor.execute(f"""
+        SELECT {buckets_sql}
+        FROM (
+            SELECT
+                per_no,
+                SUM(CASE WHEN pmo_training_category = %s THEN {hours} ELSE 0 END) AS she_hours,
+                SUM(CASE WHEN pmo_training_category = %s THEN 0 ELSE {hours} END) AS pmo_hours
+            FROM master_data
+            WHERE per_no IS NOT NULL AND per_no != '' {where_sql}
+            GROUP BY per_no
+        ) employee_hours
+    """, [SHE_CATEGORY, SHE_CATEGORY] + params)
+    row = cursor.fetchone() or {}
+    return {key: int(row.get(key) or 0) for key in bucket_keys}
+
+
+def fetch_employee_hours(filters):
+    """SHE, PMO and total learning hours per PERMANENT employee, summed in SQL.
+
+    Employee details are taken from each employee's most recent record and
+    the result is ordered most recent first, like the record listing.
+    """
+    hours_filters = dict(filters)
+    hours_filters['employee_group'] = 'PERMANENT'
+    where_sql, params = master_data_conditions(hours_filters)
+    hours = learning_hours_sql()
+    employee_sql = """
+                SELECT
+                    m.per_no, m.participants_name, m.bc_no, m.gender,
+                    m.employee_group, m.department, m.factory,
+                    h.she_hours, h.pmo_hours, h.total_hours
+                FROM ({hours_sql}) h
+                JOIN master_data m ON m.id = h.last_id
+                ORDER BY h.last_id DESC
+    """
+
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    try:
+        with conn.cursor() as cursor:
+            rows = None
+            summary = hours_summary_conditions(hours_filters)
+            if summary is not None:
+                summary_sql, summary_params = summary
+                try:
+                    cursor.execute(employee_sql.format(hours_sql=f"""
+                        SELECT
+                            per_no,
+                            MAX(last_id) AS last_id,
+                            SUM(she_hours) AS she_hours,
+                            SUM(pmo_hours) AS pmo_hours,
+                            SUM(total_hours) AS total_hours
+                        FROM employee_hours_summary
+                        WHERE 1=1 {summary_sql}
+                        GROUP BY per_no
+                    """), summary_params)
+                    rows = cursor.fetchall()
+                except pymysql.MySQLError as e:
+                    print(f"Hours summary unavailable, summing master_data: {str(e)}")
+
+            if rows is None:
+                cursor.execute(employee_sql.format(hours_sql=f"""
+                    SELECT
+                        per_no,
+                        MAX(id) AS last_id,
+                        SUM(CASE WHEN pmo_training_category = %s THEN {hours} ELSE 0 END) AS she_hours,
+                        SUM(CASE WHEN pmo_training_category = %s THEN 0 ELSE {hours} END) AS pmo_hours,
+                        SUM({hours}) AS total_hours
+                    FROM master_data
+                    WHERE per_no IS NOT NULL AND per_no != '' {where_sql}
+                    GROUP BY per_no
+                """), [SHE_CATEGORY, SHE_CATEGORY] + params)
+                rows = cursor.fetchall()
+
+            employees = {}
+            for row in rows:
+                employee = dict(row)
+                for key in ('she_hours', 'pmo_hours', 'total_hours'):
+                    employee[key] = int(employee[key] or 0)
+                employees[employee['per_no']] = employee
+            return employees
+    except Exception as e:
+        print(f"Error in get_employee_hours_breakdown: {str(e)}")
+        return {}
+    finally:
+        conn.close()
+
+
+def build_hours_metrics(buckets, pending_eor_count=0):
+    """Shape hour buckets into the hours card dict, counting pending EOR as below target"""
+    total = buckets['total_employees']
+    return {
+        'completed_16_count': buckets['completed_16'],
+        'below_16_count': total - buckets['completed_16'] + pending_eor_count,
+        'she_6plus_count': buckets['she_6plus'],
+        'she_below_6_count': total - buckets['she_6plus'] + pending_eor_count,
+        'pmo_10plus_count': buckets['pmo_10plus'],
+        'pmo_below_10_count': total - buckets['pmo_10plus'] + pending_eor_count,
+        'cumulative_16plus_count': buckets['cumulative_16plus'],
+        'total_permanent': total + pending_eor_count
+    }
+
+
+def empty_hours_metrics(filters, pending_eor_count=0):
+    """Hours cards with no employees, shown when the figures cannot be computed"""
+    return build_hours_metrics(dict.fromkeys(
+        ('total_employees', 'she_6plus', 'pmo_10plus', 'completed_16', 'cumulative_16plus'), 0),
+        pending_eor_count)
+
+
+@request_memoized()
+@cached_metrics(fallback=empty_hours_metrics)
+def compute_hours_metrics(filters, pending_eor_count=0):
+    """Calculate metrics for the hours cards"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            return build_hours_metrics(fetch_hours_buckets(cursor, filters), pending_eor_count)
+    except Exception as e:
+        print(f"Error calculating hours metrics: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+
+@request_memoized()
+@cached_metrics()
+def compute_dashboard_metrics(filters, cap_adherence=False):
+    """Calculate dashboard metrics based on filters.
+
+    Runs a fixed number of aggregate queries on one connection regardless of
+    how many master_data rows match. ``cap_adherence`` limits the YTD
+    adherence percentage to 100 (used by the user technician dashboard).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            totals = fetch_master_totals(cursor, filters)
+            target_metrics = fetch_target_totals(cursor, filters)
+            tni_metrics = fetch_tni_totals(cursor, filters)
+            eor_totals = fetch_eor_totals(cursor, filters)
+            hours_metrics = build_hours_metrics(fetch_hours_buckets(cursor, filters),
+                                                eor_totals['pending_eor_count'])
+
+        total_records = totals['total_records']
+
+        # Calculate YTD metrics against the selected month (or the current one)
+        month_index = get_month_index(filters.get('calendar_month') or filters.get('month_range_end'))
+        annual_target = target_metrics['target']
+        ytd_target = (annual_target // 10) * month_index
+        balance = max(ytd_target - total_records, 0)
+
+        percentage_adherence = 0
+        if annual_target > 0 and ytd_target > 0:
+            raw_adherence = total_records / ytd_target * 100
+            if cap_adherence:
+                raw_adherence = min(raw_adherence, 100)
+            percentage_adherence = round(raw_adherence, 1)
+
+        return {
+            'participant_count': total_records,
+            'learning_hours': totals['learning_hours'],
+            'unique_learners': totals['unique_learners'],
+            'pending_eor_count': eor_totals['pending_eor_count'],
+            'eor_count': eor_totals['eor_count'],
+            'total_records': total_records,
+            'current_fiscal_year': current_fiscal_year(),
+            'target_metrics': target_metrics,
+            'tni_metrics': tni_metrics,
+            'ytd_metrics': {
+                'month_index': month_index,
+                'ytd_target': ytd_target,
+                'ytd_actual': total_records,
+                'balance': balance,
+                'annual_target': annual_target,
+                'percentage_adherence': percentage_adherence
+            },
+            'hours_metrics': hours_metrics
+        }
+
+    except Exception as e:
+        print(f"Error calculating dashboard metrics: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+
+def match_key(value):
+    """Normalise a value the way MySQL's case-insensitive '=' compares it"""
+    return str(value or '').strip().lower()
+
+
+@request_memoized()
+@cached_metrics(fallback=lambda filters, *args, **kwargs: [])
+def compute_training_wise_metrics(filters, cap_adherence=False):
+    """Annual target, YTD coverage, YTD target and adherence for every training.
+
+    Equivalent to calling compute_dashboard_metrics() once per row of
+    training_names with training_name overridden, but answered by two
+    GROUP BY training_name queries instead of a full recomputation per
+    training.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    grouped_filters = dict(filters)
+    grouped_filters['training_name'] = None
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT Training_Name, PMO_Training_Category, PL_Category
+                FROM training_names
+                ORDER BY Training_Name
+            """)
+            trainings = cursor.fetchall()
+
+            target_sql, target_params = target_conditions(grouped_filters)
+            cursor.execute(f"""
+                SELECT t.training_name, COUNT(*) AS target
+                FROM final_tni_data t
+                JOIN training_targets tt ON t.training_name = tt.training_name
+                WHERE 1=1 {target_sql}
+                GROUP BY t.training_name
+            """, target_params)
+            targets = {match_key(row['training_name']): int(row['target'] or 0)
+                       for row in cursor.fetchall()}
+
+            where_sql, params = master_data_conditions(grouped_filters)
+            cursor.execute(f"""
+                SELECT training_name, COUNT(id) AS total_records
+                FROM master_data
+                WHERE 1=1 {where_sql}
+                GROUP BY training_name
+            """, params)
+            coverage = {match_key(row['training_name']): int(row['total_records'] or 0)
+                        for row in cursor.fetchall()}
+
+        month_index = get_month_index(filters.get('calendar_month') or filters.get('month_range_end'))
+        results = []
+        for training in trainings:
+            key = match_key(training['Training_Name'])
+            annual_target = targets.get(key, 0)
+            ytd_actual = coverage.get(key, 0)
+            ytd_target = (annual_target // 10) * month_index
+
+            adherence = 0
+            if annual_target > 0 and ytd_target > 0:
+                raw_adherence = ytd_actual / ytd_target * 100
+                if cap_adherence:
+                    raw_adherence = min(raw_adherence, 100)
+                adherence = round(raw_adherence, 1)
+
+            results.append({
+                'training_name': training['Training_Name'],
+                'pmo_category': training['PMO_Training_Category'],
+                'pl_category': training['PL_Category'],
+                'annual_target': annual_target,
+                'ytd_coverage': ytd_actual,
+                'ytd_target': ytd_target,
+                'adherence': adherence
+            })
+        return results
+
+    except Exception as e:
+        print(f"Error getting training-wise metrics: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+
+def pmo_category_sql(selector, column='pmo_training_category'):
+    """SQL predicate (sql, params) for a pmo_training_category filter value"""
+    if not selector or selector == 'All':
+        return "1=1", []
+    if selector == 'PMO':
+        return f"{column} != '{SHE_CATEGORY}'", []
+    return f"{column} = %s", [selector]
+
+
+def _matches_pmo(selector, value):
+    """Python twin of pmo_category_sql() used to slice cube cells"""
+    if not selector or selector == 'All':
+        return True
+    if value is None:
+        return False
+    if selector == 'PMO':
+        return match_key(value) != match_key(SHE_CATEGORY)
+    return match_key(value) == match_key(selector)
+
+
+def _matches_pl(pl_category, value):
+    """Python twin of the pl_category filter used to slice cube cells"""
+    if not pl_category or pl_category == 'All':
+        return True
+    return value is not None and match_key(value) == match_key(pl_category)
+
+
+def _empty_pl_counts():
+    return {pl: {'unique_learners_count': 0, 'annual_target': 0, 'ytd_coverage': 0,
+                 'ytd_target': 0, 'adherence': 0} for pl in PL_CATEGORIES}
+
+
+class MetricsCube:
+    """Target, actual and learner aggregates for one set of dashboard filters.
+
+    master_data is aggregated once by (pl_category, pmo_training_category,
+    calendar_month, month_report_pmo_21_20, month_cd_key_26_25) and targets
+    once by (pl_category, pmo_category); the PL, category, month-wise and
+    annual panels then slice those cells in Python instead of re-running the
+    dashboard metrics per PL and per category. Distinct learners, TNI matches
+    and per-employee hour buckets are not additive across cells, so they are
+    computed per category with conditional aggregates.
+
+    Every measure is loaded lazily on first use, so a panel only pays for
+    the queries it reads.
+    """
+
+    def __init__(self, filters):
+        self.filters = dict(filters)
+        self.pl_category = self.filters.get('pl_category') or 'All'
+        self.pmo_category = self.filters.get('pmo_training_category') or 'All'
+        self.selectors = ['All'] + CATEGORIES
+        if self.pmo_category not in self.selectors:
+            self.selectors.append(self.pmo_category)
+
+        # Dimensions the cells are grouped by are sliced in Python, not SQL
+        self.base_filters = dict(self.filters)
+        for key in ('pl_category', 'pmo_training_category') + MONTH_FILTER_KEYS:
+            self.base_filters[key] = None
+
+        self._cells = None
+        self._targets = None
+        self._learners = None
+        self._employee_hours = None
+        self._tni = None
+        self._permanent_eor = None
+
+    def _fetch(self, query, params, one=False):
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchone() if one else cursor.fetchall()
+        finally:
+            conn.close()
+
+    # --- cells ---------------------------------------------------------
+
+    @property
+    def cells(self):
+        """Record counts and learning hours grouped by PL, category and month"""
+        if self._cells is None:
+            where_sql, params = master_data_conditions(self.base_filters)
+            self._cells = self._fetch(f"""
+                SELECT
+                    pl_category,
+                    pmo_training_category,
+                    calendar_month,
+                    month_report_pmo_21_20,
+                    month_cd_key_26_25,
+                    COUNT(id) AS records,
+                    SUM({learning_hours_sql()}) AS learning_hours
+                FROM master_data
+                WHERE 1=1 {where_sql}
+                GROUP BY pl_category, pmo_training_category, calendar_month,
+                         month_report_pmo_21_20, month_cd_key_26_25
+            """, params)
+        return self._cells
+
+    def _matches_months(self, cell):
+        filters = self.filters
+        for key in ('calendar_month', 'month_report_pmo_21_20', 'month_cd_key_26_25'):
+            if filters.get(key) and match_key(cell[key]) != match_key(filters[key]):
+                return False
+        months = _months_in_range(filters.get('month_range_start'), filters.get('month_range_end'))
+        if months and match_key(cell['calendar_month']) not in {match_key(m) for m in months}:
+            return False
+        return True
+
+    def actual(self, pl_category=None, pmo_category=None, months=True, measure='records'):
+        """Sum of a cell measure for a PL / category slice.
+
+        ``months`` applies the month filters of the dashboard; the YTD charts
+        pass False to see the whole fiscal year.
+        """
+        pl_category = self.pl_category if pl_category is None else pl_category
+        pmo_category = self.pmo_category if pmo_category is None else pmo_category
+        total = 0
+        for cell in self.cells:
+            if not _matches_pl(pl_category, cell['pl_category']):
+                continue
+            if not _matches_pmo(pmo_category, cell['pmo_training_category']):
+                continue
+            if months and not self._matches_months(cell):
+                continue
+            total += int(cell[measure] or 0)
+        return total
+
+    def monthly_records(self, pl_category=None, pmo_category=None):
+        """Record counts per calendar month, ignoring the dashboard month filters"""
+        pl_category = self.pl_category if pl_category is None else pl_category
+        pmo_category = self.pmo_category if pmo_category is None else pmo_category
+        counts = defaultdict(int)
+        for cell in self.cells:
+            if _matches_pl(pl_category, cell['pl_category']) and \
+                    _matches_pmo(pmo_category, cell['pmo_training_category']):
+                counts[cell['calendar_month']] += int(cell['records'] or 0)
+        return counts
+
+    # --- targets -------------------------------------------------------
+
+    def target(self, pl_category=None, pmo_category=None):
+        """Annual target (final_tni_data nominations) for a PL / category slice"""
+        if self._targets is None:
+            where_sql, params = target_conditions(self.base_filters)
+            self._targets = self._fetch(f"""
+                SELECT tt.pl_category, tt.pmo_category, COUNT(*) AS target
+                FROM final_tni_data t
+                JOIN training_targets tt ON t.training_name = tt.training_name
+                WHERE 1=1 {where_sql}
+                GROUP BY tt.pl_category, tt.pmo_category
+            """, params)
+        pl_category = self.pl_category if pl_category is None else pl_category
+        pmo_category = self.pmo_category if pmo_category is None else pmo_category
+        return sum(int(row['target'] or 0) for row in self._targets
+                   if _matches_pl(pl_category, row['pl_category'])
+                   and _matches_pmo(pmo_category, row['pmo_category']))
+
+    # --- unique learners -----------------------------------------------
+
+    def learners(self, pl_category=None, pmo_category=None):
+        """Distinct PERMANENT learners for a PL / category slice"""
+        if self._learners is None:
+            learner_filters = dict(self.filters)
+            learner_filters['pl_category'] = None
+            learner_filters['pmo_training_category'] = None
+            where_sql, where_params = master_data_conditions(learner_filters)
+
+            columns = []
+            column_params = []
+            for i, selector in enumerate(self.selectors):
+                predicate, predicate_params = pmo_category_sql(selector)
+                columns.append(f"COUNT(DISTINCT CASE WHEN {predicate} THEN per_no END) AS learners_{i}")
+                column_params.extend(predicate_params)
+            columns = ",\n                    ".join(columns)
+
+            base = """
+                FROM master_data
+                WHERE employee_group = 'PERMANENT'
+                AND per_no IS NOT NULL
+                AND per_no != ''
+            """ + where_sql
+            rows = self._fetch(f"""
+                SELECT 0 AS is_total, pl_category, {columns} {base} GROUP BY pl_category
+                UNION ALL
+                SELECT 1 AS is_total, NULL, {columns} {base}
+            """, (column_params + where_params) * 2)
+
+            self._learners = {'total': {}, 'by_pl': {}}
+            for row in rows:
+                counts = {selector: int(row[f'learners_{i}'] or 0)
+                          for i, selector in enumerate(self.selectors)}
+                if row['is_total']:
+                    self._learners['total'] = counts
+                elif row['pl_category'] is not None:
+                    self._learners['by_pl'][match_key(row['pl_category'])] = counts
+
+        pl_category = self.pl_category if pl_category is None else pl_category
+        pmo_category = self.pmo_category if pmo_category is None else pmo_category
+        if not pl_category or pl_category == 'All':
+            counts = self._learners['total']
+        else:
+            counts = self._learners['by_pl'].get(match_key(pl_category), {})
+        return counts.get(pmo_category, 0)
+
+    # --- per-employee hour buckets -------------------------------------
+
+    def hours_buckets(self, pmo_category):
+        """SHE/PMO hour thresholds of PERMANENT staff within one category.
+
+        Also reports ``completed_in_category``: employees who completed 6 SHE +
+        10 PMO hours under the dashboard's own category filter and trained in
+        ``pmo_category``.
+        """
+        if self._employee_hours is None:
+            hours_filters = dict(self.filters)
+            hours_filters['employee_group'] = 'PERMANENT'
+            hours_filters['pmo_training_category'] = None
+            where_sql, where_params = master_data_conditions(hours_filters)
+            hours = learning_hours_sql()
+
+            selectors = list(self.selectors)
+            inner = []
+            inner_params = []
+            outer = []
+            for i, selector in enumerate(selectors):
+                predicate, predicate_params = pmo_category_sql(selector)
+                inner.append(f"SUM(CASE WHEN {predicate} AND pmo_training_category = %s "
+                             f"THEN {hours} ELSE 0 END) AS she_{i}")
+                inner_params.extend(predicate_params + [SHE_CATEGORY])
+                inner.append(f"SUM(CASE WHEN {predicate} AND NOT (pmo_training_category <=> %s) "
+                             f"THEN {hours} ELSE 0 END) AS pmo_{i}")
+                inner_params.extend(predicate_params + [SHE_CATEGORY])
+                inner.append(f"MAX(CASE WHEN {predicate} THEN 1 ELSE 0 END) AS has_{i}")
+                inner_params.extend(predicate_params)
+
+            active = selectors.index(self.pmo_category)
+            completed_active = f"(has_{active} = 1 AND she_{active} >= 6 AND pmo_{active} >= 10)"
+            for i in range(len(selectors)):
+                outer.append(f"SUM(has_{i}) AS employees_{i}")
+                outer.append(f"SUM(has_{i} = 1 AND she_{i} >= 6) AS she_6plus_{i}")
+                outer.append(f"SUM(has_{i} = 1 AND pmo_{i} >= 10) AS pmo_10plus_{i}")
+                outer.append(f"SUM(has_{i} = 1 AND she_{i} >= 6 AND pmo_{i} >= 10) AS completed_16_{i}")
+                outer.append(f"SUM(has_{i} = 1 AND she_{i} + pmo_{i} >= 16) AS cumulative_16plus_{i}")
+                outer.append(f"SUM(has_{i} = 1 AND {completed_active}) AS completed_in_{i}")
+
+            row = self._fetch(f"""
+                SELECT {", ".join(outer)}
+                FROM (
+                    SELECT per_no, {", ".join(inner)}
+                    FROM master_data
+                    WHERE per_no IS NOT NULL AND per_no != '' {where_sql}
+                    GROUP BY per_no
+                ) employee_hours
+            """, inner_params + where_params, one=True) or {}
+
+            self._employee_hours = {}
+            for i, selector in enumerate(selectors):
+                self._employee_hours[selector] = {
+                    key: int(row.get(f'{key}_{i}') or 0)
+                    for key in ('employees', 'she_6plus', 'pmo_10plus', 'completed_16',
+                                'cumulative_16plus', 'completed_in')
+                }
+        return self._employee_hours[pmo_category]
+
+    # --- TNI -----------------------------------------------------------
+
+    def tni(self, pmo_category):
+        """TNI nominations and matched attendance for one category"""
+        if self._tni is None:
+            tni_filters = dict(self.filters)
+            tni_filters['pmo_training_category'] = None
+            fiscal_year = parse_fiscal_year(self.filters.get('fiscal_year'))
+            match_sql, match_params = tni_match_conditions(self.filters)
+            where_sql, where_params = tni_conditions(tni_filters)
+
+            members = []
+            member_params = []
+            sums = []
+            for i, selector in enumerate(CATEGORIES):
+                category_sql, category_params = tni_category_sql(selector, fiscal_year)
+                members.append(f"({category_sql}) AS in_{i}")
+                member_params.extend(category_params)
+                sums.append(f"SUM(in_{i}) AS tni_total_{i}, SUM(in_{i} AND matched) AS matched_{i}")
+
+            row = self._fetch(f"""
+                SELECT {", ".join(sums)}
+                FROM (
+                    SELECT
+                        EXISTS (
+                            SELECT 1 FROM master_data m
+                            WHERE m.per_no = t.per_no
+                              AND m.factory = t.factory
+                              AND m.training_name = t.training_name
+                              {match_sql}
+                        ) AS matched,
+                        {", ".join(members)}
+                    FROM tni_data t
+                    WHERE 1=1 {where_sql}
+                ) tni_rows
+            """, match_params + member_params + where_params, one=True) or {}
+
+            self._tni = {selector: {'tni_total_count': int(row.get(f'tni_total_{i}') or 0),
+                                    'matched_count': int(row.get(f'matched_{i}') or 0)}
+                         for i, selector in enumerate(CATEGORIES)}
+        return self._tni.get(pmo_category, {'tni_total_count': 0, 'matched_count': 0})
+
+    # --- permanent EOR -------------------------------------------------
+
+    @property
+    def permanent_eor(self):
+        """Permanent EOR headcount and those never trained, for the factory filter"""
+        if self._permanent_eor is None:
+            factory_only = {'factory': self.filters.get('factory')}
+            eor_sql, eor_params = eor_conditions(factory_only, 'e.')
+            trained_sql, trained_params = eor_conditions(factory_only, 'm.')
+            row = self._fetch(f"""
+                SELECT
+                    COUNT(DISTINCT e.per_no) AS permanent_eor_count,
+                    COUNT(DISTINCT CASE WHEN NOT EXISTS (
+                        SELECT 1 FROM master_data m
+                        WHERE m.per_no = e.per_no
+                          AND m.employee_group = 'PERMANENT'
+                          {trained_sql}
+                    ) THEN e.per_no END) AS pending_eor_count
+                FROM eor_data e
+                WHERE e.employee_group = 'Permanent'
+                AND e.per_no IS NOT NULL AND e.per_no != '' {eor_sql}
+            """, trained_params + eor_params, one=True) or {}
+            self._permanent_eor = {
+                'permanent_eor_count': int(row.get('permanent_eor_count') or 0),
+                'pending_eor_count': int(row.get('pending_eor_count') or 0)
+            }
+        return self._permanent_eor
+
+
+# Request-scoped only: the cube loads measures lazily and is not thread-safe,
+# and a measure loaded later than its cells would come from another snapshot
+@request_memoized(copy_result=False)
+def get_metrics_cube(filters):
+    """Shared MetricsCube for these filters, reused for the rest of the request"""
+    return MetricsCube(filters)
+
+
+def compute_pl_category_counts(cube, pmo_category=None):
+    """Unique permanent learners, annual target and YTD figures per PL category"""
+    pmo_category = cube.pmo_category if pmo_category is None else pmo_category
+    try:
+        month_index = get_month_index()
+        pl_metrics = {}
+        for pl in PL_CATEGORIES:
+            annual_target = cube.target(pl, pmo_category)
+            ytd_actual = cube.actual(pl, pmo_category)
+            ytd_target = (annual_target / 10) * month_index if annual_target > 0 and month_index > 0 else 0
+            adherence = (ytd_actual / ytd_target) * 100 if ytd_target > 0 else 0  # Allow values above 100%
+
+            # Learners are counted under the dashboard's own PL filter
+            learners = cube.learners(pl, pmo_category) if _matches_pl(cube.pl_category, pl) else 0
+            pl_metrics[pl] = {
+                'unique_learners_count': learners,
+                'annual_target': annual_target,
+                'ytd_coverage': ytd_actual,
+                'ytd_target': int(ytd_target),
+                'adherence': round(adherence, 1)
+            }
+        return pl_metrics
+    except Exception as e:
+        print(f"Error getting PL category counts: {str(e)}")
+        return _empty_pl_counts()
+
+
+def compute_category_metrics(cube):
+    """Target, coverage, learner, TNI and hours figures for each training category"""
+    try:
+        filters = cube.filters
+
+        # Fiscal month number of today (1=April, 12=March) for the EOR YTD target
+        now = datetime.now()
+        fiscal_month_index = (now.month - 4 + 12) % 12 + 1
+
+        permanent_eor_count = cube.permanent_eor['permanent_eor_count']
+        actual_pending_eor = cube.permanent_eor['pending_eor_count']
+        eor_ytd_target = int((permanent_eor_count / 10) * fiscal_month_index)
+
+        # Category staff lists keep the dashboard's employee group filter on
+        # top of PERMANENT, so any other group leaves them empty
+        group_filter = filters.get('employee_group')
+        permanent_only = not group_filter or match_key(group_filter) == 'permanent'
+
+        month_index = get_month_index(filters.get('calendar_month') or filters.get('month_range_end'))
+        results = []
+        for category in CATEGORIES:
+            annual_target = cube.target(pmo_category=category)
+            ytd_target = (annual_target // 10) * month_index
+            ytd_actual = cube.actual(pmo_category=category)
+            adherence = (ytd_actual / ytd_target * 100) if ytd_target > 0 else 0
+
+            tni = cube.tni(category)
+            tni_adherence = (tni['matched_count'] / tni['tni_total_count'] * 100) if tni['tni_total_count'] > 0 else 0
+            unique_learners = cube.learners(pmo_category=category)
+            ul_adherence = (unique_learners / permanent_eor_count * 100) if permanent_eor_count > 0 else 0
+
+            buckets = cube.hours_buckets(category)
+            hours_metrics = build_hours_metrics({
+                'total_employees': buckets['employees'],
+                'she_6plus': buckets['she_6plus'],
+                'pmo_10plus': buckets['pmo_10plus'],
+                'completed_16': buckets['completed_16'],
+                'cumulative_16plus': buckets['cumulative_16plus']
+            })
+            pl_counts = compute_pl_category_counts(cube, category)
+
+            results.append({
+                'category': category,
+                'annual_target': annual_target,
+                'ytd_target': ytd_target,
+                'ytd_actual': ytd_actual,
+                'adherence': round(adherence, 1),
+                'unique_learners': unique_learners,
+                'learning_hours': cube.actual(pmo_category=category, measure='learning_hours'),
+                'eor_count': permanent_eor_count,
+                'pending_eor_count': actual_pending_eor,
+                'permanent_eor_count': permanent_eor_count,
+                'eor_ytd_target': eor_ytd_target,
+                'tni_total_count': tni['tni_total_count'],
+                'tni_matched_count': tni['matched_count'],
+                'tni_adherence': round(tni_adherence, 1),
+                'ul_adherence': round(ul_adherence, 1),
+                'pl1_count': pl_counts.get('PL1', 0),
+                'pl2_count': pl_counts.get('PL2', 0),
+                'pl3_count': pl_counts.get('PL3', 0),
+                'she_6plus_count': hours_metrics['she_6plus_count'],
+                'she_below_6_count': hours_metrics['she_below_6_count'],
+                'pmo_10plus_count': hours_metrics['pmo_10plus_count'],
+                'pmo_below_10_count': hours_metrics['pmo_below_10_count'],
+                'completed_16_count': buckets['completed_in'] if permanent_only else 0,
+                'cumulative_16plus_count': hours_metrics['cumulative_16plus_count'],
+                'below_16_count': hours_metrics['below_16_count'],
+                'total_permanent': hours_metrics['total_permanent']
+            })
+        return results
+
+    except Exception as e:
+        print(f"Error calculating category metrics: {str(e)}")
+        return []
+
+
+def compute_monthwise_ytd_metrics(cube):
+    """Cumulative YTD target and coverage for each month of the fiscal year"""
+    try:
+        # The chart always spans the whole year, whatever month is filtered
+        annual_target = cube.target()
+        monthly_counts = cube.monthly_records()
+
+        results = []
+        cumulative_coverage = 0
+        for i, month in enumerate(FISCAL_MONTH_ORDER, 1):
+            monthly_count = monthly_counts.get(month, 0)
+            cumulative_coverage += monthly_count
+
+            ytd_target = (annual_target / 10) * min(i, 10) if annual_target > 0 else 0
+            adherence = (cumulative_coverage / ytd_target) * 100 if ytd_target > 0 else 0  # Allow values above 100%
+
+            results.append({
+                'month': month,
+                'ytd_target': int(ytd_target),
+                'ytd_coverage': cumulative_coverage,
+                'adherence': round(adherence, 1),
+                'monthly_count': monthly_count
+            })
+        return results
+
+    except Exception as e:
+        print(f"Error calculating month-wise YTD metrics: {str(e)}")
+        return []
+
+
+def compute_annual_ytd_metrics(cube):
+    """Overall annual target and YTD coverage for the fiscal year"""
+    month_index = get_month_index()
+    annual_target = 0
+    try:
+        annual_target = cube.target()
+        ytd_coverage = cube.actual(months=False)
+        ytd_target = (annual_target / 10) * month_index if annual_target > 0 and month_index > 0 else 0
+        return {
+            'annual_target': annual_target,
+            'ytd_coverage': ytd_coverage,
+            'ytd_target': int(ytd_target),
+            'month_index': month_index
+        }
+    except Exception as e:
+        print(f"Error calculating annual YTD metrics: {str(e)}")
+        return {
+            'annual_target': annual_target,
+            'ytd_coverage': 0,
+            'ytd_target': 0,
+            'month_index': month_index
+        }
@@ -0,0 +1,255 @@
+"""Schema migrations for the masterdata database.
+
+Each migration is applied once, in order, and recorded in the
+schema_migrations table. Run pending migrations with:
+
+    python db_migrations.py
+
+and check that the dashboard queries use indexes with:
+
+    python db_migrations.py --explain
+"""
+import sys
+
+import pymysql
+
+from filter_options import CREATE_TABLE_SQL as FILTER_OPTIONS_TABLE_SQL, backfill_statements
+from hours_summary import CREATE_TABLE_SQL as HOURS_SUMMARY_TABLE_SQL, \
+    backfill_statements as hours_summary_backfill
+from utils import get_db_connection
+
+# MySQL error codes that mean a statement's change is already in place
+ALREADY_APPLIED_ERRORS = {
+    1060,  # Duplicate column name
+    1061,  # Duplicate key name
+}
+
+MIGRATIONS = [
+    (
+        '001_master_data_fiscal_year',
+        'Persisted, indexed fiscal_year on master_data and a start_date index',
+        [
+            # STORED generated column: backfilled by the ALTER itself and kept
+            # up to date by MySQL on every insert/update (save_attendance,
+            # bulk uploads), so no application code has to maintain it.
+            """
+            ALTER TABLE master_data
+            ADD COLUMN fiscal_year SMALLINT
+                GENERATED ALWAYS AS (YEAR(start_date) - IF(MONTH(start_date) >= 4, 0, 1)) STORED
+            """,
+            "CREATE INDEX idx_master_data_fiscal_year ON master_data (fiscal_year)",
+            # Dashboard filters use a start_date range, which seeks this index
+            "CREATE INDEX idx_master_data_start_date ON master_data (start_date)",
+        ]
+    ),
+    (
+        '002_dashboard_composite_indexes',
+        'Composite indexes for dashboard filters, factory data and TNI joins',
+        [
+            # master_data: every dashboard filter set carries a fiscal-year
+            # start_date range, so it is the trailing column of each index
+            "CREATE INDEX idx_master_data_factory_start ON master_data (factory, start_date)",
+            "CREATE INDEX idx_master_data_group_start ON master_data (employee_group, start_date)",
+            "CREATE INDEX idx_master_data_category_start "
+            "ON master_data (pmo_training_category, pl_category, start_date)",
+            # Training filter, per-training grouping and factory_data lookups
+            "CREATE INDEX idx_master_data_training_factory "
+            "ON master_data (training_name, factory, start_date)",
+            # TNI match EXISTS, pending-EOR anti-join, per-employee hours and
+            # factory_data per_no lookups
+            "CREATE INDEX idx_master_data_tni_match "
+            "ON master_data (per_no, factory, training_name, start_date)",
+            "CREATE INDEX idx_master_data_bc_no ON master_data (bc_no)",
+            # save_attendance looks up the existing row by program and employee
+            "CREATE INDEX idx_master_data_program_per_no ON master_data (program_id, per_no)",
+
+            "CREATE INDEX idx_tni_data_year_factory_training ON tni_data (year, factory, training_name)",
+            "CREATE INDEX idx_tni_data_match ON tni_data (per_no, factory, training_name)",
+            "CREATE INDEX idx_final_tni_data_year_training "
+            "ON final_tni_data (year, training_name, factory)",
+            "CREATE INDEX idx_training_targets_training_year ON training_targets (training_name, target_year)",
+
+            "CREATE INDEX idx_eor_data_per_no ON eor_data (per_no)",
+            "CREATE INDEX idx_eor_data_factory_group ON eor_data (factory, employee_group)",
+
+            "CREATE INDEX idx_nominations_training_factory ON nominations (training_id, factory_name)",
+        ]
+    ),
+    (
+        '003_filter_options',
+        'Materialized dropdown options for the master data views',
+        # Backfill once; writers keep it up to date incrementally
+        [FILTER_OPTIONS_TABLE_SQL] + backfill_statements()
+    ),
+    (
+        '004_employee_hours_summary',
+        'Per-employee, per-fiscal-year SHE/PMO/total hours summary',
+        # save_attendance refreshes the rows of the employee it writes
+        [HOURS_SUMMARY_TABLE_SQL] + hours_summary_backfill()
+    ),
+]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(100) PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def get_applied_migrations(cursor):
+    """Versions already recorded in schema_migrations"""
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def apply_migration(cursor, version, description, statements):
+    for statement in statements:
+        try:
+            cursor.execute(statement)
+        except pymysql.MySQLError as e:
+            if e.args and e.args[0] in ALREADY_APPLIED_ERRORS:
+                print(f"  {version}: skipping, already present ({e.args[1]})")
+                continue
+            raise
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+        (version, description)
+    )
+
+
+def run_migrations(verbose=True):
+    """Apply every pending migration in order; returns the versions applied"""
+    conn = get_db_connection()
+    applied_now = []
+    try:
+        with conn.cursor() as cursor:
+            applied = get_applied_migrations(cursor)
+            for version, description, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                if verbose:
+                    print(f"Applying {version}: {description}")
+                apply_migration(cursor, version, description, statements)
+                # DDL commits implicitly; this records the version row
+                conn.commit()
+                applied_now.append(version)
+        if verbose and not applied_now:
+            print("Database schema is up to date")
+        return applied_now
+    except Exception as e:
+        conn.rollback()
+        print(f"Error running migrations: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+
+class ExplainCursor:
+    """Cursor stand-in that EXPLAINs every statement instead of running it.
+
+    Lets the dashboard query builders be checked exactly as they are issued;
+    fetches return empty results.
+    """
+
+    def __init__(self, cursor, label):
+        self.cursor = cursor
+        self.label = label
+        self.plans = []
+
+    def execute(self, query, params=None):
+        self.cursor.execute("EXPLAIN " + query, params)
+        self.plans.append((self.label, query, self.cursor.fetchall()))
+
+    def fetchone(self):
+        return {}
+
+    def fetchall(self):
+        return []
+
+
+def _sample_filters(cursor):
+    """Representative dashboard filter sets built from the latest record"""
+    from dashboard_metrics import current_fiscal_year
+
+    cursor.execute("""
+        SELECT per_no, factory, training_name, bc_no
+        FROM master_data ORDER BY id DESC LIMIT 1
+    """)
+    sample = cursor.fetchone() or {}
+    base = {'fiscal_year': str(current_fiscal_year()), 'pl_category': 'All',
+            'pmo_training_category': 'All', 'gender': 'All'}
+    return [
+        ('fiscal year', dict(base)),
+        ('factory', dict(base, factory=sample.get('factory'))),
+        ('training', dict(base, training_name=sample.get('training_name'))),
+        ('employee', dict(base, per_no=sample.get('per_no'))),
+        ('bc no', dict(base, bc_no=sample.get('bc_no'))),
+        ('permanent SHE', dict(base, employee_group='PERMANENT',
+                               pmo_training_category='SHE (Safety+Health)')),
+        ('PL1 PMO', dict(base, pl_category='PL1', pmo_training_category='PMO')),
+    ]
+
+
+def explain_dashboard_queries(verbose=True):
+    """EXPLAIN the dashboard aggregate queries and flag full table scans.
+
+    Returns a list of (filter set, table, possible_keys, rows) for every plan
+    step that is a full scan (type ALL) of a base table.
+    """
+    import dashboard_metrics as dm
+
+    class ExplainCube(dm.MetricsCube):
+        def __init__(self, filters, explain_cursor):
+            super().__init__(filters)
+            self.explain_cursor = explain_cursor
+
+        def _fetch(self, query, params, one=False):
+            self.explain_cursor.execute(query, params)
+            return {} if one else []
+
+    conn = get_db_connection()
+    findings = []
+    try:
+        with conn.cursor() as cursor:
+            for label, filters in _sample_filters(cursor):
+                explain = ExplainCursor(cursor, label)
+                dm.fetch_master_totals(explain, filters)
+                dm.fetch_target_totals(explain, filters)
+                dm.fetch_tni_totals(explain, filters)
+                dm.fetch_eor_totals(explain, filters)
+                dm.fetch_hours_buckets(explain, filters)
+
+                cube = ExplainCube(filters, explain)
+                cube.cells
+                cube.target()
+                cube.learners()
+                cube.hours_buckets('All')
+                cube.tni('PMO')
+                cube.permanent_eor
+
+                for plan_label, query, plan in explain.plans:
+                    for step in plan:
+                        table = step.get('table') or ''
+                        if step.get('type') == 'ALL' and not table.startswith('<'):
+                            findings.append((plan_label, table, step.get('possible_keys'), step.get('rows')))
+                            if verbose:
+                                print(f"[{plan_label}] full scan of {table} "
+                                      f"(possible keys: {step.get('possible_keys')}, rows: {step.get('rows')})")
+                                print("    " + " ".join(query.split())[:200])
+        if verbose and not findings:
+            print("No full table scans in the dashboard queries")
+        return findings
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if '--explain' in sys.argv[1:]:
+        explain_dashboard_queries()
+    else:
+        run_migrations()
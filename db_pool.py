@@ -0,0 +1,204 @@
+"""Thread-safe pool of pymysql connections behind utils.get_db_connection().
+
+A dashboard render calls get_db_connection() a dozen times or more, and each
+call used to open a TCP connection and authenticate. The pool keeps idle
+connections and hands out a ``PooledConnection`` proxy that behaves like the
+pymysql connection it wraps, except that ``close()`` returns the connection
+to the pool instead of closing it, so callers keep their
+``conn = get_db_connection() ... finally: conn.close()`` pattern.
+
+* At most ``max_size`` connections exist at once; a checkout waits up to
+  ``timeout`` seconds for one to be returned and then raises ``PoolTimeout``.
+* Returned connections are rolled back, so no transaction or snapshot leaks
+  into the next checkout; a connection that fails the rollback is discarded.
+* Connections idle for longer than ``ping_after`` seconds are pinged before
+  reuse and replaced if the server dropped them; connections older than
+  ``recycle_after`` seconds are replaced. Pings, connects and closes run
+  outside the pool lock, so one hung socket only stalls its own caller.
+* ``stats()`` reports created/reused/discarded counts for diagnostics.
+* ``cursor_wrapper``, when given, wraps every cursor the proxy hands out
+  (utils uses it for query instrumentation).
+"""
+import threading
+import time
+
+import pymysql
+
+
+class PoolTimeout(pymysql.err.OperationalError):
+    """No connection became free within the checkout timeout"""
+
+
+class PooledConnection:
+    """Proxy for a pooled pymysql connection; close() gives it back to the pool"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        if self._conn is None:
+            raise pymysql.err.InterfaceError(0, 'Connection already returned to the pool')
+        cursor = self._conn.cursor(*args, **kwargs)
+        wrapper = self._pool.cursor_wrapper
+        return wrapper(cursor) if wrapper else cursor
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pymysql.err.InterfaceError(0, 'Connection already returned to the pool')
+        return getattr(self._conn, name)
+
+    @property
+    def open(self):
+        return self._conn is not None and self._conn.open
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        # Dropped without close(): a cursor may still hold the raw connection,
+        # so free the slot but never hand the connection out again
+        conn = getattr(self, '_conn', None)
+        if conn is not None:
+            self._conn = None
+            self._pool.forget(conn)
+
+
+class ConnectionPool:
+    def __init__(self, connect, max_size=10, timeout=10, ping_after=30, recycle_after=3600,
+                 cursor_wrapper=None):
+        self._connect = connect
+        self.cursor_wrapper = cursor_wrapper
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.recycle_after = recycle_after
+        self._idle = []  # [(conn, created_at, returned_at)], most recently returned last
+        self._created_at = {}  # id(conn) -> creation time of connections in use
+        self._size = 0
+        # Reentrant: a proxy dropped without close() can be finalized by the
+        # garbage collector while its thread already holds the lock (__del__)
+        self._cond = threading.Condition(threading.RLock())
+        self._stats = {'created': 0, 'reused': 0, 'discarded': 0, 'timeouts': 0}
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, created_at, returned_at):
+        now = time.monotonic()
+        if now - created_at >= self.recycle_after:
+            return False
+        if now - returned_at >= self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def _checkout(self, deadline):
+        """An idle entry to try, or None once a slot is reserved for a new connection"""
+        with self._cond:
+            while True:
+                if self._idle:
+                    # Still counted in _size while it is checked
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(2013, f"No database connection free after {self.timeout}s "
+                                            f"({self.max_size} in use)")
+                self._cond.wait(remaining)
+
+    def connection(self):
+        """Check out a connection, waiting up to ``timeout`` seconds for a free slot"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = self._checkout(deadline)
+            if entry is None:
+                break
+            conn, created_at, returned_at = entry
+            # Ping outside the lock so a hung socket does not block other checkouts
+            if self._healthy(conn, created_at, returned_at):
+                with self._cond:
+                    self._created_at[id(conn)] = created_at
+                    self._stats['reused'] += 1
+                return PooledConnection(self, conn)
+            self._close(conn)
+            with self._cond:
+                self._size -= 1
+                self._stats['discarded'] += 1
+                self._cond.notify()
+
+        # Connect outside the lock so a slow handshake does not block releases
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats['created'] += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Take a connection back; it is rolled back first, or discarded if broken"""
+        try:
+            conn.rollback()
+            healthy = conn.open
+        except Exception:
+            healthy = False
+        with self._cond:
+            created_at = self._created_at.pop(id(conn), time.monotonic())
+            if healthy:
+                self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                self._size -= 1
+                self._stats['discarded'] += 1
+            self._cond.notify()
+        if not healthy:
+            self._close(conn)
+
+    def forget(self, conn):
+        """Free the slot of a connection that was never returned"""
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def clear(self):
+        """Close every idle connection, e.g. after a configuration change"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._stats['discarded'] += len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(max_size=self.max_size, open=self._size,
+                         idle=len(self._idle), in_use=self._size - len(self._idle))
+            checkouts = stats['created'] + stats['reused']
+            stats['reuse_ratio'] = round(stats['reused'] / checkouts, 3) if checkouts else 0.0
+            return stats
@@ -0,0 +1,101 @@
+"""In-memory EOR (employee on roll) directory for attendance lookups.
+
+/check_per_no and /submit_attendance look up one employee by per_no. Instead
+of loading the whole eor_data table per request, the directory keeps a dict
+keyed by normalized per_no, loaded once and shared by all requests of the
+process. It is rebuilt after ``process_eor_excel`` replaces the table (see
+``invalidate_eor_directory``) and reloaded every ``EOR_DIRECTORY_TTL_SECONDS``
+to pick up uploads made by other processes. A per_no missing from the dict
+falls back to an indexed point query, so a newly uploaded employee is found
+before the next reload.
+"""
+import threading
+import time
+
+from utils import Config, get_db_connection
+
+EOR_COLUMNS = ('per_no', 'participants_name', 'bc_no', 'gender',
+               'employee_group', 'department', 'factory')
+
+_lock = threading.Lock()
+_directory = None
+_loaded_at = 0.0
+
+
+def normalize_per_no(per_no):
+    """Key used for per_no lookups"""
+    return str(per_no if per_no is not None else '').strip()
+
+
+def _fetch(query, params=None):
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _load_directory():
+    rows = _fetch(f"SELECT {', '.join(EOR_COLUMNS)} FROM eor_data")
+    if rows is None:
+        return None
+    directory = {}
+    for row in rows:
+        key = normalize_per_no(row.get('per_no'))
+        if key:
+            # First row wins, as in the old linear scan
+            directory.setdefault(key, row)
+    return directory
+
+
+def _get_directory():
+    global _directory, _loaded_at
+    with _lock:
+        if _directory is None or time.monotonic() - _loaded_at >= Config.EOR_DIRECTORY_TTL_SECONDS:
+            directory = _load_directory()
+            if directory is None:
+                return _directory or {}
+            _directory = directory
+            _loaded_at = time.monotonic()
+        return _directory
+
+
+def lookup_employee(per_no):
+    """EOR row (dict) for a per_no, or None if the employee is not on roll"""
+    key = normalize_per_no(per_no)
+    if not key:
+        return None
+    employee = _get_directory().get(key)
+    if employee is not None:
+        return employee
+
+    rows = _fetch(f"""
+        SELECT {', '.join(EOR_COLUMNS)} FROM eor_data
+        WHERE per_no = %s LIMIT 1
+    """, (key,))
+    if not rows:
+        return None
+    with _lock:
+        if _directory is not None:
+            _directory[key] = rows[0]
+    return rows[0]
+
+
+def invalidate_eor_directory():
+    """Drop the directory; call after committing a change to eor_data"""
+    global _directory
+    with _lock:
+        _directory = None
+
+
+def eor_directory_stats():
+    """Size and age of the loaded directory, for diagnostics"""
+    with _lock:
+        if _directory is None:
+            return {'loaded': False, 'employees': 0, 'age_seconds': None}
+        return {'loaded': True, 'employees': len(_directory),
+                'age_seconds': round(time.monotonic() - _loaded_at, 1)}
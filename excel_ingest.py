@@ -0,0 +1,103 @@
+"""Streaming Excel ingestion shared by the upload paths.
+
+``pd.read_excel`` materialises the whole workbook, and then a DataFrame of
+it, before a single row is validated, so a multi-megabyte EOR or master
+upload spikes worker memory. ``ExcelRowStream`` reads the first sheet with
+openpyxl in read-only mode instead and yields one row at a time as a dict
+keyed by the (mapped) header, so uploads are validated and written in
+bounded chunks:
+
+    with ExcelRowStream(file, column_mapping) as stream:
+        missing = stream.missing_columns(['per_no', 'factory'])
+        for chunk in stream.chunks(1000):
+            ...  # [(excel_row_number, {column: value}), ...]
+
+Legacy .xls files, which openpyxl cannot read, fall back to pandas.
+"""
+import pandas as pd
+from openpyxl import load_workbook
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def cell_text(value):
+    """Cell value as stripped text: '' for blanks, whole floats without '.0'"""
+    if _is_blank(value):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+class ExcelRowStream:
+    """Row-at-a-time reader for the first sheet of an uploaded workbook.
+
+    Headers are stripped, as the upload code did with ``df.columns``, then
+    renamed through ``column_mapping``; blank headers become 'Unnamed: N'
+    like pandas. Entirely blank rows are skipped.
+    """
+
+    def __init__(self, source, column_mapping=None):
+        self.source = source
+        self.column_mapping = column_mapping or {}
+        self._workbook = None
+        self._rows = None
+        self.columns = []
+        self._open()
+
+    def _open(self):
+        filename = getattr(self.source, 'filename', None) or \
+            (self.source if isinstance(self.source, str) else '')
+        if str(filename).lower().endswith('.xls'):
+            df = pd.read_excel(self.source)
+            header = list(df.columns)
+            rows = (tuple(None if pd.isna(v) else v for v in values)
+                    for values in df.itertuples(index=False, name=None))
+        else:
+            # FileStorage wraps the uploaded stream; openpyxl needs the file object
+            source = getattr(self.source, 'stream', self.source)
+            self._workbook = load_workbook(source, read_only=True, data_only=True)
+            rows = self._workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None) or ()
+
+        self.columns = []
+        for index, name in enumerate(header):
+            name = f"Unnamed: {index}" if _is_blank(name) else str(name).strip()
+            self.columns.append(self.column_mapping.get(name, name))
+        self._rows = rows
+
+    def missing_columns(self, required_columns):
+        """Required columns absent from the header, in the order given"""
+        return [col for col in required_columns if col not in self.columns]
+
+    def __iter__(self):
+        """Yield (excel_row_number, row_dict); the header is row 1"""
+        for row_number, values in enumerate(self._rows, start=2):
+            if all(_is_blank(v) for v in values):
+                continue
+            yield row_number, dict(zip(self.columns, values))
+
+    def chunks(self, chunk_size=1000):
+        """Yield lists of up to chunk_size (excel_row_number, row_dict) pairs"""
+        chunk = []
+        for item in self:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
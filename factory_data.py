@@ -5,6 +5,9 @@ from datetime import datetime, date, time, timedelta
 import json
 from utils import get_db_connection
 factory_bp = Blueprint('factory_data', __name__, url_prefix='/factory-data')
+# Employees per grouped hours query in get_hours_by_per_no
+HOURS_LOOKUP_BATCH = 500
+NO_HOURS = {'she_hours': 0, 'total_learning_hours': 0}
 def format_timedelta_to_time(td):
     """Convert timedelta to time string in HH:MM format"""
     if isinstance(td, timedelta):
@@ -36,49 +39,45 @@ def serialize_nomination(nom):
             serialized[key] = value
     
     return serialized
-def get_total_she_hours(per_no, cursor, exclude_training_name=None):
-    """Calculate the total SHE (Safety+Health) learning hours from master_data for an employee"""
-    query = """
-        SELECT learning_hours
-        FROM master_data
-        WHERE per_no = %s
-        AND pmo_training_category = 'SHE (Safety+Health)'
-    """
-    params = [per_no]
-    
-    # Exclude the current training they didn't attend
-    if exclude_training_name:
-        query += " AND training_name != %s"
-        params.append(exclude_training_name)
-    
-    cursor.execute(query, params)
-    records = cursor.fetchall()
+def hours_key(per_no):
+    """per_no as matched by the per_no = %s comparison (case and trailing spaces ignored)"""
+    return None if per_no is None else str(per_no).strip().lower()
+def get_hours_by_per_no(per_nos, cursor, exclude_training_name=None):
+    """SHE (Safety+Health) and total learning hours from master_data for many employees.
     
-    # Sum all SHE learning hours
-    total_she_hours = sum(record['learning_hours'] or 0 for record in records)
-    
-    return total_she_hours
-def get_total_learning_hours(per_no, cursor, exclude_training_name=None):
-    """Calculate the total learning hours from all categories for an employee"""
-    query = """
-        SELECT learning_hours
-        FROM master_data
-        WHERE per_no = %s
+    One grouped query per HOURS_LOOKUP_BATCH employees instead of two per
+    employee. Returns {hours_key(per_no): {'she_hours': ..., 'total_learning_hours': ...}};
+    look employees up with hours.get(hours_key(per_no), NO_HOURS), which also
+    covers a missing per_no.
     """
-    params = [per_no]
-    
-    # Exclude the current training they didn't attend
-    if exclude_training_name:
-        query += " AND training_name != %s"
-        params.append(exclude_training_name)
+    values = list(dict.fromkeys(str(per_no) for per_no in per_nos if per_no is not None))
+    hours = {hours_key(value): dict(NO_HOURS) for value in values}
     
-    cursor.execute(query, params)
-    records = cursor.fetchall()
-    
-    # Sum all learning hours
-    total_hours = sum(record['learning_hours'] or 0 for record in records)
-    
-    return total_hours
+    for start in range(0, len(values), HOURS_LOOKUP_BATCH):
+        batch = values[start:start + HOURS_LOOKUP_BATCH]
+        query = f"""
+            SELECT per_no,
+                   SUM(CASE WHEN pmo_training_category = 'SHE (Safety+Health)'
+                            THEN IFNULL(learning_hours, 0) ELSE 0 END) AS she_hours,
+                   SUM(IFNULL(learning_hours, 0)) AS total_learning_hours
+            FROM master_data
+            WHERE per_no IN ({', '.join(['%s'] * len(batch))})
+        """
+        params = list(batch)
+        
+        # Exclude the current training they didn't attend
+        if exclude_training_name:
+            query += " AND training_name != %s"
+            params.append(exclude_training_name)
+        query += " GROUP BY per_no"
+        
+        cursor.execute(query, params)
+        for record in cursor.fetchall():
+            key = hours_key(record['per_no'])
+            if key in hours:
+                hours[key] = {'she_hours': record['she_hours'] or 0,
+                              'total_learning_hours': record['total_learning_hours'] or 0}
+    return hours
 @factory_bp.before_request
 def check_session():
     """Check if user is logged in and has factory location in session, except for endpoints that don't require it."""
@@ -239,23 +238,16 @@ def factory_data():
                                             suffixes=('_tni', '_attended'),
                                             indicator=True)
                         
+                        # SHE and total learning hours for everyone in one pass
+                        hours = get_hours_by_per_no(merged['per_no'].tolist(), cursor,
+                                                    training_details['training_name'])
+                        
                         # Create attendance data with status
                         attendance_data = []
                         for _, row in merged.iterrows():
                             status = "Attended" if row['_merge'] == 'both' else "Not Attended"
                             nomination_status = nomination_statuses.get(row['per_no'], None)
-                            
-                            # Get SHE and total learning hours for this employee
-                            she_hours = get_total_she_hours(
-                                row['per_no'], 
-                                cursor, 
-                                training_details['training_name']
-                            )
-                            total_hours = get_total_learning_hours(
-                                row['per_no'], 
-                                cursor, 
-                                training_details['training_name']
-                            )
+                            employee_hours = hours.get(hours_key(row['per_no']), NO_HOURS)
                             
                             attendance_data.append({
                                 'per_no': row['per_no'],
@@ -263,24 +255,16 @@ def factory_data():
                                 'training_name': row['training_name'],
                                 'status': status,
                                 'nomination_status': nomination_status,
-                                'she_hours': she_hours,
-                                'total_learning_hours': total_hours
+                                'she_hours': employee_hours['she_hours'],
+                                'total_learning_hours': employee_hours['total_learning_hours']
                             })
                     else:
                         # If no one attended, all are not attended
+                        hours = get_hours_by_per_no(tni_df['per_no'].tolist(), cursor,
+                                                    training_details['training_name'])
                         attendance_data = []
                         for _, row in tni_df.iterrows():
-                            # Get SHE and total learning hours for this employee
-                            she_hours = get_total_she_hours(
-                                row['per_no'], 
-                                cursor, 
-                                training_details['training_name']
-                            )
-                            total_hours = get_total_learning_hours(
-                                row['per_no'], 
-                                cursor, 
-                                training_details['training_name']
-                            )
+                            employee_hours = hours.get(hours_key(row['per_no']), NO_HOURS)
                             
                             attendance_data.append({
                                 'per_no': row['per_no'],
@@ -288,8 +272,8 @@ def factory_data():
                                 'training_name': row['training_name'],
                                 'status': 'Not Attended',
                                 'nomination_status': nomination_statuses.get(row['per_no'], None),
-                                'she_hours': she_hours,
-                                'total_learning_hours': total_hours
+                                'she_hours': employee_hours['she_hours'],
+                                'total_learning_hours': employee_hours['total_learning_hours']
                             })
     finally:
         conn.close()
@@ -363,25 +347,10 @@ def download_factory_data():
                 not_attended_df = tni_df
             
             # Add training hours information for each employee
-            she_hours_list = []
-            total_hours_list = []
-            
-            for _, row in not_attended_df.iterrows():
-                she_hours = get_total_she_hours(
-                    row['per_no'], 
-                    cursor, 
-                    training_name
-                )
-                total_hours = get_total_learning_hours(
-                    row['per_no'], 
-                    cursor, 
-                    training_name
-                )
-                she_hours_list.append(she_hours)
-                total_hours_list.append(total_hours)
-            
-            not_attended_df['she_hours'] = she_hours_list
-            not_attended_df['total_learning_hours'] = total_hours_list
+            hours = get_hours_by_per_no(not_attended_df['per_no'].tolist(), cursor, training_name)
+            employee_hours = [hours.get(hours_key(per_no), NO_HOURS) for per_no in not_attended_df['per_no']]
+            not_attended_df['she_hours'] = [entry['she_hours'] for entry in employee_hours]
+            not_attended_df['total_learning_hours'] = [entry['total_learning_hours'] for entry in employee_hours]
         else:
             not_attended_df = pd.DataFrame(columns=[
                 'per_no', 'name', 'training_name', 'she_hours', 'total_learning_hours'
@@ -516,25 +485,14 @@ def get_nominations(training_id):
                 factory_counts[factory] = 0
             factory_counts[factory] += 1
         
-        # Add SHE Hours and Total Learning Hours to each nomination
+        # Add SHE Hours and Total Learning Hours to each nomination; all
+        # nominations share the training, which is excluded from the totals
+        hours = get_hours_by_per_no([nom['per_no'] for nom in nominations], cursor,
+                                    nominations[0]['training_name'] if nominations else None)
         for nom in nominations:
-            # Calculate SHE Hours for this employee
-            she_hours = get_total_she_hours(
-                nom['per_no'], 
-                cursor, 
-                nom['training_name']  # Exclude current training
-            )
-            
-            # Calculate Total Learning Hours for this employee
-            total_hours = get_total_learning_hours(
-                nom['per_no'], 
-                cursor, 
-                nom['training_name']  # Exclude current training
-            )
-            
-            # Add these values to the nomination dictionary
-            nom['she_hours'] = she_hours
-            nom['total_learning_hours'] = total_hours
+            employee_hours = hours.get(hours_key(nom['per_no']), NO_HOURS)
+            nom['she_hours'] = employee_hours['she_hours']
+            nom['total_learning_hours'] = employee_hours['total_learning_hours']
         
         # Convert to serializable format
         serialized_nominations = []
@@ -0,0 +1,240 @@
+"""Materialized dropdown options for the master data views.
+
+The distinct values offered by the /master_data filter dropdowns are kept in
+the filter_options table instead of being recomputed with SELECT DISTINCT
+over master_data on every render:
+
+* writers add the values of the rows they insert or update with
+  ``record_master_data_options()`` (INSERT IGNORE, inside their own
+  transaction), and the training-name upload refreshes its list with
+  ``refresh_training_name_options()``;
+* readers call ``get_filter_options()``, which serves an in-memory copy of
+  the table, reloaded after a local write or once ``FILTER_OPTIONS_TTL_SECONDS``
+  have passed (writes made by other processes).
+
+Values are only ever added incrementally; ``rebuild_filter_options()``
+recomputes the table from scratch after deletes or data fixes. The table is
+created and backfilled by migration 003 in db_migrations.py.
+"""
+import threading
+import time
+
+import pymysql
+
+from utils import Config, get_db_connection
+
+# master_data columns offered as dropdown options
+MASTER_DATA_OPTION_COLUMNS = (
+    'calendar_month',
+    'month_report_pmo_21_20',
+    'month_cd_key_26_25',
+    'learning_hours',
+)
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS filter_options (
+        option_type VARCHAR(50) NOT NULL,
+        option_value VARCHAR(255) NOT NULL,
+        PRIMARY KEY (option_type, option_value)
+    )
+"""
+
+
+def _option_value_sql(column):
+    """SQL twin of _option_value(): hours are stored without trailing zeros"""
+    if column == 'learning_hours':
+        value = f"CAST({column} AS CHAR)"
+        return (f"IF(LOCATE('.', {value}) > 0, "
+                f"TRIM(TRAILING '.' FROM TRIM(TRAILING '0' FROM {value})), {value})")
+    return column
+
+
+def backfill_statements():
+    """INSERT IGNORE ... SELECT DISTINCT statements that fill the whole table"""
+    statements = [
+        f"""
+        INSERT IGNORE INTO filter_options (option_type, option_value)
+        SELECT DISTINCT '{column}', {_option_value_sql(column)} FROM master_data
+        WHERE {column} IS NOT NULL AND {column} != ''
+        """
+        for column in MASTER_DATA_OPTION_COLUMNS
+    ]
+    # fiscal_year is the indexed generated column added by migration 001
+    statements.append("""
+        INSERT IGNORE INTO filter_options (option_type, option_value)
+        SELECT DISTINCT 'fiscal_year', fiscal_year FROM master_data WHERE fiscal_year IS NOT NULL
+    """)
+    statements.append(_TRAINING_NAME_BACKFILL)
+    return statements
+
+
+_TRAINING_NAME_BACKFILL = """
+    INSERT IGNORE INTO filter_options (option_type, option_value)
+    SELECT DISTINCT 'training_name', Training_Name FROM training_names
+    WHERE Training_Name IS NOT NULL AND Training_Name != ''
+"""
+
+_lock = threading.Lock()
+_options = None
+_loaded_at = 0.0
+
+
+def _fiscal_year_of(value):
+    if value is None or not hasattr(value, 'month'):
+        return None
+    return value.year if value.month >= 4 else value.year - 1
+
+
+def _option_value(column, value):
+    if value is None or value == '':
+        return None
+    if column == 'learning_hours':
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return str(int(value)) if value.is_integer() else str(value)
+    return str(value)
+
+
+def record_master_data_options(cursor, values):
+    """Add the dropdown values of one master_data row being written.
+
+    ``values`` maps master_data columns to the values written; only the
+    option columns and start_date (for the fiscal year) are used. Runs on the
+    caller's cursor so it commits with the write; call
+    ``filter_options_changed()`` after the commit.
+    """
+    rows = []
+    for column in MASTER_DATA_OPTION_COLUMNS:
+        option = _option_value(column, values.get(column))
+        if option is not None:
+            rows.append((column, option))
+    fiscal_year = _fiscal_year_of(values.get('start_date'))
+    if fiscal_year is not None:
+        rows.append(('fiscal_year', str(fiscal_year)))
+    if not rows:
+        return
+    try:
+        cursor.executemany(
+            "INSERT IGNORE INTO filter_options (option_type, option_value) VALUES (%s, %s)",
+            rows
+        )
+    except pymysql.MySQLError as e:
+        # The store is an optimisation; never fail the attendance write for it
+        print(f"Error recording filter options: {str(e)}")
+
+
+def refresh_training_name_options(cursor):
+    """Replace the training-name options after training_names was reloaded"""
+    try:
+        cursor.execute("DELETE FROM filter_options WHERE option_type = 'training_name'")
+        cursor.execute(_TRAINING_NAME_BACKFILL)
+    except pymysql.MySQLError as e:
+        print(f"Error refreshing training name options: {str(e)}")
+
+
+def filter_options_changed():
+    """Drop this process's in-memory copy; the next read reloads the table"""
+    global _options
+    with _lock:
+        _options = None
+
+
+def rebuild_filter_options():
+    """Recompute the whole table from master_data and training_names"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_TABLE_SQL)
+            cursor.execute("DELETE FROM filter_options")
+            for statement in backfill_statements():
+                cursor.execute(statement)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error rebuilding filter options: {str(e)}")
+        raise
+    finally:
+        conn.close()
+    filter_options_changed()
+
+
+def _build_options(rows):
+    options = {column: set() for column in MASTER_DATA_OPTION_COLUMNS}
+    options['training_name'] = set()
+    options['fiscal_year'] = set()
+    for row in rows:
+        options.setdefault(row['option_type'], set()).add(row['option_value'])
+
+    hours = set()
+    for value in options.pop('learning_hours'):
+        option = _option_value('learning_hours', value)
+        if option is not None:
+            hours.add(float(option))
+    fiscal_years = {int(value) for value in options.pop('fiscal_year') if str(value).isdigit()}
+
+    options = {option_type: sorted(values) for option_type, values in options.items()}
+    options['learning_hours'] = [int(h) if h.is_integer() else h for h in sorted(hours)]
+    options['fiscal_year'] = sorted(fiscal_years, reverse=True)
+    return options
+
+
+def _load_from_source(cursor):
+    """Fallback when the filter_options table is missing: scan the sources"""
+    rows = []
+    for column in MASTER_DATA_OPTION_COLUMNS:
+        cursor.execute(f"SELECT DISTINCT {column} AS value FROM master_data WHERE {column} IS NOT NULL")
+        rows.extend({'option_type': column, 'option_value': _option_value(column, row['value'])}
+                    for row in cursor.fetchall() if _option_value(column, row['value']) is not None)
+    cursor.execute("""
+        SELECT DISTINCT YEAR(start_date) - IF(MONTH(start_date) >= 4, 0, 1) AS value
+        FROM master_data WHERE start_date IS NOT NULL
+    """)
+    rows.extend({'option_type': 'fiscal_year', 'option_value': str(row['value'])}
+                for row in cursor.fetchall())
+    cursor.execute("SELECT DISTINCT Training_Name AS value FROM training_names WHERE Training_Name IS NOT NULL")
+    rows.extend({'option_type': 'training_name', 'option_value': row['value']}
+                for row in cursor.fetchall())
+    return rows
+
+
+def _load_options():
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            try:
+                cursor.execute("SELECT option_type, option_value FROM filter_options")
+                rows = cursor.fetchall()
+            except pymysql.MySQLError as e:
+                print(f"Filter options store unavailable, scanning master_data: {str(e)}")
+                rows = _load_from_source(cursor)
+        return _build_options(rows)
+    except Exception as e:
+        print(f"Error loading filter options: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+
+def get_filter_options():
+    """Dropdown options for the master data views.
+
+    Returns a dict of sorted lists keyed by calendar_month,
+    month_report_pmo_21_20, month_cd_key_26_25, learning_hours, training_name
+    and fiscal_year (newest first), or None if the database is unreachable.
+    Callers must not mutate the lists.
+    """
+    global _options, _loaded_at
+    with _lock:
+        if _options is not None and time.monotonic() - _loaded_at < Config.FILTER_OPTIONS_TTL_SECONDS:
+            return _options
+
+    options = _load_options()
+    if options is not None:
+        with _lock:
+            _options = options
+            _loaded_at = time.monotonic()
+    return options
@@ -0,0 +1,130 @@
+"""Per-employee, per-fiscal-year learning hours summary.
+
+The hours cards (6+ SHE, 10+ PMO, 16+ completed and cumulative) and their
+Excel exports sum SHE and PMO hours per employee. Instead of re-aggregating
+every raw master_data row on each render, the employee_hours_summary table
+keeps one row per (per_no, fiscal_year, employee_group) with she_hours,
+pmo_hours and total_hours, credited with the same rule as
+``dashboard_metrics.learning_hours_sql()``:
+
+* writers call ``refresh_employee_hours(cursor, per_nos)`` for the employees
+  whose master_data rows they inserted or updated, on their own cursor, so
+  the summary commits (or rolls back) with the write;
+* ``rebuild_employee_hours_summary()`` recomputes the whole table after
+  deletes, data fixes or a bulk load that did not refresh it:
+
+    python hours_summary.py --rebuild
+
+The table is created and backfilled by migration 004 in db_migrations.py.
+Readers (``dashboard_metrics.fetch_hours_buckets`` and
+``fetch_employee_hours``) use it when the filters only narrow by fiscal year
+and fall back to master_data otherwise.
+"""
+import sys
+
+import pymysql
+
+from dashboard_metrics import SHE_CATEGORY, learning_hours_sql
+from metrics_cache import invalidate_metrics_cache
+from utils import get_db_connection
+
+# per_nos refreshed per DELETE/INSERT ... SELECT round trip
+REFRESH_BATCH = 500
+
+# MySQL "table doesn't exist": migration 004 has not been applied yet
+NO_SUCH_TABLE = 1146
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS employee_hours_summary (
+        per_no VARCHAR(50) NOT NULL,
+        fiscal_year SMALLINT NOT NULL,
+        employee_group VARCHAR(100) NOT NULL,
+        she_hours DECIMAL(12, 2) NOT NULL DEFAULT 0,
+        pmo_hours DECIMAL(12, 2) NOT NULL DEFAULT 0,
+        total_hours DECIMAL(12, 2) NOT NULL DEFAULT 0,
+        last_id INT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (per_no, fiscal_year, employee_group),
+        INDEX idx_employee_hours_group_year (employee_group, fiscal_year)
+    )
+"""
+
+
+def _summary_insert_sql(where_sql=""):
+    """INSERT ... SELECT that aggregates master_data into the summary.
+
+    Rows without a start_date go to fiscal year 0 so that unfiltered totals
+    still include them.
+    """
+    hours = learning_hours_sql()
+    return f"""
+        INSERT INTO employee_hours_summary
+            (per_no, fiscal_year, employee_group, she_hours, pmo_hours, total_hours, last_id)
+        SELECT
+            per_no,
+            IFNULL(YEAR(start_date) - IF(MONTH(start_date) >= 4, 0, 1), 0) AS fiscal_year,
+            IFNULL(employee_group, '') AS employee_group,
+            SUM(CASE WHEN pmo_training_category = '{SHE_CATEGORY}' THEN {hours} ELSE 0 END),
+            SUM(CASE WHEN pmo_training_category = '{SHE_CATEGORY}' THEN 0 ELSE {hours} END),
+            SUM({hours}),
+            MAX(id)
+        FROM master_data
+        WHERE per_no IS NOT NULL AND per_no != '' {where_sql}
+        GROUP BY 1, 2, 3
+    """
+
+
+def backfill_statements():
+    """Statements that fill the table from scratch"""
+    return [_summary_insert_sql()]
+
+
+def refresh_employee_hours(cursor, per_nos):
+    """Recompute the summary rows of the given employees from master_data.
+
+    Runs on the caller's cursor inside its transaction; call it after the
+    master_data write and before the commit. Any other database error is
+    raised so that the write rolls back rather than leaving the summary stale.
+    """
+    keys = list(dict.fromkeys(str(per_no).strip() for per_no in per_nos
+                              if per_no is not None and str(per_no).strip()))
+    try:
+        for start in range(0, len(keys), REFRESH_BATCH):
+            batch = keys[start:start + REFRESH_BATCH]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f"DELETE FROM employee_hours_summary WHERE per_no IN ({placeholders})", batch)
+            cursor.execute(_summary_insert_sql(f"AND per_no IN ({placeholders})"), batch)
+    except pymysql.MySQLError as e:
+        if not (e.args and e.args[0] == NO_SUCH_TABLE):
+            raise
+        print(f"Employee hours summary not created yet, skipping refresh: {str(e)}")
+
+
+def rebuild_employee_hours_summary():
+    """Recompute the whole table from master_data"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_TABLE_SQL)
+            cursor.execute("DELETE FROM employee_hours_summary")
+            for statement in backfill_statements():
+                cursor.execute(statement)
+            cursor.execute("SELECT COUNT(*) AS rows_count FROM employee_hours_summary")
+            rows_count = (cursor.fetchone() or {}).get('rows_count', 0)
+        conn.commit()
+        print(f"employee_hours_summary rebuilt: {rows_count} rows")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error rebuilding employee hours summary: {str(e)}")
+        raise
+    finally:
+        conn.close()
+    invalidate_metrics_cache('employee hours summary rebuilt')
+    return rows_count
+
+
+if __name__ == '__main__':
+    if '--rebuild' in sys.argv[1:]:
+        rebuild_employee_hours_summary()
+    else:
+        print("Usage: python hours_summary.py --rebuild")
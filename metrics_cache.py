@@ -0,0 +1,231 @@
+"""Caching helpers for the dashboard metrics.
+
+Two layers, both keyed on a canonical form of the filter dict:
+
+* ``request_memoized`` remembers results on ``flask.g`` for the lifetime of
+  one request, and counts hits and misses so the saving can be checked from
+  the ``X-Metrics-Memo`` response header.
+* ``cached_metrics`` keeps results in a bounded, process-wide LRU cache with
+  a TTL, so coordinators reloading /master_data with the same filters do not
+  recompute everything. Code that changes master_data, eor_data, the TNI
+  tables or the CD data tables must call ``invalidate_metrics_cache()``
+  after committing; the TTL bounds staleness for writes made by other
+  processes.
+"""
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context
+
+from utils import Config
+
+# Filters where 'All' means the same as no filter at all
+ALL_MEANS_UNFILTERED = ('gender', 'pl_category', 'pmo_training_category')
+
+# Process-wide totals across requests, for diagnostics
+_memo_totals = {'hits': 0, 'misses': 0}
+
+
+def _canonical_value(key, value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            return None
+        if key == 'fiscal_year' and value.startswith('FY '):
+            value = value.split()[1].split('-')[0]
+    if key in ALL_MEANS_UNFILTERED and value == 'All':
+        return None
+    return str(value)
+
+
+def canonical_filters(filters):
+    """Hashable, order-independent form of a filter dict.
+
+    Empty values, and 'All' where it means unfiltered, are dropped so that
+    equivalent filter dicts share one cache entry.
+    """
+    items = []
+    for key, value in (filters or {}).items():
+        value = _canonical_value(key, value)
+        if value is not None:
+            items.append((key, value))
+    return tuple(sorted(items))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return canonical_filters(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def make_key(name, filters, args=(), kwargs=None):
+    """Cache key for one call of a metrics function"""
+    return (name, canonical_filters(filters), _freeze(args),
+            tuple(sorted((k, _freeze(v)) for k, v in (kwargs or {}).items())))
+
+
+def _request_memo():
+    if '_metrics_memo' not in g:
+        g._metrics_memo = {}
+        g._metrics_memo_stats = {'hits': 0, 'misses': 0}
+    return g._metrics_memo, g._metrics_memo_stats
+
+
+def request_memoized(copy_result=True):
+    """Memoize ``func(filters, *args, **kwargs)`` for the current request.
+
+    Outside a request context the function is simply called. With
+    ``copy_result`` each caller gets its own deep copy, so a caller mutating
+    the result cannot leak into the next one; stateful results such as a
+    MetricsCube pass False to share one instance.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(filters, *args, **kwargs):
+            if not has_request_context():
+                return func(filters, *args, **kwargs)
+
+            memo, stats = _request_memo()
+            key = make_key(name, filters, args, kwargs)
+            if key in memo:
+                stats['hits'] += 1
+                _memo_totals['hits'] += 1
+                result = memo[key]
+            else:
+                stats['misses'] += 1
+                _memo_totals['misses'] += 1
+                result = memo[key] = func(filters, *args, **kwargs)
+            return copy.deepcopy(result) if copy_result else result
+
+        return wrapper
+    return decorator
+
+
+def request_memo_stats():
+    """Hit/miss counters of the current request (zeros outside a request)"""
+    if not has_request_context() or '_metrics_memo_stats' not in g:
+        return {'hits': 0, 'misses': 0}
+    return dict(g._metrics_memo_stats)
+
+
+def memo_totals():
+    """Hit/miss counters accumulated by this process since start-up"""
+    return dict(_memo_totals)
+
+
+def add_memo_header(response):
+    """after_request hook: report the request's memo counters in a header"""
+    stats = request_memo_stats()
+    if stats['hits'] or stats['misses']:
+        response.headers['X-Metrics-Memo'] = f"hits={stats['hits']}; misses={stats['misses']}"
+    return response
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds"""
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped by clear(); results computed across a clear() are not stored
+        self.generation = 0
+
+    def get(self, key):
+        """Return (found, value); expired entries count as misses"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, generation=None):
+        """Store value, unless the cache was cleared since ``generation`` was read"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+
+
+metrics_cache = TTLCache(max_entries=Config.METRICS_CACHE_MAX_ENTRIES,
+                         ttl=Config.METRICS_CACHE_TTL_SECONDS)
+
+
+def cached_metrics(copy_result=True, fallback=None):
+    """Cache ``func(filters, *args, **kwargs)`` across requests in ``metrics_cache``.
+
+    The function signals a failure by returning None (or raising); failures
+    are never cached, so a database hiccup cannot pin empty figures for the
+    whole TTL. When given, ``fallback(filters, *args, **kwargs)`` supplies
+    the empty/zero value callers get instead of None. A result computed while
+    invalidate_metrics_cache() ran is returned but not stored.
+    ``copy_result`` behaves as in request_memoized().
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(filters, *args, **kwargs):
+            key = make_key(name, filters, args, kwargs)
+            found, result = metrics_cache.get(key)
+            if not found:
+                generation = metrics_cache.generation
+                result = func(filters, *args, **kwargs)
+                if result is None:
+                    return fallback(filters, *args, **kwargs) if fallback else None
+                metrics_cache.set(key, result, generation)
+            return copy.deepcopy(result) if copy_result else result
+
+        return wrapper
+    return decorator
+
+
+def invalidate_metrics_cache(reason=None):
+    """Drop every cached metric; call after committing a data change"""
+    metrics_cache.clear()
+    if reason:
+        print(f"Metrics cache invalidated: {reason}")
+
+
+def metrics_cache_stats():
+    """Counters of the cross-request metrics cache"""
+    return metrics_cache.stats()
@@ -0,0 +1,78 @@
+"""Pending EOR: employees on roll who never trained as PERMANENT.
+
+Counts and lists are computed in MySQL with the indexed NOT EXISTS anti-join
+of ``dashboard_metrics.pending_eor_sql()``, filtered like the EOR cards
+(factory, gender, employee_group, bc_no), instead of pulling every per_no of
+eor_data and master_data into Python sets. Lists are read through an
+unbuffered cursor so exports can stream them row by row:
+
+    for employee in iter_pending_eor({'factory': factory}):
+        ...
+"""
+import pymysql.cursors
+
+from dashboard_metrics import eor_conditions, pending_eor_sql
+from utils import get_db_connection
+
+PENDING_EOR_COLUMNS = ('per_no', 'participants_name', 'bc_no', 'gender',
+                       'employee_group', 'department', 'factory')
+
+
+def _pending_eor_where(filters):
+    eor_sql, eor_params = eor_conditions(filters, 'e.')
+    pending_sql, pending_params = pending_eor_sql(filters)
+    return (f"WHERE e.per_no IS NOT NULL AND e.per_no != '' {eor_sql} AND {pending_sql}",
+            eor_params + pending_params)
+
+
+def count_pending_eor(filters):
+    """Number of distinct pending EOR employees, or 0 if the database is unreachable"""
+    where_sql, params = _pending_eor_where(filters)
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT e.per_no) AS pending_eor_count
+                FROM eor_data e
+                {where_sql}
+            """, params)
+            return int((cursor.fetchone() or {}).get('pending_eor_count') or 0)
+    except Exception as e:
+        print(f"Error counting pending EOR employees: {str(e)}")
+        return 0
+    finally:
+        conn.close()
+
+
+def iter_pending_eor(filters):
+    """Yield pending EOR employees as dicts of PENDING_EOR_COLUMNS.
+
+    Rows are streamed from an unbuffered cursor; the connection is released
+    when the iteration finishes or the generator is closed.
+    """
+    where_sql, params = _pending_eor_where(filters)
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(f"""
+                SELECT {', '.join('e.' + column for column in PENDING_EOR_COLUMNS)}
+                FROM eor_data e
+                {where_sql}
+            """, params)
+            for row in cursor:
+                yield row
+    finally:
+        conn.close()
+
+
+def get_pending_eor_employees(filters):
+    """Pending EOR employees as a list of dicts"""
+    try:
+        return list(iter_pending_eor(filters))
+    except Exception as e:
+        print(f"Error getting pending EOR employees: {str(e)}")
+        return []
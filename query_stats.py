@@ -0,0 +1,199 @@
+"""Query instrumentation and slow-query log.
+
+Every cursor handed out by ``utils.get_db_connection()`` is wrapped in an
+``InstrumentedCursor``, which times each execute()/executemany() and records
+the normalized SQL (literals and placeholders replaced by ``?``, IN lists
+collapsed), the duration, the rows returned or affected and the Flask
+endpoint that issued it:
+
+* statements slower than the configured threshold are written to the
+  ``slow_queries`` logger (a file, when a path is configured);
+* per request, ``request_query_summary()`` gives the query count, total DB
+  time and the top statements by time; ``add_query_stats_header`` reports it
+  in ``X-DB-Queries`` / ``Server-Timing`` headers and prints the top
+  statements when a request runs more than the warning count, which is how
+  N+1 loops show up;
+* process-wide, ``query_totals()`` aggregates the same figures per endpoint
+  and statement since start-up (or the last ``reset_query_totals()``).
+
+The module does not import utils; utils wires it into the pool and calls
+``configure()`` with its Config values.
+"""
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import g, has_request_context, request
+
+slow_query_log = logging.getLogger('slow_queries')
+
+_settings = {
+    'slow_ms': 500.0,
+    'warn_count': 100,
+    'top_n': 5,
+    'max_entries': 2000,
+}
+
+_totals_lock = threading.Lock()
+# (endpoint, normalized sql) -> {'count', 'seconds', 'rows', 'max_seconds'}
+_totals = {}
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s")
+_VALUE_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_ROWS_RE = re.compile(r"(\(\?\+\))(?:\s*,\s*\(\?\+\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def configure(slow_ms=None, log_path=None, warn_count=None, top_n=None, max_entries=None):
+    """Set thresholds; ``log_path`` sends the slow-query log to that file"""
+    for key, value in (('slow_ms', slow_ms), ('warn_count', warn_count),
+                       ('top_n', top_n), ('max_entries', max_entries)):
+        if value is not None:
+            _settings[key] = value
+    if log_path and not slow_query_log.handlers:
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_query_log.addHandler(handler)
+        slow_query_log.setLevel(logging.INFO)
+        slow_query_log.propagate = False
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(query):
+    """Statement shape shared by every execution with different values"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    sql = _COMMENT_RE.sub(' ', query)
+    sql = _STRING_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _VALUE_LIST_RE.sub('(?+)', sql)
+    sql = _VALUES_ROWS_RE.sub(r'\1, ...', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _current_endpoint():
+    if has_request_context():
+        return request.endpoint or request.path
+    return None
+
+
+def record_query(query, seconds, rows):
+    """Account one statement against the request and the process totals"""
+    sql = normalize_sql(query)
+    endpoint = _current_endpoint()
+    # Unbuffered cursors (SSCursor) report 2**64 - 1 until the rows are read
+    rows = rows if rows is not None and 0 <= rows < 2 ** 63 else 0
+
+    if has_request_context():
+        if '_query_stats' not in g:
+            g._query_stats = {'count': 0, 'seconds': 0.0, 'by_sql': {}}
+        stats = g._query_stats
+        stats['count'] += 1
+        stats['seconds'] += seconds
+        entry = stats['by_sql'].setdefault(sql, {'count': 0, 'seconds': 0.0, 'rows': 0})
+        entry['count'] += 1
+        entry['seconds'] += seconds
+        entry['rows'] += rows
+
+    key = (endpoint, sql)
+    with _totals_lock:
+        entry = _totals.get(key)
+        if entry is None and len(_totals) < _settings['max_entries']:
+            entry = _totals[key] = {'count': 0, 'seconds': 0.0, 'rows': 0, 'max_seconds': 0.0}
+        if entry is not None:
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['rows'] += rows
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+    if seconds * 1000 >= _settings['slow_ms']:
+        slow_query_log.warning(f"{seconds * 1000:.1f} ms rows={rows} "
+                               f"endpoint={endpoint or '-'} sql={sql}")
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute()/executemany() through record_query()"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._cursor.__exit__(exc_type, exc, tb)
+
+    def _timed(self, method, query, args):
+        start = time.perf_counter()
+        try:
+            return method(query, args)
+        finally:
+            record_query(query, time.perf_counter() - start, self._cursor.rowcount)
+
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args)
+
+
+def _top(by_sql, limit):
+    ranked = sorted(by_sql.items(), key=lambda item: item[1]['seconds'], reverse=True)
+    return [{'sql': sql, 'count': entry['count'], 'rows': entry['rows'],
+             'total_ms': round(entry['seconds'] * 1000, 1)}
+            for sql, entry in ranked[:limit]]
+
+
+def request_query_summary(limit=None):
+    """Query count, total DB time and top statements of the current request"""
+    if not has_request_context() or '_query_stats' not in g:
+        return {'count': 0, 'total_ms': 0.0, 'top': []}
+    stats = g._query_stats
+    return {'count': stats['count'],
+            'total_ms': round(stats['seconds'] * 1000, 1),
+            'top': _top(stats['by_sql'], limit or _settings['top_n'])}
+
+
+def add_query_stats_header(response):
+    """after_request hook: report the request's DB usage and flag query-heavy requests"""
+    summary = request_query_summary()
+    if not summary['count']:
+        return response
+    response.headers['X-DB-Queries'] = f"count={summary['count']}; time_ms={summary['total_ms']}"
+    response.headers.add('Server-Timing', f'db;dur={summary["total_ms"]};desc="{summary["count"]} queries"')
+    if summary['count'] >= _settings['warn_count']:
+        print(f"[query stats] {request.method} {request.path} ran {summary['count']} queries "
+              f"({summary['total_ms']} ms); top statements:")
+        for entry in summary['top']:
+            print(f"    {entry['count']}x {entry['total_ms']} ms  {entry['sql'][:200]}")
+    return response
+
+
+def query_totals(limit=50, endpoint=None):
+    """Process-wide statements ranked by total time, optionally for one endpoint"""
+    with _totals_lock:
+        items = [(key, dict(entry)) for key, entry in _totals.items()
+                 if endpoint is None or key[0] == endpoint]
+    items.sort(key=lambda item: item[1]['seconds'], reverse=True)
+    return [{'endpoint': key[0] or '-', 'sql': key[1], 'count': entry['count'], 'rows': entry['rows'],
+             'total_ms': round(entry['seconds'] * 1000, 1),
+             'avg_ms': round(entry['seconds'] * 1000 / entry['count'], 2),
+             'max_ms': round(entry['max_seconds'] * 1000, 1)}
+            for key, entry in items[:limit]]
+
+
+def reset_query_totals():
+    with _totals_lock:
+        _totals.clear()
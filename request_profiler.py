@@ -0,0 +1,186 @@
+"""Per-endpoint latency and resource profiling for the Flask apps.
+
+``init_profiler(app)`` registers request hooks that measure, for every
+request, the wall time, DB time (from query_stats), Python CPU time of the
+request thread, peak memory allocated and response size. Samples are kept in
+rolling windows of ``Config.PROFILE_WINDOW`` requests per endpoint and per
+blueprint, from which p50/p95/p99 are computed on demand; admins see them at
+/admin/profiling.
+
+Peak memory uses tracemalloc, which slows allocation-heavy code, so it is
+only measured with ``Config.PROFILE_TRACK_MEMORY`` on. tracemalloc's peak is
+process-wide, so with concurrent requests it is an upper bound.
+
+An admin can profile a single request by sending the ``X-Profile: 1`` header:
+the view runs under cProfile and the stats are dumped to
+``Config.PROFILE_DUMP_DIR``; the file name comes back in ``X-Profile-Dump``
+(open it with ``python -m pstats <file>``).
+"""
+import cProfile
+import math
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+from flask import Blueprint, flash, g, redirect, render_template, request, session, url_for
+
+from query_stats import query_totals, request_query_summary
+from utils import Config, db_pool_stats
+
+PROFILE_HEADER = 'X-Profile'
+
+profiling_bp = Blueprint('profiling', __name__)
+
+_lock = threading.Lock()
+# key -> deque of (wall_ms, db_ms, cpu_ms, peak_kb, size_bytes, status)
+_samples = {}
+_totals = {}
+
+
+def _is_admin():
+    return session.get('logged_in') and session.get('role') == 'Admin'
+
+
+def _start_profile():
+    g._profile = {
+        'wall': time.perf_counter(),
+        'cpu': time.thread_time(),
+        'memory': None,
+        'profiler': None,
+    }
+    if Config.PROFILE_TRACK_MEMORY and tracemalloc.is_tracing():
+        g._profile['memory'] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    if request.headers.get(PROFILE_HEADER) == '1' and _is_admin():
+        profiler = cProfile.Profile()
+        profiler.enable()
+        g._profile['profiler'] = profiler
+
+
+def _dump_profile(profiler):
+    os.makedirs(Config.PROFILE_DUMP_DIR, exist_ok=True)
+    endpoint = (request.endpoint or 'unknown').replace('.', '_')
+    filename = f"{endpoint}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.prof"
+    profiler.dump_stats(os.path.join(Config.PROFILE_DUMP_DIR, filename))
+    return filename
+
+
+def _record(key, sample):
+    with _lock:
+        window = _samples.get(key)
+        if window is None:
+            window = _samples[key] = deque(maxlen=Config.PROFILE_WINDOW)
+            _totals[key] = 0
+        window.append(sample)
+        _totals[key] += 1
+
+
+def _finish_profile(response):
+    profile = g.pop('_profile', None)
+    if profile is None:
+        return response
+
+    if profile['profiler'] is not None:
+        profile['profiler'].disable()
+        try:
+            response.headers['X-Profile-Dump'] = _dump_profile(profile['profiler'])
+        except OSError as e:
+            print(f"Error writing profile dump: {str(e)}")
+
+    wall_ms = (time.perf_counter() - profile['wall']) * 1000
+    cpu_ms = (time.thread_time() - profile['cpu']) * 1000
+    peak_kb = None
+    if profile['memory'] is not None and tracemalloc.is_tracing():
+        peak_kb = max(tracemalloc.get_traced_memory()[1] - profile['memory'], 0) / 1024
+    db_ms = request_query_summary()['total_ms']
+    size = response.content_length
+    if size is None:
+        size = response.calculate_content_length()
+
+    sample = (wall_ms, db_ms, cpu_ms, peak_kb, size, response.status_code)
+    _record(('endpoint', request.endpoint or request.path), sample)
+    _record(('blueprint', request.blueprint or 'app'), sample)
+    return response
+
+
+def _teardown_profile(exc):
+    # after_request is skipped when a view raises; never leave cProfile enabled
+    profile = g.pop('_profile', None)
+    if profile is not None and profile['profiler'] is not None:
+        profile['profiler'].disable()
+
+
+def init_profiler(app):
+    """Register the profiling hooks and the admin page on an app"""
+    if Config.PROFILE_TRACK_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    # Run before every other before_request hook (login checks included)
+    app.before_request_funcs.setdefault(None, []).insert(0, _start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_teardown_profile)
+    app.register_blueprint(profiling_bp)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # Nearest rank
+    index = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def _summarize(window, total):
+    wall = sorted(sample[0] for sample in window)
+    count = len(window)
+    peaks = [sample[3] for sample in window if sample[3] is not None]
+    sizes = [sample[4] for sample in window if sample[4] is not None]
+    return {
+        'requests': total,
+        'window': count,
+        'p50_ms': round(_percentile(wall, 50), 1),
+        'p95_ms': round(_percentile(wall, 95), 1),
+        'p99_ms': round(_percentile(wall, 99), 1),
+        'max_ms': round(wall[-1], 1) if wall else 0.0,
+        'avg_db_ms': round(sum(sample[1] for sample in window) / count, 1),
+        'avg_cpu_ms': round(sum(sample[2] for sample in window) / count, 1),
+        'max_peak_kb': round(max(peaks), 1) if peaks else None,
+        'avg_size_kb': round(sum(sizes) / len(sizes) / 1024, 1) if sizes else None,
+        'errors': sum(1 for sample in window if sample[5] >= 500),
+    }
+
+
+def profile_summary(kind='endpoint'):
+    """Rolling stats per endpoint (or blueprint), slowest p95 first"""
+    with _lock:
+        snapshot = [(key[1], list(window), _totals[key])
+                    for key, window in _samples.items() if key[0] == kind and window]
+    rows = [dict(_summarize(window, total), name=name) for name, window, total in snapshot]
+    rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+    return rows
+
+
+def reset_profiles():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+
+
+@profiling_bp.route('/admin/profiling', methods=['GET', 'POST'])
+def profiling_dashboard():
+    if not _is_admin():
+        flash('You do not have permission to access the profiling page', 'error')
+        return redirect(url_for('home'))
+    if request.method == 'POST':
+        reset_profiles()
+        flash('Profiling statistics reset', 'success')
+        return redirect(url_for('profiling.profiling_dashboard'))
+    return render_template('admin/profiling.html',
+                           endpoints=profile_summary('endpoint'),
+                           blueprints=profile_summary('blueprint'),
+                           top_queries=query_totals(limit=25),
+                           pool=db_pool_stats(),
+                           window=Config.PROFILE_WINDOW,
+                           track_memory=Config.PROFILE_TRACK_MEMORY)
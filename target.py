@@ -1,20 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 import pandas as pd
-import mysql.connector
-from mysql.connector import Error
+from pymysql import MySQLError as Error
 from datetime import datetime
 from collections import defaultdict
+from utils import get_db_connection
+from metrics_cache import invalidate_metrics_cache
 
 target_bp = Blueprint('target', __name__, url_prefix='/target')
 
-# Database configuration
-db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '123456',
-    'database': 'masterdata'
-}
-
 def get_month_index():
     """Get the current month index where April=1, May=2, ..., January=10"""
     current_month = datetime.now().month
@@ -24,8 +17,9 @@ def get_month_index():
         return min(current_month + 9, 10)
 
 def create_connection():
+    """Pooled connection from utils.get_db_connection (rows are dicts)"""
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = get_db_connection()
         return conn
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
@@ -38,7 +32,7 @@ def get_available_years():
         return []
     
     try:
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
         cursor.execute("SELECT DISTINCT target_year FROM training_targets ORDER BY target_year DESC")
         db_years = [year['target_year'] for year in cursor.fetchall()]
         return db_years
@@ -53,7 +47,7 @@ def initialize_new_year(target_year, conn, source_year=None):
     """Initialize a new year by copying structure from specified source year"""
     if source_year is None:
         # If no source year specified, use the latest available year
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
         cursor.execute("SELECT MAX(target_year) as latest_year FROM training_targets")
         result = cursor.fetchone()
         source_year = result['latest_year'] if result['latest_year'] else target_year - 1
@@ -86,7 +80,7 @@ def initialize_new_year(target_year, conn, source_year=None):
 def sync_training_data_from_master(target_year, conn):
     """Sync training data from training_names table to training_targets table"""
     try:
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
         
         cursor.execute("""
             SELECT 
@@ -129,7 +123,7 @@ def update_training_completion_counts(conn, training_name=None, tni_status=None)
     Update training completion counts in training_targets table based on master_data attendance.
     """
     try:
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
         
         # First reset all counts to 0 for current year (except totals)
         current_year = datetime.now().year
@@ -398,7 +392,7 @@ def get_training_data(target_year):
         return []
     
     try:
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
         # Fetch rows for the selected year
         cursor.execute("""
@@ -552,6 +546,8 @@ def edit_data():
 
             update_totals_in_db(target_year, conn)
             conn.commit()
+            # Dashboard target cards read training_targets
+            invalidate_metrics_cache(f"training targets edited for {target_year}")
             flash('Data updated successfully', 'success')
             return redirect(url_for('target.dashboard', target_year=target_year))
 
@@ -764,8 +760,8 @@ def check_year_has_data(target_year):
     
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM training_targets WHERE target_year = %s", (target_year,))
-        count = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) AS row_count FROM training_targets WHERE target_year = %s", (target_year,))
+        count = cursor.fetchone()['row_count']
         return count > 0
     except Error:
         return False
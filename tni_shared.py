@@ -1,26 +1,33 @@
 from flask import Blueprint, render_template, request, current_app, flash, redirect, url_for
 import pandas as pd
-import mysql.connector
 import os
 import math
+import random
+from collections import defaultdict
 from werkzeug.utils import secure_filename
 from datetime import datetime
+from metrics_cache import invalidate_metrics_cache
+from excel_ingest import ExcelRowStream
+from utils import get_db_connection
 
 tni_shared_bp = Blueprint('training', __name__, template_folder='templates/admin')
 
-# Database configuration
-db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '123456',
-    'database': 'masterdata',
-    'charset': 'utf8mb4',
-    'collation': 'utf8mb4_bin'
-}
+# Employee rows read from the TNI sheet per melt/insert chunk
+TNI_UPLOAD_CHUNK_ROWS = 500
+# Melted tni_data rows per multi-row INSERT, well under max_allowed_packet
+TNI_INSERT_BATCH_ROWS = 1000
+TNI_DATA_COLUMNS = ['per_no', 'name', 'factory', 'bc_no', 'training_name', 'hours', 'year']
+
+def read_frame(conn, query, params=None):
+    """DataFrame of a query's result, read through the pooled connection's dict rows"""
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
 
 def get_available_years():
     """Get all available years from the database"""
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db_connection()
     try:
         cursor = conn.cursor()
         cursor.execute("""
@@ -32,12 +39,12 @@ def get_available_years():
                 SELECT DISTINCT year FROM final_tni_data WHERE year IS NOT NULL
             ) years ORDER BY year DESC
         """)
-        return [row[0] for row in cursor.fetchall()]
+        return [row['year'] for row in cursor.fetchall()]
     finally:
         conn.close()
 
 def create_final_tni_data_table():
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -54,170 +61,214 @@ def create_final_tni_data_table():
         ) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
     """)
     
+    # Input signature and target each training was last allocated with, so
+    # process_training_data only re-allocates trainings that changed
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tni_training_hashes (
+            year INT NOT NULL,
+            training_name VARCHAR(100) COLLATE utf8mb4_bin NOT NULL,
+            input_hash VARCHAR(100) NOT NULL,
+            target INT NOT NULL,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (year, training_name)
+        ) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
+    """)
+    
     conn.commit()
     cursor.close()
     conn.close()
 
-def process_training_data(year=None):
+def bulk_insert_ignore(cursor, table, columns, rows):
+    """INSERT IGNORE rows into table, TNI_INSERT_BATCH_ROWS per statement.
+    
+    The multi-row VALUES list is built here so every statement carries a
+    fixed number of rows, whatever the driver's executemany() batching does.
+    Returns the number of rows sent.
+    """
+    row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    for start in range(0, len(rows), TNI_INSERT_BATCH_ROWS):
+        batch = rows[start:start + TNI_INSERT_BATCH_ROWS]
+        cursor.execute(
+            f"INSERT IGNORE INTO {table} ({', '.join(columns)}) "
+            f"VALUES {', '.join([row_placeholder] * len(batch))}",
+            [value for row in batch for value in row]
+        )
+    return len(rows)
+
+def factory_quotas(factory_counts, target):
+    """Seats per factory when a training has more nominees than its target.
+    
+    Each factory gives up floor(count / total * overcount) seats; the seats
+    still over target are taken one each from the largest factories. The
+    quotas always add up to the target.
+    """
+    total_participants = sum(factory_counts.values())
+    overcount = total_participants - target
+    reductions = {factory: math.floor(count / total_participants * overcount)
+                  for factory, count in factory_counts.items()}
+    remaining_adjustment = overcount - sum(reductions.values())
+    
+    # Largest factories first; ties by name so the result is reproducible
+    by_size = sorted(factory_counts, key=lambda factory: (-factory_counts[factory], factory))
+    for factory in by_size[:remaining_adjustment]:
+        reductions[factory] += 1
+    return {factory: count - reductions[factory] for factory, count in factory_counts.items()}
+
+def select_final_nominees(candidates, target, year, training_name):
+    """Pick the final TNI rows for one training.
+    
+    candidates maps per_no to its tni_data row. All of them are kept when
+    they fit the target; otherwise each factory keeps its factory_quotas()
+    share, sampled with a generator seeded by year, training and factory so
+    reprocessing the same data picks the same people.
+    """
+    if len(candidates) <= target:
+        return list(candidates.values())
+    
+    by_factory = defaultdict(list)
+    for per_no in sorted(candidates):
+        by_factory[candidates[per_no][2]].append(per_no)
+    
+    quotas = factory_quotas({factory: len(per_nos) for factory, per_nos in by_factory.items()}, target)
+    selected = []
+    for factory in sorted(by_factory):
+        to_take = quotas[factory]
+        if to_take > 0:
+            sampler = random.Random(f"{year}|{training_name}|{factory}")
+            selected.extend(candidates[per_no] for per_no in sampler.sample(by_factory[factory], to_take))
+    return selected
+
+def get_training_input_hashes(cursor, year):
+    """Content hash of each training's distinct nominee rows for a year.
+    
+    Covers every column copied into final_tni_data, so a change of factory,
+    hours, name or BC number re-allocates the training. Rows are hashed with
+    MD5 and folded with an order-independent XOR and sum, so only one row per
+    training comes back from MySQL. NULLs are hashed as a NUL byte because
+    CONCAT_WS would otherwise skip them and shift the remaining columns.
+    """
+    columns = ", ".join(f"IFNULL({col}, '\\0')" for col in ('per_no', 'name', 'factory', 'bc_no', 'hours'))
+    row_hash = f"MD5(CONCAT_WS('|', {columns}))"
+    cursor.execute(f"""
+        SELECT training_name,
+               COUNT(*) AS row_count,
+               BIT_XOR(CAST(CONV(LEFT({row_hash}, 16), 16, 10) AS UNSIGNED)) AS xor_hash,
+               SUM(CAST(CONV(RIGHT({row_hash}, 8), 16, 10) AS UNSIGNED)) AS sum_hash
+        FROM (
+            SELECT DISTINCT per_no, name, factory, bc_no,
+                   training_name COLLATE utf8mb4_bin AS training_name, hours
+            FROM tni_data
+            WHERE factory IS NOT NULL 
+            AND factory != ''
+            AND year = %s
+        ) nominee_rows
+        GROUP BY training_name
+    """, (year,))
+    return {row['training_name']: f"{row['row_count']}-{row['xor_hash']}-{row['sum_hash']}"
+            for row in cursor.fetchall()}
+
+def process_training_data(year=None, full=False):
+    """Bring final_tni_data for a year in line with tni_data and the targets.
+    
+    Each training's nominee rows are summarised by a content hash computed in
+    MySQL. Only trainings whose hash or target differs from the one stored in
+    tni_training_hashes at their last allocation are re-allocated (all of
+    them with ``full=True``), so a small correction costs time proportional
+    to what changed. Targets, hashes and the changed trainings' nominees are
+    read with one query each, the factory-balanced selection runs in Python,
+    and the changed rows are replaced with one bulk insert in a single
+    transaction.
+    """
     if year is None:
         year = datetime.now().year
     
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        # Delete existing data for this year
-        cursor.execute("DELETE FROM final_tni_data WHERE year = %s", (year,))
-        conn.commit()
+        # Get all training targets for this year; a training listed twice
+        # keeps its largest target
+        cursor.execute("""
+            SELECT training_name, MAX(target) AS target
+            FROM training_targets
+            WHERE target_year = %s
+            GROUP BY training_name
+        """, (year,))
+        targets = {row['training_name']: int(row['target'] or 0) for row in cursor.fetchall()}
         
-        # Get all training targets for this year
-        target_query = """
-            SELECT t.training_name COLLATE utf8mb4_bin, t.target, 
-                   COUNT(DISTINCT d.per_no) as actual_count
-            FROM training_targets t
-            LEFT JOIN tni_data d ON t.training_name COLLATE utf8mb4_bin = d.training_name COLLATE utf8mb4_bin
-                               AND d.factory IS NOT NULL 
-                               AND d.factory != ''
-                               AND d.year = %s
-            WHERE t.target_year = %s
-            GROUP BY t.training_name, t.target
-        """
-        cursor.execute(target_query, (year, year))
-        target_data = cursor.fetchall()
+        current_hashes = get_training_input_hashes(cursor, year)
+        cursor.execute("""
+            SELECT training_name, input_hash, target
+            FROM tni_training_hashes
+            WHERE year = %s
+        """, (year,))
+        stored = {row['training_name']: (row['input_hash'], row['target']) for row in cursor.fetchall()}
+        # Nothing recorded for the year yet: rebuild it whole
+        full = full or not stored
         
-        total_inserted = 0
+        changed = [training_name for training_name, target in targets.items()
+                   if full or stored.get(training_name) != (current_hashes.get(training_name, ''), target)]
+        removed = [training_name for training_name in stored if training_name not in targets]
+        if not changed and not removed:
+            print(f"TNI allocation for {year} is up to date")
+            return
+        print(f"Re-allocating {len(changed)} trainings, dropping {len(removed)} for {year}")
         
-        for training_name, target, actual_count in target_data:
-            # Safely handle NULL targets
-            target = int(target or 0)
-            
+        # Nominee rows of the changed trainings only; ordered so the first row
+        # kept for a per_no does not depend on the query plan
+        candidates = defaultdict(dict)
+        if changed:
+            cursor.execute(f"""
+                SELECT DISTINCT per_no, name, factory, bc_no, training_name, hours
+                FROM tni_data
+                WHERE factory IS NOT NULL 
+                AND factory != ''
+                AND year = %s
+                AND training_name IN ({', '.join(['%s'] * len(changed))})
+                ORDER BY training_name, per_no, factory, bc_no, name, hours
+            """, [year] + changed)
+            for row in cursor.fetchall():
+                # final_tni_data is unique on (per_no, training_name, year);
+                # nominees are kept as tuples in TNI_DATA_COLUMNS order
+                candidates[row['training_name']].setdefault(row['per_no'], tuple(
+                    row[column] for column in TNI_DATA_COLUMNS if column != 'year'))
+        
+        final_rows = []
+        for training_name in changed:
+            target = targets[training_name]
             if target == 0:
                 # Skip trainings with zero target
                 continue
-                
-            if actual_count <= target:
-                # If we have less or equal to target, insert all available records
-                query = """
-                    INSERT IGNORE INTO final_tni_data (per_no, name, factory, bc_no, training_name, hours, year)
-                    SELECT DISTINCT per_no, name, factory, bc_no, training_name, hours, %s
-                    FROM tni_data
-                    WHERE training_name COLLATE utf8mb4_bin = %s
-                    AND factory IS NOT NULL 
-                    AND factory != ''
-                    AND year = %s
-                """
-                cursor.execute(query, (year, training_name, year))
-                inserted_count = min(actual_count, target)
-                
-            else:
-                # FACTORY-BALANCED LOGIC (from old code)
-                overcount = actual_count - target
-                
-                factory_query = """
-                    SELECT factory, COUNT(DISTINCT per_no) as factory_count
-                    FROM tni_data
-                    WHERE training_name COLLATE utf8mb4_bin = %s
-                    AND factory IS NOT NULL 
-                    AND factory != ''
-                    AND year = %s
-                    GROUP BY factory
-                """
-                cursor.execute(factory_query, (training_name, year))
-                factory_counts = cursor.fetchall()
-                
-                total_participants = sum(fc[1] for fc in factory_counts)
-                reductions = []
-                
-                for factory, count in factory_counts:
-                    reduction = math.floor(count / total_participants * overcount)
-                    reductions.append((factory, count, reduction))
-                
-                total_reduction = sum(r[2] for r in reductions)
-                remaining_adjustment = overcount - total_reduction
-                
-                reductions.sort(key=lambda x: x[1], reverse=True)
-                
-                for i in range(remaining_adjustment):
-                    if i < len(reductions):
-                        factory, count, reduction = reductions[i]
-                        reductions[i] = (factory, count, reduction + 1)
-                
-                for factory, count, reduction in reductions:
-                    to_take = count - reduction
-                    
-                    if to_take > 0:
-                        insert_query = """
-                            INSERT IGNORE INTO final_tni_data (per_no, name, factory, bc_no, training_name, hours, year)
-                            SELECT DISTINCT per_no, name, factory, bc_no, training_name, hours, %s
-                            FROM tni_data
-                            WHERE training_name COLLATE utf8mb4_bin = %s
-                            AND factory COLLATE utf8mb4_bin = %s
-                            AND factory IS NOT NULL 
-                            AND factory != ''
-                            AND year = %s
-                            ORDER BY RAND()
-                            LIMIT %s
-                        """
-                        cursor.execute(insert_query, (year, training_name, factory, year, to_take))
-                
-                inserted_count = target
-            
-            total_inserted += inserted_count
-            conn.commit()
-        
-        print(f"Total records inserted: {total_inserted}")
-        
-        # FINAL VERIFICATION AND ADJUSTMENT (from old code)
-        verify_query = """
-            SELECT t.training_name COLLATE utf8mb4_bin, t.target, 
-                   COUNT(f.per_no) as final_count
-            FROM training_targets t
-            LEFT JOIN final_tni_data f ON t.training_name COLLATE utf8mb4_bin = f.training_name COLLATE utf8mb4_bin
-                                     AND f.year = %s
-            WHERE t.target_year = %s
-            GROUP BY t.training_name, t.target
-            HAVING final_count != t.target
-        """
-        cursor.execute(verify_query, (year, year))
-        mismatches = cursor.fetchall()
+            nominees = select_final_nominees(candidates.get(training_name, {}), target, year, training_name)
+            final_rows.extend(nominee + (year,) for nominee in nominees)
         
-        for training, target, current_count in mismatches:
-            target = int(target or 0)
-            difference = target - current_count
-            if difference > 0:
-                add_query = """
-                    INSERT IGNORE INTO final_tni_data (per_no, name, factory, bc_no, training_name, hours, year)
-                    SELECT DISTINCT t.per_no, t.name, t.factory, t.bc_no, t.training_name, t.hours, %s
-                    FROM tni_data t
-                    WHERE t.training_name COLLATE utf8mb4_bin = %s
-                    AND t.factory IS NOT NULL 
-                    AND t.factory != ''
-                    AND t.year = %s
-                    AND NOT EXISTS (
-                        SELECT 1 FROM final_tni_data f 
-                        WHERE f.training_name COLLATE utf8mb4_bin = t.training_name COLLATE utf8mb4_bin
-                        AND f.per_no = t.per_no
-                        AND f.year = %s
-                    )
-                    ORDER BY RAND()
-                    LIMIT %s
-                """
-                cursor.execute(add_query, (year, training, year, year, difference))
-            elif difference < 0:
-                remove_query = """
+        # Replace the changed trainings' rows and signatures in one transaction
+        replaced = changed + removed
+        if full:
+            cursor.execute("DELETE FROM final_tni_data WHERE year = %s", (year,))
+            cursor.execute("DELETE FROM tni_training_hashes WHERE year = %s", (year,))
+        else:
+            for start in range(0, len(replaced), TNI_INSERT_BATCH_ROWS):
+                names = replaced[start:start + TNI_INSERT_BATCH_ROWS]
+                placeholders = ', '.join(['%s'] * len(names))
+                cursor.execute(f"""
                     DELETE FROM final_tni_data
-                    WHERE training_name COLLATE utf8mb4_bin = %s
-                    AND year = %s
-                    ORDER BY RAND()
-                    LIMIT %s
-                """
-                cursor.execute(remove_query, (training, year, abs(difference)))
-            
-            conn.commit()
+                    WHERE year = %s AND training_name IN ({placeholders})
+                """, [year] + names)
+                cursor.execute(f"""
+                    DELETE FROM tni_training_hashes
+                    WHERE year = %s AND training_name IN ({placeholders})
+                """, [year] + names)
+        total_inserted = bulk_insert_ignore(cursor, 'final_tni_data', TNI_DATA_COLUMNS, final_rows)
+        bulk_insert_ignore(cursor, 'tni_training_hashes', ['year', 'training_name', 'input_hash', 'target'],
+                           [(year, training_name, current_hashes.get(training_name, ''), targets[training_name])
+                            for training_name in changed])
+        conn.commit()
+        print(f"Total records inserted: {total_inserted}")
         
         # Final verification
         final_verify_query = """
-            SELECT t.training_name COLLATE utf8mb4_bin, t.target, 
+            SELECT t.training_name COLLATE utf8mb4_bin AS training_name, t.target, 
                    COUNT(f.per_no) as final_count
             FROM training_targets t
             LEFT JOIN final_tni_data f ON t.training_name COLLATE utf8mb4_bin = f.training_name COLLATE utf8mb4_bin
@@ -228,17 +279,20 @@ def process_training_data(year=None):
         cursor.execute(final_verify_query, (year, year))
         results = cursor.fetchall()
         
-        for training, target, final_count in results:
-            target = int(target or 0)
-            if final_count != target:
-                print(f"Warning: {training} has {final_count} records but target is {target}")
+        for row in results:
+            target = int(row['target'] or 0)
+            if row['final_count'] != target:
+                print(f"Warning: {row['training_name']} has {row['final_count']} records but target is {target}")
         
         # Verify grand total
-        grand_total_query = "SELECT COUNT(*) FROM final_tni_data WHERE year = %s"
+        grand_total_query = "SELECT COUNT(*) AS grand_total FROM final_tni_data WHERE year = %s"
         cursor.execute(grand_total_query, (year,))
-        grand_total = cursor.fetchone()[0]
+        grand_total = cursor.fetchone()['grand_total']
         print(f"Final grand total: {grand_total}")
         
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cursor.close()
         conn.close()
@@ -246,7 +300,7 @@ def get_training_summary(year=None):
     if year is None:
         year = datetime.now().year
     
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db_connection()
     
     try:
         query = """
@@ -258,7 +312,7 @@ def get_training_summary(year=None):
             GROUP BY training_name
             ORDER BY training_name
         """
-        training_df = pd.read_sql(query, conn, params=[year])
+        training_df = read_frame(conn, query, [year])
         
         training_df['training_name'] = (
             training_df['training_name']
@@ -272,7 +326,7 @@ def get_training_summary(year=None):
             FROM training_targets 
             WHERE target_year = %s
         """
-        target_df = pd.read_sql(target_query, conn, params=[year])
+        target_df = read_frame(conn, target_query, [year])
         
         if not target_df.empty:
             target_df['training_name'] = (
@@ -307,7 +361,7 @@ def get_final_factory_summary(year=None):
     if year is None:
         year = datetime.now().year
     
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db_connection()
     
     try:
         training_query = """
@@ -315,7 +369,7 @@ def get_final_factory_summary(year=None):
             FROM final_tni_data 
             WHERE year = %s
         """
-        trainings = pd.read_sql(training_query, conn, params=[year])['training_name'].tolist()
+        trainings = read_frame(conn, training_query, [year])['training_name'].tolist()
         
         query = """
             SELECT 
@@ -326,7 +380,7 @@ def get_final_factory_summary(year=None):
             WHERE year = %s
             GROUP BY factory, training_name
         """
-        df = pd.read_sql(query, conn, params=[year])
+        df = read_frame(conn, query, [year])
         
         if not df.empty:
             pivot = df.pivot_table(index='factory',
@@ -350,7 +404,7 @@ def get_original_factory_summary(year=None):
     if year is None:
         year = datetime.now().year
     
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db_connection()
     
     try:
         training_query = """
@@ -358,7 +412,7 @@ def get_original_factory_summary(year=None):
             FROM tni_data 
             WHERE factory IS NOT NULL AND factory != '' AND year = %s
         """
-        trainings = pd.read_sql(training_query, conn, params=[year])['training_name'].tolist()
+        trainings = read_frame(conn, training_query, [year])['training_name'].tolist()
         
         query = """
             SELECT 
@@ -369,7 +423,7 @@ def get_original_factory_summary(year=None):
             WHERE factory IS NOT NULL AND factory != '' AND year = %s
             GROUP BY factory, training_name
         """
-        df = pd.read_sql(query, conn, params=[year])
+        df = read_frame(conn, query, [year])
         
         if not df.empty:
             pivot = df.pivot_table(index='factory',
@@ -389,6 +443,32 @@ def get_original_factory_summary(year=None):
     finally:
         conn.close()
 
+def melt_tni_rows(df, standard_columns, training_columns, upload_year):
+    """Wide TNI sheet rows -> one row per employee and training with hours > 0"""
+    # Melt the dataframe to transform training columns into rows
+    df_long = df.melt(id_vars=standard_columns, 
+                    value_vars=training_columns,
+                    var_name='training_name',
+                    value_name='hours')
+
+    # Clean and filter the data
+    df_long = df_long.dropna(subset=['hours'])
+    df_long['hours'] = pd.to_numeric(df_long['hours'], errors='coerce')
+    df_long = df_long[df_long['hours'] > 0]
+    df_long['per_no'] = df_long['per_no'].astype(str).str.replace(r'\.0$', '', regex=True)
+    
+    # Clean factory and bc_no fields
+    df_long['factory'] = df_long['factory'].fillna('').str.strip()
+    df_long['bc_no'] = df_long['bc_no'].fillna('').astype(str).str.strip()
+    df_long['year'] = upload_year
+    return df_long
+
+def insert_tni_rows(cursor, df_long):
+    """Bulk INSERT IGNORE of melted TNI rows; returns the number of rows sent"""
+    # astype(object) turns numpy scalars into Python values the driver accepts
+    rows = df_long[TNI_DATA_COLUMNS].astype(object).values.tolist()
+    return bulk_insert_ignore(cursor, 'tni_data', TNI_DATA_COLUMNS, rows)
+
 @tni_shared_bp.route('/training', methods=['GET', 'POST'])
 def upload_and_summary():
     create_final_tni_data_table()
@@ -411,9 +491,6 @@ def upload_and_summary():
             filepath = os.path.join(upload_folder, filename)
             file.save(filepath)
 
-            df = pd.read_excel(filepath)
-            df.columns = df.columns.str.strip()
-            
             # Explicit column mapping based on your Excel format
             column_mapping = {
                 'Sr. no': 'sr_no',
@@ -423,71 +500,55 @@ def upload_and_summary():
                 'Factory': 'factory'
             }
             
-            # Apply the mapping only to columns that exist
-            rename_map = {k: v for k, v in column_mapping.items() if k in df.columns}
-            df = df.rename(columns=rename_map)
+            # Stream the sheet instead of loading it whole; headers are
+            # stripped and mapped by the reader
+            with ExcelRowStream(filepath, column_mapping) as stream:
 
-            # Explicitly list standard columns (non-training columns)
-            standard_columns = ['per_no', 'name', 'factory', 'bc_no']
-            if 'sr_no' in df.columns:
-                standard_columns.append('sr_no')
+                # Explicitly list standard columns (non-training columns)
+                standard_columns = ['per_no', 'name', 'factory', 'bc_no']
+                if 'sr_no' in stream.columns:
+                    standard_columns.append('sr_no')
 
-            # Training columns are all remaining columns that contain hours data
-            training_columns = [col for col in df.columns 
-                               if col not in standard_columns 
-                               and not col.lower().startswith('unnamed')]
+                # Training columns are all remaining columns that contain hours data
+                training_columns = [col for col in stream.columns 
+                                   if col not in standard_columns 
+                                   and not col.lower().startswith('unnamed')]
 
-            # Validate we have training columns
-            if not training_columns:
-                flash("No training columns found in the uploaded file", "error")
-                return redirect(url_for('training.upload_and_summary'))
+                # Validate we have training columns
+                if not training_columns:
+                    flash("No training columns found in the uploaded file", "error")
+                    return redirect(url_for('training.upload_and_summary'))
 
-            # Melt the dataframe to transform training columns into rows
-            df_long = df.melt(id_vars=standard_columns, 
-                            value_vars=training_columns,
-                            var_name='training_name',
-                            value_name='hours')
-
-            # Clean and filter the data
-            df_long = df_long.dropna(subset=['hours'])
-            df_long['hours'] = pd.to_numeric(df_long['hours'], errors='coerce')
-            df_long = df_long[df_long['hours'] > 0]
-            df_long['per_no'] = df_long['per_no'].astype(str).str.replace(r'\.0$', '', regex=True)
+                # Store in database
+                conn = get_db_connection()
+                cursor = conn.cursor()
             
-            # Clean factory and bc_no fields
-            df_long['factory'] = df_long['factory'].fillna('').str.strip()
-            df_long['bc_no'] = df_long['bc_no'].fillna('').astype(str).str.strip()
-            df_long['year'] = upload_year
-
+                loaded = 0
+                try:
+                    # Delete existing data for this year
+                    cursor.execute("DELETE FROM tni_data WHERE year = %s", (upload_year,))
+                
+                    # Melt one chunk of employees at a time, so memory is bounded
+                    # by the chunk rather than the whole wide-to-long sheet
+                    for chunk in stream.chunks(TNI_UPLOAD_CHUNK_ROWS):
+                        df = pd.DataFrame([row for _, row in chunk], columns=stream.columns)
+                        df_long = melt_tni_rows(df, standard_columns, training_columns, upload_year)
 
-            # Store in database
-            conn = mysql.connector.connect(**db_config)
-            cursor = conn.cursor()
-            
-            # Delete existing data for this year
-            cursor.execute("DELETE FROM tni_data WHERE year = %s", (upload_year,))
-            
-            for _, row in df_long.iterrows():
-                cursor.execute("""
-                    INSERT IGNORE INTO tni_data (per_no, name, factory, bc_no, training_name, hours, year)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    row['per_no'], 
-                    row['name'], 
-                    row['factory'], 
-                    row['bc_no'], 
-                    row['training_name'], 
-                    row['hours'],
-                    row['year']
-                ))
+                        loaded += insert_tni_rows(cursor, df_long)
 
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+                    # The year's delete and every insert commit together
+                    conn.commit()
+                    print(f"TNI upload for {upload_year}: loaded {loaded} rows")
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
+                    conn.close()
             
             # Process the training data for the uploaded year
             process_training_data(upload_year)
+            invalidate_metrics_cache(f"TNI data uploaded for {upload_year}")
             
             flash(f"Data for year {upload_year} uploaded and processed successfully", "success")
             selected_year = upload_year
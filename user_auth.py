@@ -128,6 +128,9 @@ def manage_users():
     users = cursor.fetchall()
     
     if len(users) == 0:
+        # Hand the connection back before initialize_users checks out its own
+        cursor.close()
+        conn.close()
         initialize_users()
         flash("Database initialized with all required users!", "success")
         return redirect(url_for('user_auth.manage_users'))
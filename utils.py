@@ -1,8 +1,10 @@
 import os
 import pymysql
 from datetime import datetime, timedelta
-import pandas as pd
 from flask import flash
+from excel_ingest import ExcelRowStream, cell_text
+from db_pool import ConnectionPool
+import query_stats
 
 class Config:
     DB_HOST = 'localhost'
@@ -17,6 +19,24 @@ class Config:
     QR_BASE_URL = 'http://1192.168.0.105:5003'
     QR_PROGRAM_PATH = '/attendance'
     QR_HALL_PATH = '/attendance/hall'
+    METRICS_CACHE_TTL_SECONDS = 300  # Dashboard metrics cache lifetime
+    METRICS_CACHE_MAX_ENTRIES = 256
+    FILTER_OPTIONS_TTL_SECONDS = 300  # Reload of the dropdown options store
+    EOR_DIRECTORY_TTL_SECONDS = 300  # Reload of the attendance EOR lookup
+    BULK_INSERT_CHUNK_SIZE = 1000  # Rows per multi-row INSERT in bulk loads
+    DB_POOL_MAX_SIZE = 10  # Connections open at once per process
+    DB_POOL_TIMEOUT_SECONDS = 10  # Wait for a free connection before failing
+    DB_POOL_PING_AFTER_SECONDS = 30  # Ping connections idle longer than this before reuse
+    DB_POOL_RECYCLE_SECONDS = 3600  # Replace connections older than this
+    DB_CONNECT_TIMEOUT_SECONDS = 10
+    DB_READ_TIMEOUT_SECONDS = 120  # Per socket read; bounds a ping or query on a dead connection
+    DB_WRITE_TIMEOUT_SECONDS = 60
+    SLOW_QUERY_THRESHOLD_MS = 500  # Statements at least this slow go to the slow-query log
+    SLOW_QUERY_LOG = 'slow_queries.log'
+    QUERY_COUNT_WARN = 100  # Print the top statements of requests running this many queries
+    PROFILE_WINDOW = 500  # Requests kept per endpoint for the latency percentiles
+    PROFILE_TRACK_MEMORY = False  # Peak allocation per request via tracemalloc (slows requests)
+    PROFILE_DUMP_DIR = 'profiles'  # cProfile dumps of requests sent with X-Profile: 1
 
 class Constants:
     LOCATION_HALLS = [
@@ -48,16 +68,76 @@ class Constants:
     TNI_OPTIONS = ['TNI', 'NON TNI']
     TIME_SLOTS = [f"{h:02d}:{m:02d}" for h in range(5, 23) for m in [0, 30]]
 
-def get_db_connection():
+def connect_db():
+    """Open a new, unpooled database connection"""
     return pymysql.connect(
         host=Config.DB_HOST,
         user=Config.DB_USER,
         password=Config.DB_PASSWORD,
         db=Config.DB_NAME,
         charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=pymysql.cursors.DictCursor,
+        connect_timeout=Config.DB_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=Config.DB_READ_TIMEOUT_SECONDS,
+        write_timeout=Config.DB_WRITE_TIMEOUT_SECONDS
     )
 
+db_pool = ConnectionPool(
+    connect_db,
+    max_size=Config.DB_POOL_MAX_SIZE,
+    timeout=Config.DB_POOL_TIMEOUT_SECONDS,
+    ping_after=Config.DB_POOL_PING_AFTER_SECONDS,
+    recycle_after=Config.DB_POOL_RECYCLE_SECONDS,
+    cursor_wrapper=query_stats.InstrumentedCursor
+)
+
+query_stats.configure(
+    slow_ms=Config.SLOW_QUERY_THRESHOLD_MS,
+    log_path=Config.SLOW_QUERY_LOG,
+    warn_count=Config.QUERY_COUNT_WARN
+)
+
+def get_db_connection():
+    """Connection from the process-wide pool; conn.close() returns it to the pool"""
+    return db_pool.connection()
+
+def db_pool_stats():
+    """Connection pool counters (created, reused, in use, ...) for diagnostics"""
+    return db_pool.stats()
+
+def executemany_in_chunks(cursor, query, rows, chunk_size=None):
+    """Run an INSERT ... VALUES statement for many rows, chunk_size rows at a time.
+
+    pymysql rewrites each executemany() chunk into one multi-row INSERT, so a
+    20k-row load takes a few dozen round trips instead of one per row.
+    rows may be any iterable, including a generator streaming an upload; only
+    one chunk is held in memory at a time. Returns the number of rows.
+    """
+    chunk_size = chunk_size or Config.BULK_INSERT_CHUNK_SIZE
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            cursor.executemany(query, chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        cursor.executemany(query, chunk)
+        total += len(chunk)
+    return total
+
+def swap_in_staging_table(cursor, live_table, staging_table):
+    """Atomically replace live_table with a fully loaded staging_table.
+
+    RENAME TABLE swaps both names in one step, so readers see either the old
+    rows or the new ones, never an empty or partial table.
+    """
+    old_table = f"{live_table}_old"
+    cursor.execute(f"DROP TABLE IF EXISTS {old_table}")
+    cursor.execute(f"RENAME TABLE {live_table} TO {old_table}, {staging_table} TO {live_table}")
+    cursor.execute(f"DROP TABLE {old_table}")
+
 def load_training_data(tni_status='TNI'):
     """Load training data from database filtered by TNI status"""
     try:
@@ -110,15 +190,13 @@ def validate_attendance_time(program):
         return 'ended', program['qr_valid_to'].strftime('%d/%m/%Y %H:%M')
     return None, None
 
+# eor_data columns filled by the EOR upload, in insert order
+EOR_IMPORT_COLUMNS = ('per_no', 'participants_name', 'factory', 'department', 'gender',
+                      'employee_group', 'employee_subgroup', 'bc_no')
+
 def process_eor_excel(file_stream):
     """Process EOR Excel file and store directly in database"""
     try:
-        # Read Excel file
-        df = pd.read_excel(file_stream, dtype={'per_no': str})
-        
-        # Strip whitespace from column headers
-        df.columns = [col.strip() for col in df.columns]
-
         # Extended and comprehensive column mapping
         column_mapping = {
             # PER NO variations
@@ -174,52 +252,53 @@ def process_eor_excel(file_stream):
             'bcc no': 'bc_no',
         }
 
-        # Apply column mapping if key exists in dataframe
-        df.rename(columns={k: v for k, v in column_mapping.items() if k in df.columns}, inplace=True)
+        # Stream the sheet; the mapping is applied to the stripped headers
+        with ExcelRowStream(file_stream, column_mapping) as stream:
         
-        # Ensure required columns exist
-        required_columns = ['per_no', 'participants_name', 'factory']
-        for col in required_columns:
-            if col not in df.columns:
-                raise ValueError(f"Required column '{col}' not found in Excel file")
+            # Ensure required columns exist
+            required_columns = ['per_no', 'participants_name', 'factory']
+            missing = stream.missing_columns(required_columns)
+            if missing:
+                raise ValueError(f"Required column '{missing[0]}' not found in Excel file")
         
-        # Clean data
-        df = df.fillna('')
+            # Blank cells and missing optional columns load as '', as before
+            rows = (tuple(cell_text(row.get(col)) for col in EOR_IMPORT_COLUMNS)
+                    for _, row in stream)
         
-        # Connect to database
-        conn = get_db_connection()
+            # Connect to database
+            conn = get_db_connection()
         
-        try:
-            with conn.cursor() as cursor:
-                # Delete all existing records from eor_data table
-                cursor.execute("DELETE FROM eor_data")
+            try:
+                with conn.cursor() as cursor:
+                    # Load a staging copy while readers keep using eor_data
+                    cursor.execute("DROP TABLE IF EXISTS eor_data_staging")
+                    cursor.execute("CREATE TABLE eor_data_staging LIKE eor_data")
+                    loaded = executemany_in_chunks(cursor, f"""
+                        INSERT INTO eor_data_staging ({', '.join(EOR_IMPORT_COLUMNS)})
+                        VALUES ({', '.join(['%s'] * len(EOR_IMPORT_COLUMNS))})
+                    """, rows)
+                    conn.commit()
                 
-                # Insert new records
-                for _, row in df.iterrows():
-                    cursor.execute("""
-                        INSERT INTO eor_data 
-                        (per_no, participants_name, factory, department, gender, 
-                         employee_group, employee_subgroup, bc_no)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        row.get('per_no', ''),
-                        row.get('participants_name', ''),
-                        row.get('factory', ''),
-                        row.get('department', ''),
-                        row.get('gender', ''),
-                        row.get('employee_group', ''),
-                        row.get('employee_subgroup', ''),
-                        row.get('bc_no', '')
-                    ))
+                    # Swap it in with one atomic RENAME
+                    swap_in_staging_table(cursor, 'eor_data', 'eor_data_staging')
                 
-                conn.commit()
-                return True, f"Successfully processed {len(df)} EOR records"
+                    # Imported here: these modules read Config from this one
+                    from eor_directory import invalidate_eor_directory
+                    from metrics_cache import invalidate_metrics_cache
+                    invalidate_eor_directory()
+                    invalidate_metrics_cache("EOR data replaced")
+                    return True, f"Successfully processed {loaded} EOR records"
                 
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+            except Exception as e:
+                conn.rollback()
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute("DROP TABLE IF EXISTS eor_data_staging")
+                except pymysql.MySQLError:
+                    pass
+                raise e
+            finally:
+                conn.close()
             
     except Exception as e:
         return False, f"Error processing EOR Excel: {str(e)}"
@@ -230,12 +309,6 @@ def process_eor_excel(file_stream):
 def process_training_excel(file_stream):
     """Process Training Excel file and store directly in database"""
     try:
-        # Read Excel file
-        df = pd.read_excel(file_stream)
-        
-        # Strip whitespace from column headers
-        df.columns = [col.strip() for col in df.columns]
-        
         # Column mapping for training data
         column_mapping = {
             'Training Name': 'Training_Name',
@@ -246,50 +319,55 @@ def process_training_excel(file_stream):
             'Duration': 'learning_hours'
         }
         
-        # Apply column mapping if key exists in dataframe
-        df.rename(columns={k: v for k, v in column_mapping.items() if k in df.columns}, inplace=True)
+        # Stream the sheet; the mapping is applied to the stripped headers
+        with ExcelRowStream(file_stream, column_mapping) as stream:
         
-        # Ensure required columns exist
-        required_columns = ['Training_Name', 'Tni_Status']
-        for col in required_columns:
-            if col not in df.columns:
-                raise ValueError(f"Required column '{col}' not found in Excel file")
+            # Ensure required columns exist
+            required_columns = ['Training_Name', 'Tni_Status']
+            missing = stream.missing_columns(required_columns)
+            if missing:
+                raise ValueError(f"Required column '{missing[0]}' not found in Excel file")
         
-        # Clean data
-        df = df.fillna('')
+            # Blank cells load as '' and a missing Duration column as 0, as before
+            rows = ((
+                cell_text(row.get('Training_Name')),
+                cell_text(row.get('PMO_Training_Category')),
+                cell_text(row.get('PL_Category')),
+                cell_text(row.get('BRSR_SQ_123_Category')),
+                cell_text(row.get('Tni_Status')),
+                '' if row.get('learning_hours', 0) is None else row.get('learning_hours', 0)
+            ) for _, row in stream)
         
-        # Connect to database
-        conn = get_db_connection()
+            # Connect to database
+            conn = get_db_connection()
         
-        try:
-            with conn.cursor() as cursor:
-                # Delete all existing records from training_names table
-                cursor.execute("DELETE FROM training_names")
+            try:
+                with conn.cursor() as cursor:
+                    # Delete all existing records from training_names table
+                    cursor.execute("DELETE FROM training_names")
                 
-                # Insert new records
-                for _, row in df.iterrows():
-                    cursor.execute("""
+                    # Insert new records
+                    loaded = executemany_in_chunks(cursor, """
                         INSERT INTO training_names 
                         (Training_Name, PMO_Training_Category, PL_Category, 
                          BRSR_SQ_123_Category, Tni_Status, learning_hours)
                         VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (
-                        row.get('Training_Name', ''),
-                        row.get('PMO_Training_Category', ''),
-                        row.get('PL_Category', ''),
-                        row.get('BRSR_SQ_123_Category', ''),
-                        row.get('Tni_Status', ''),
-                        row.get('learning_hours', 0)
-                    ))
+                    """, rows)
                 
-                conn.commit()
-                return True, f"Successfully processed {len(df)} training records"
+                    # Imported here: these modules read Config from this one
+                    from filter_options import refresh_training_name_options, filter_options_changed
+                    from metrics_cache import invalidate_metrics_cache
+                    refresh_training_name_options(cursor)
+                    conn.commit()
+                    filter_options_changed()
+                    invalidate_metrics_cache("training names replaced")
+                    return True, f"Successfully processed {loaded} training records"
                 
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+            except Exception as e:
+                conn.rollback()
+                raise e
+            finally:
+                conn.close()
             
     except Exception as e:
         return False, f"Error processing Training Excel: {str(e)}"
@@ -2,6 +2,15 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from admin_app import get_db_connection
 from datetime import datetime, timedelta, date, time
 from utils import Config, Constants, load_training_data
+from metrics_cache import add_memo_header, cached_metrics
+from dashboard_metrics import (get_metrics_cube, compute_dashboard_metrics, compute_hours_metrics,
+                               compute_training_wise_metrics, compute_pl_category_counts,
+                               compute_category_metrics, compute_monthwise_ytd_metrics,
+                               compute_annual_ytd_metrics, fetch_employee_hours,
+                               fiscal_year_sql, learning_hours_sql,
+                               keyset_page_sql, keyset_page)
+from filter_options import get_filter_options
+import pending_eor
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill
 from io import BytesIO
@@ -15,27 +24,13 @@ import pymysql
 # Blueprint definition
 view_bp = Blueprint('view_bp', __name__)
 
+# Report request-scoped metrics memo hits/misses on every response
+view_bp.after_request(add_memo_header)
+
 # Constants
 RECORDS_PER_PAGE = 200
 
 # Helper Functions
-def calculate_learning_hours(record):
-    """Calculate learning hours - use manual value if exists, otherwise calculate based on attendance"""
-    manual_hours = record.get('learning_hours')
-    if manual_hours is not None and manual_hours != '' and manual_hours != 0:
-        return int(manual_hours)
-    
-    program_hours = int(record.get('program_hours', 0))
-    day1 = bool(record.get('day_1_attendance'))
-    day2 = bool(record.get('day_2_attendance'))
-    day3 = bool(record.get('day_3_attendance'))
-    
-    if program_hours <= 8:
-        return program_hours if day1 else 0
-    else:
-        attended_days = sum([1 for day in [day1, day2, day3] if day])
-        return min(attended_days * 8, program_hours)
-
 def get_fiscal_year(date=None, return_string=False):
     """Get fiscal year (April-March) for a given date or current date.
     If return_string is True, returns formatted string (e.g., "FY 2025-26").
@@ -125,13 +120,10 @@ def apply_fiscal_year_filter(query, params, fiscal_year):
     else:
         fiscal_year = int(fiscal_year)
     
-    query += """
-        AND (
-            (start_date IS NOT NULL AND 
-             (YEAR(start_date) + IF(MONTH(start_date) >= 4, 0, -1)) = %s)
-        )
-    """
-    params.extend([fiscal_year])
+    # Range on start_date (not YEAR()/MONTH()) so the index can be used
+    range_sql, range_params = fiscal_year_sql(fiscal_year)
+    query += f" AND {range_sql}"
+    params.extend(range_params)
     return query, params
 
 def apply_date_range_filter(query, params, start_date_str, end_date_str):
@@ -353,11 +345,15 @@ def apply_standard_filters(query, params, filters):
     
     return query, params
 
-def build_base_query(filters, for_export=False):
-    """Build the base SQL query with filters"""
+def build_base_query(filters, for_export=False, after_id=None, before_id=None):
+    """Build the base SQL query with filters.
+
+    The web view is paged by keyset on id (see keyset_page_sql); after_id and
+    before_id are the cursors of the page being requested.
+    """
     # For export, we don't need the id/sr_no column
     if for_export:
-        base_query = """
+        base_query = f"""
             SELECT 
                 per_no,
                 participants_name,
@@ -372,7 +368,7 @@ def build_base_query(filters, for_export=False):
                 brsr_sq_123_category,
                 calendar_need_base_reschedule as program_type,
                 tni_non_tni as tni_status,
-                learning_hours,
+                {learning_hours_sql()} AS learning_hours,
                 start_date,
                 end_date,
                 calendar_month,
@@ -398,7 +394,7 @@ def build_base_query(filters, for_export=False):
             WHERE 1=1
         """
     else:
-        base_query = """
+        base_query = f"""
             SELECT 
                 id as sr_no,
                 per_no,
@@ -414,7 +410,7 @@ def build_base_query(filters, for_export=False):
                 brsr_sq_123_category,
                 calendar_need_base_reschedule as program_type,
                 tni_non_tni as tni_status,
-                learning_hours,
+                {learning_hours_sql()} AS learning_hours,
                 start_date,
                 end_date,
                 calendar_month,
@@ -445,13 +441,13 @@ def build_base_query(filters, for_export=False):
     # Apply all standard filters
     base_query, query_params = apply_standard_filters(base_query, query_params, filters)
     
-    base_query += " ORDER BY id DESC"
-    
     # Only apply pagination for web view, not for exports
-    if not for_export:
-        page = request.args.get('page', 1, type=int)
-        offset = (page - 1) * RECORDS_PER_PAGE
-        base_query += f" LIMIT {RECORDS_PER_PAGE} OFFSET {offset}"
+    if for_export:
+        base_query += " ORDER BY id DESC"
+    else:
+        seek_sql, seek_params, order_sql = keyset_page_sql(after_id, before_id, RECORDS_PER_PAGE)
+        base_query += seek_sql + order_sql
+        query_params.extend(seek_params)
     
     return base_query, query_params
 
@@ -505,7 +501,7 @@ def process_records(raw_records):
         day2 = bool(processed_record.get('day_2_attendance'))
         day3 = bool(processed_record.get('day_3_attendance'))
         
-        processed_record['learning_hours'] = calculate_learning_hours(processed_record)
+        processed_record['learning_hours'] = int(processed_record.get('learning_hours') or 0)
         processed_record['start_date'] = format_date(processed_record.get('start_date'))
         processed_record['end_date'] = format_date(processed_record.get('end_date'))
         processed_record['start_time'] = format_time(processed_record.get('start_time'))
@@ -529,22 +525,9 @@ def clean_training_name(training_name):
 @view_bp.route('/get_training_names')
 def get_training_names():
     """Endpoint to fetch training names from training_names table (all available training programs)"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify([])
-    
-    try:
-        with conn.cursor() as cursor:
-            # Get all training programs from the training_names table
-            cursor.execute("SELECT DISTINCT Training_Name FROM training_names ORDER BY Training_Name")
-            training_names = [row['Training_Name'] for row in cursor.fetchall()]
-            return jsonify(training_names)
-    except Exception as e:
-        print(f"Error fetching training names: {str(e)}")
-        return jsonify([])
-    finally:
-        if conn:
-            conn.close()
+    # Served from the filter_options store, which mirrors training_names
+    filter_options = get_filter_options() or {}
+    return jsonify(filter_options.get('training_name', []))
 
 @view_bp.route('/get_training_programs')
 def get_training_programs():
@@ -572,433 +555,8 @@ def get_training_programs():
             conn.close()
 
 def calculate_dashboard_metrics(filters):
-    """Calculate dashboard metrics based on filters"""
-    conn = get_db_connection()
-    if not conn:
-        return None
-    
-    try:
-        # First get the total count of all records (based on id)
-        count_query = "SELECT COUNT(id) as total_records FROM master_data WHERE 1=1"
-        query_params = []
-        
-        # Apply all filters to the count query
-        count_query, query_params = apply_standard_filters(count_query, query_params, filters)
-        
-        # Execute the count query
-        with conn.cursor() as cursor:
-            cursor.execute(count_query, query_params)
-            count_result = cursor.fetchone()
-            total_records = count_result['total_records'] if count_result else 0
-            
-        # Now get the actual records for other calculations using the same filters
-        base_query, base_query_params = build_base_query(filters, for_export=True)
-        
-        with conn.cursor() as cursor:
-            cursor.execute(base_query, base_query_params)
-            all_records = cursor.fetchall()
-            
-            learning_hours = 0
-            for record in all_records:
-                record_dict = dict(record)
-                learning_hours += calculate_learning_hours(record_dict)
-                
-            # Get count of unique permanent learners with PER_NO
-            unique_query = """
-                SELECT COUNT(DISTINCT per_no) as unique_permanent_learners 
-                FROM master_data 
-                WHERE employee_group = 'PERMANENT' 
-                AND per_no IS NOT NULL
-                AND per_no != ''
-            """
-            unique_params = []
-            
-            # Apply ALL filters from the base query to ensure consistency
-            unique_query, unique_params = apply_standard_filters(unique_query, unique_params, filters)
-            
-            # Execute unique learner query
-            cursor.execute(unique_query, unique_params)
-            unique_result = cursor.fetchone()
-            unique_learners = unique_result['unique_permanent_learners'] if unique_result else 0
-            
-            # Calculate target metrics with consistent PMO/SHE filtering and fiscal year
-            target_query = """
-                SELECT 
-                    SUM(t.hours) as target_hours,
-                    COUNT(DISTINCT t.per_no) as target_unique_learners,
-                    COUNT(*) as target
-                FROM final_tni_data t
-                JOIN training_targets tt ON t.training_name = tt.training_name
-                WHERE 1=1
-            """
-            target_params = []
-            
-            # Apply fiscal year filter to target metrics
-            if filters.get('fiscal_year'):
-                fiscal_year = int(filters['fiscal_year'])
-                target_query += " AND t.year = %s AND tt.target_year = %s"
-                target_params.extend([fiscal_year, fiscal_year])
-            
-            if filters.get('factory'):
-                target_query += " AND t.factory = %s"
-                target_params.append(filters['factory'])
-            
-            if filters.get('training_name'):
-                target_query += " AND t.training_name = %s"
-                target_params.append(filters['training_name'])
-            
-            if filters.get('bc_no'):
-                target_query += " AND t.bc_no = %s"
-                target_params.append(filters['bc_no'])
-            
-            # Apply PMO/SHE filter to target metrics
-            if filters.get('pmo_training_category'):
-                if filters['pmo_training_category'] == 'PMO':
-                    target_query += " AND tt.pmo_category != 'SHE (Safety+Health)'"
-                elif filters['pmo_training_category'] != 'All':
-                    target_query += " AND tt.pmo_category = %s"
-                    target_params.append(filters['pmo_training_category'])
-            
-            if filters.get('pl_category') and filters['pl_category'] != 'All':
-                target_query += " AND tt.pl_category = %s"
-                target_params.append(filters['pl_category'])
-            
-            cursor.execute(target_query, target_params)
-            target_result = cursor.fetchone()
-            
-            target_metrics = {
-                'target_hours': target_result['target_hours'] if target_result and target_result['target_hours'] else 0,
-                'target_unique_learners': target_result['target_unique_learners'] if target_result and target_result['target_unique_learners'] else 0,
-                'target': target_result['target'] if target_result and target_result['target'] else 0
-            }
-            
-            # Calculate TNI data metrics with consistent PMO/SHE filtering and fiscal year
-            tni_query = """
-                SELECT 
-                    COUNT(DISTINCT per_no) as tni_unique_learners,
-                    COUNT(*) as tni_total_count
-                FROM tni_data
-                WHERE 1=1
-            """
-            tni_params = []
-            
-            # Apply fiscal year filter to TNI metrics
-            if filters.get('fiscal_year'):
-                fiscal_year = int(filters['fiscal_year'])
-                tni_query += " AND year = %s"
-                tni_params.append(fiscal_year)
-            
-            if filters.get('factory'):
-                tni_query += " AND factory = %s"
-                tni_params.append(filters['factory'])
-            
-            if filters.get('training_name'):
-                tni_query += " AND training_name = %s"
-                tni_params.append(filters['training_name'])
-            
-            if filters.get('bc_no'):
-                tni_query += " AND bc_no = %s"
-                tni_params.append(filters['bc_no'])
-            
-            # Apply PMO/SHE filter to TNI metrics
-            if filters.get('pmo_training_category'):
-                if filters['pmo_training_category'] == 'PMO':
-                    tni_query += " AND training_name IN (SELECT training_name FROM training_targets WHERE pmo_category != 'SHE (Safety+Health)'"
-                    if filters.get('fiscal_year'):
-                        tni_query += " AND target_year = %s"
-                        tni_params.append(fiscal_year)
-                    tni_query += ")"
-                elif filters['pmo_training_category'] != 'All':
-                    tni_query += " AND training_name IN (SELECT training_name FROM training_targets WHERE pmo_category = %s"
-                    tni_params.append(filters['pmo_training_category'])
-                    if filters.get('fiscal_year'):
-                        tni_query += " AND target_year = %s"
-                        tni_params.append(fiscal_year)
-                    tni_query += ")"
-            
-            if filters.get('pl_category') and filters['pl_category'] != 'All':
-                tni_query += " AND training_name IN (SELECT training_name FROM training_targets WHERE pl_category = %s"
-                tni_params.append(filters['pl_category'])
-                if filters.get('fiscal_year'):
-                    tni_query += " AND target_year = %s"
-                    tni_params.append(fiscal_year)
-                tni_query += ")"
-            
-            cursor.execute(tni_query, tni_params)
-            tni_result = cursor.fetchone()
-            tni_metrics = {
-                'tni_total_count': tni_result['tni_total_count'] if tni_result else 0,
-                'tni_unique_learners': tni_result['tni_unique_learners'] if tni_result else 0
-            }
-            
-            # Calculate matching records between TNI data and actual attendance with consistent filtering
-            if tni_metrics['tni_total_count'] > 0:
-                match_query = """
-                    SELECT COUNT(DISTINCT t.id) as matched_count
-                    FROM tni_data t
-                    JOIN master_data m ON t.per_no = m.per_no
-                        AND t.factory = m.factory
-                        AND t.training_name = m.training_name
-                    WHERE 1=1
-                """
-                match_params = []
-                
-                # Apply fiscal year filter to match query
-                if filters.get('fiscal_year'):
-                    fiscal_year = int(filters['fiscal_year'])
-                    
-                    # For master_data, we need to derive fiscal year from start_date
-                    match_query += """
-                        AND (
-                            (m.start_date IS NOT NULL AND 
-                             (YEAR(m.start_date) + IF(MONTH(m.start_date) >= 4, 0, -1)) = %s)
-                        )
-                        AND t.year = %s
-                    """
-                    match_params.extend([fiscal_year, fiscal_year])
-                
-                if filters.get('factory'):
-                    match_query += " AND t.factory = %s"
-                    match_params.append(filters['factory'])
-                
-                if filters.get('training_name'):
-                    match_query += " AND t.training_name = %s"
-                    match_params.append(filters['training_name'])
-                
-                if filters.get('bc_no'):
-                    match_query += " AND t.bc_no = %s"
-                    match_params.append(filters['bc_no'])
-                
-                if filters.get('employee_group'):
-                    match_query += " AND m.employee_group = %s"
-                    match_params.append(filters['employee_group'])
-                
-                # Apply PMO/SHE filter to match query
-                if filters.get('pmo_training_category'):
-                    if filters['pmo_training_category'] == 'PMO':
-                        match_query += " AND t.training_name IN (SELECT training_name FROM training_targets WHERE pmo_category != 'SHE (Safety+Health)'"
-                        if filters.get('fiscal_year'):
-                            match_query += " AND target_year = %s"
-                            match_params.append(fiscal_year)
-                        match_query += ")"
-                    elif filters['pmo_training_category'] != 'All':
-                        match_query += " AND t.training_name IN (SELECT training_name FROM training_targets WHERE pmo_category = %s"
-                        match_params.append(filters['pmo_training_category'])
-                        if filters.get('fiscal_year'):
-                            match_query += " AND target_year = %s"
-                            match_params.append(fiscal_year)
-                        match_query += ")"
-                
-                if filters.get('pl_category') and filters['pl_category'] != 'All':
-                    match_query += " AND t.training_name IN (SELECT training_name FROM training_targets WHERE pl_category = %s"
-                    match_params.append(filters['pl_category'])
-                    if filters.get('fiscal_year'):
-                        match_query += " AND target_year = %s"
-                        match_params.append(fiscal_year)
-                    match_query += ")"
-                
-                cursor.execute(match_query, match_params)
-                match_result = cursor.fetchone()
-                matched_count = match_result['matched_count'] if match_result else 0
-                
-                # Count of distinct TNI records without matching master_data records
-                remaining_query = """
-                    SELECT COUNT(DISTINCT t.id) as remaining_count
-                    FROM tni_data t
-                    LEFT JOIN master_data m ON t.per_no = m.per_no
-                        AND t.factory = m.factory
-                        AND t.training_name = m.training_name
-                    WHERE m.per_no IS NULL
-                """
-                remaining_params = []
-                
-                # Apply fiscal year filter to remaining query
-                if filters.get('fiscal_year'):
-                    fiscal_year = int(filters['fiscal_year'])
-                    remaining_query += " AND t.year = %s"
-                    remaining_params.append(fiscal_year)
-                
-                if filters.get('factory'):
-                    remaining_query += " AND t.factory = %s"
-                    remaining_params.append(filters['factory'])
-                
-                if filters.get('training_name'):
-                    remaining_query += " AND t.training_name = %s"
-                    remaining_params.append(filters['training_name'])
-                
-                if filters.get('bc_no'):
-                    remaining_query += " AND t.bc_no = %s"
-                    remaining_params.append(filters['bc_no'])
-                
-                # Apply PMO/SHE filter to remaining query
-                if filters.get('pmo_training_category'):
-                    if filters['pmo_training_category'] == 'PMO':
-                        remaining_query += " AND t.training_name IN (SELECT training_name FROM training_targets WHERE pmo_category != 'SHE (Safety+Health)'"
-                        if filters.get('fiscal_year'):
-                            remaining_query += " AND target_year = %s"
-                            remaining_params.append(fiscal_year)
-                        remaining_query += ")"
-                    elif filters['pmo_training_category'] != 'All':
-                        remaining_query += " AND t.training_name IN (SELECT training_name FROM training_targets WHERE pmo_category = %s"
-                        remaining_params.append(filters['pmo_training_category'])
-                        if filters.get('fiscal_year'):
-                            remaining_query += " AND target_year = %s"
-                            remaining_params.append(fiscal_year)
-                        remaining_query += ")"
-                
-                if filters.get('pl_category') and filters['pl_category'] != 'All':
-                    remaining_query += " AND t.training_name IN (SELECT training_name FROM training_targets WHERE pl_category = %s"
-                    remaining_params.append(filters['pl_category'])
-                    if filters.get('fiscal_year'):
-                        remaining_query += " AND target_year = %s"
-                        remaining_params.append(fiscal_year)
-                    remaining_query += ")"
-                
-                cursor.execute(remaining_query, remaining_params)
-                remaining_result = cursor.fetchone()
-                remaining_count = remaining_result['remaining_count'] if remaining_result else 0
-                
-                # Verify counts add up (for debugging)
-                if (matched_count + remaining_count) != tni_metrics['tni_total_count']:
-                    print(f"Warning: TNI counts don't match. Total: {tni_metrics['tni_total_count']}, Matched: {matched_count}, Remaining: {remaining_count}")
-                
-                tni_metrics['matched_count'] = matched_count
-                tni_metrics['remaining_count'] = remaining_count
-            else:
-                tni_metrics['matched_count'] = 0
-                tni_metrics['remaining_count'] = 0
-            
-            # Calculate YTD metrics
-            target_month = None
-            if filters.get('calendar_month'):
-                target_month = filters['calendar_month']
-            elif filters.get('month_range_end'):
-                target_month = filters['month_range_end']
-            
-            month_index = get_month_index(target_month)  # Pass selected month
-            
-            annual_target = target_metrics['target']
-            ytd_target = (annual_target // 10) * month_index  # Now uses selected month index
-            ytd_actual = total_records
-            balance = max(ytd_target - ytd_actual, 0)
-            
-            percentage_adherence = 0
-            if annual_target > 0 and ytd_target > 0:
-                raw_adherence = total_records / ytd_target * 100
-                # REMOVED: percentage_adherence = round(min(raw_adherence, 100), 1)
-                percentage_adherence = round(raw_adherence, 1)  # Allow values above 100%
-            
-        # FIXED: Get all EOR per_nos to check against with ALL relevant filters
-        eor_per_nos = set()
-        conn_eor = get_db_connection()
-        if conn_eor:
-            try:
-                query = "SELECT DISTINCT per_no FROM eor_data WHERE 1=1"
-                query_params = []
-                
-                # Apply all relevant filters to EOR data
-                factory_filter = filters.get('factory')
-                if factory_filter and factory_filter != 'All':
-                    query += " AND factory = %s"
-                    query_params.append(factory_filter)
-                
-                # Add gender filter
-                gender_filter = filters.get('gender')
-                if gender_filter and gender_filter != 'All':
-                    query += " AND gender = %s"
-                    query_params.append(gender_filter)
-                
-                # Add employee group filter
-                employee_group_filter = filters.get('employee_group')
-                if employee_group_filter:
-                    query += " AND employee_group = %s"
-                    query_params.append(employee_group_filter)
-                
-                # Add BC No filter
-                bc_no_filter = filters.get('bc_no')
-                if bc_no_filter:
-                    query += " AND bc_no = %s"
-                    query_params.append(bc_no_filter)
-                
-                with conn_eor.cursor() as cursor:
-                    cursor.execute(query, query_params)
-                    eor_results = cursor.fetchall()
-                    eor_per_nos = {row['per_no'] for row in eor_results if row['per_no']}
-                    
-            except Exception as e:
-                print(f"Error fetching EOR data: {str(e)}")
-            finally:
-                conn_eor.close()
-                
-        # Get the set of all unique permanent learners in the master_data for the selected filters
-        trained_per_nos_any = set()
-        # Use a separate connection for this query
-        conn_any = get_db_connection()
-        if conn_any:
-            try:
-                query = "SELECT DISTINCT per_no FROM master_data WHERE employee_group = 'PERMANENT' AND per_no IS NOT NULL AND per_no != ''"
-                query_params = []
-                
-                # Apply all relevant filters to match what we did for EOR data
-                if factory_filter and factory_filter != 'All':
-                    query += " AND factory = %s"
-                    query_params.append(factory_filter)
-                
-                if gender_filter and gender_filter != 'All':
-                    query += " AND gender = %s"
-                    query_params.append(gender_filter)
-                
-                if employee_group_filter:
-                    query += " AND employee_group = %s"
-                    query_params.append(employee_group_filter)
-                
-                if bc_no_filter:
-                    query += " AND bc_no = %s"
-                    query_params.append(bc_no_filter)
-                
-                with conn_any.cursor() as cursor_any:
-                    cursor_any.execute(query, query_params)
-                    results = cursor_any.fetchall()
-                    trained_per_nos_any = {row['per_no'] for row in results}
-            except Exception as e:
-                print(f"Error fetching unique permanent learners for pending EOR: {str(e)}")
-            finally:
-                conn_any.close()
-                
-        # Calculate actual pending EOR (those in EOR but not trained in any training)
-        actual_pending_eor = len(eor_per_nos - trained_per_nos_any) if eor_per_nos else 0
-        eor_count = len(eor_per_nos) if eor_per_nos else 0
-        
-        # Calculate hours metrics with pending EOR count
-        hours_metrics = calculate_hours_metrics(filters, actual_pending_eor)
-        
-        return {
-            'participant_count': total_records,
-            'learning_hours': learning_hours,
-            'unique_learners': unique_learners,
-            'pending_eor_count': actual_pending_eor,  # Accurate count of EOR employees not trained
-            'eor_count': eor_count,  # Total EOR employees
-            'total_records': total_records,
-            'current_fiscal_year': get_fiscal_year(),
-            'target_metrics': target_metrics,
-            'tni_metrics': tni_metrics,
-            'ytd_metrics': {
-                'month_index': month_index,
-                'ytd_target': ytd_target,
-                'ytd_actual': ytd_actual,
-                'balance': balance,
-                'annual_target': annual_target,
-                'percentage_adherence': percentage_adherence
-            },
-            'hours_metrics': hours_metrics  # Add the new metrics
-            }
-            
-    except Exception as e:
-        print(f"Error calculating dashboard metrics: {str(e)}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+    """Calculate dashboard metrics based on filters (aggregated in SQL, see dashboard_metrics)"""
+    return compute_dashboard_metrics(filters)
 
 def get_current_filters(args):
     """Extract current filters from request args"""
@@ -1024,137 +582,11 @@ def get_current_filters(args):
 
 def get_employee_hours_breakdown(filters):
     """Get breakdown of SHE and PMO hours for each employee."""
-    modified_filters = filters.copy()
-    modified_filters['employee_group'] = 'PERMANENT'
-    expected_keys = [
-        'per_no', 'bc_no', 'gender', 'calendar_month', 'month_report_pmo_21_20',
-        'month_cd_key_26_25', 'learning_hours', 'tni_status', 'training_name',
-        'employee_group', 'factory', 'start_date', 'end_date', 'month_range_start',
-        'month_range_end', 'pl_category', 'pmo_training_category', 'fiscal_year'
-    ]
-    for key in expected_keys:
-        modified_filters.setdefault(key, None)
-    base_query, query_params = build_base_query(modified_filters, for_export=True)
-    conn = get_db_connection()
-    if not conn:
-        return {}
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(base_query, query_params)
-            all_records = cursor.fetchall()
-            employees = {}
-            for record in all_records:
-                record_dict = dict(record)
-                per_no = record_dict.get('per_no')
-                if not per_no:
-                    continue
-                hours = calculate_learning_hours(record_dict) or 0
-                category = record_dict.get('pmo_training_category', '')
-                if per_no not in employees:
-                    employees[per_no] = {
-                        'per_no': per_no,
-                        'participants_name': record_dict.get('participants_name', ''),
-                        'bc_no': record_dict.get('bc_no', ''),
-                        'gender': record_dict.get('gender', ''),
-                        'employee_group': record_dict.get('employee_group', ''),
-                        'department': record_dict.get('department', ''),
-                        'factory': record_dict.get('factory', ''),
-                        'she_hours': 0,
-                        'pmo_hours': 0,
-                        'total_hours': 0
-                    }
-                if category == 'SHE (Safety+Health)':
-                    employees[per_no]['she_hours'] += hours
-                else:
-                    employees[per_no]['pmo_hours'] += hours
-                employees[per_no]['total_hours'] += hours
-        
-        return employees
-    except Exception as e:
-        print(f"Error in get_employee_hours_breakdown: {str(e)}")
-        return {}
-    finally:
-        if conn:
-            conn.close()
+    return fetch_employee_hours(filters)
 
 def calculate_hours_metrics(filters, pending_eor_count=0):
     """Calculate metrics for the hours cards"""
-    # Get all permanent employees with their SHE and PMO hours
-    employees = get_employee_hours_breakdown(filters)
-    
-    # Calculate metrics
-    completed_16 = 0  # 6+ SHE and 10+ PMO
-    below_16 = 0
-    she_6plus = 0
-    she_below_6 = 0
-    pmo_10plus = 0
-    pmo_below_10 = 0
-    cumulative_16plus = 0  # SHE + PMO >= 16
-    
-    for emp in employees.values():
-        # SHE metrics
-        if emp['she_hours'] >= 6:
-            she_6plus += 1
-        else:
-            she_below_6 += 1
-        
-        # PMO metrics
-        if emp['pmo_hours'] >= 10:
-            pmo_10plus += 1
-        else:
-            pmo_below_10 += 1
-        
-        # Combined metrics
-        if emp['she_hours'] >= 6 and emp['pmo_hours'] >= 10:
-            completed_16 += 1
-        else:
-            below_16 += 1
-            
-        # Cumulative metric
-        cumulative_hours = emp['she_hours'] + emp['pmo_hours']
-        if cumulative_hours >= 16:
-            cumulative_16plus += 1
-    
-    # Add pending EOR counts to the "below" categories
-    she_below_6 += pending_eor_count
-    pmo_below_10 += pending_eor_count
-    below_16 += pending_eor_count
-    
-    # Update total permanent count to include pending EORs
-    total_permanent = len(employees) + pending_eor_count
-    
-    return {
-        'completed_16_count': completed_16,
-        'below_16_count': below_16,
-        'she_6plus_count': she_6plus,
-        'she_below_6_count': she_below_6,
-        'pmo_10plus_count': pmo_10plus,
-        'pmo_below_10_count': pmo_below_10,
-        'cumulative_16plus_count': cumulative_16plus,
-        'total_permanent': total_permanent
-    }
-
-def get_month_index(month_name=None):
-    """Calculate fiscal month index (April=1, May=2, ..., March=12 but capped at 10)"""
-    fiscal_month_order = ['April', 'May', 'June', 'July', 'August', 'September', 
-                          'October', 'November', 'December', 'January', 'February', 'March']
-    
-    if month_name:
-        try:
-            # Find the index in fiscal order
-            idx = fiscal_month_order.index(month_name) + 1
-            # Cap at 10 for January, February, March
-            return min(idx, 10)
-        except ValueError:
-            # If month not found, fall back to current month
-            pass
-    
-    # If no month provided, use current month
-    current_month = datetime.now().month
-    if current_month >= 4:  # April to December
-        return current_month - 3
-    else:  # January to March
-        return min(current_month + 9, 10)  # Cap at 10 for January
+    return compute_hours_metrics(filters, pending_eor_count)
 
 @view_bp.route('/master_data')
 def view_master_data():
@@ -1182,8 +614,11 @@ def view_master_data():
         'pmo_training_category': request.args.get('pmo_training_category', 'All'),
         'fiscal_year': request.args.get('fiscal_year', str(current_fiscal_year))
     }
-    # Get current page for pagination
-    page = request.args.get('page', 1, type=int)
+    # Keyset cursors for the records table; page only numbers the pages and
+    # restarts at 1 when there is no cursor
+    after_id = request.args.get('after', type=int)
+    before_id = request.args.get('before', type=int)
+    page = max(request.args.get('page', 1, type=int), 1) if (after_id or before_id) else 1
     # Calculate dashboard metrics (uses full dataset)
     dashboard_metrics = calculate_dashboard_metrics(filters) or {
     'participant_count': 0,
@@ -1223,41 +658,18 @@ def view_master_data():
         'total_permanent': 0
     }
 }
-    # Calculate total pages
+    # Calculate total pages from the aggregate row count; no COUNT(*) per page
     total_pages = (dashboard_metrics['total_records'] + RECORDS_PER_PAGE - 1) // RECORDS_PER_PAGE
-    # Get available fiscal years from the database
-    conn = get_db_connection()
-    fiscal_years = []
-    if conn:
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT DISTINCT YEAR(start_date) as year 
-                    FROM master_data 
-                    WHERE start_date IS NOT NULL
-                    ORDER BY year DESC
-                """)
-                years = [row['year'] for row in cursor.fetchall()]
-                
-                # Convert to fiscal years (April-March)
-                fiscal_years = list({get_fiscal_year(datetime(year, 4, 1)) for year in years})
-                fiscal_years.sort(reverse=True)
-                
-                # If no years found, add current fiscal year
-                if not fiscal_years:
-                    fiscal_years = [current_fiscal_year]
-        except Exception as e:
-            print(f"Error fetching fiscal years: {str(e)}")
-            fiscal_years = [current_fiscal_year]
-        finally:
-            conn.close()
-    else:
-        fiscal_years = [current_fiscal_year]
-    category_metrics = get_category_metrics(filters)
-    monthwise_metrics = get_monthwise_ytd_metrics(filters)
+    # Dropdown options come from the materialized filter_options store
+    filter_options = get_filter_options() or {}
+    fiscal_years = filter_options.get('fiscal_year') or [current_fiscal_year]
+    # One cube serves the category, month-wise, annual and PL panels
+    metrics_cube = get_metrics_cube(filters)
+    category_metrics = get_category_metrics(filters, metrics_cube)
+    monthwise_metrics = get_monthwise_ytd_metrics(filters, metrics_cube)
     training_metrics = get_training_wise_metrics(filters)
-    annual_metrics = get_annual_ytd_metrics(filters)
-    pl_category_counts = get_pl_category_counts(filters)
+    annual_metrics = get_annual_ytd_metrics(filters, metrics_cube)
+    pl_category_counts = get_pl_category_counts(filters, metrics_cube)
 
     # Get employee statistics
     eor_stats = get_employee_group_eor_stats(filters)
@@ -1291,6 +703,8 @@ def view_master_data():
         'current_page': page,
         'records_per_page': RECORDS_PER_PAGE,
         'total_pages': total_pages,
+        'next_cursor': None,
+        'prev_cursor': None,
         'total_records': dashboard_metrics['total_records'],
         'fiscal_year_options': fiscal_years,
         'current_fiscal_year': current_fiscal_year,
@@ -1304,37 +718,23 @@ def view_master_data():
         return render_template('admin/master_data_table.html', **template_vars)
     try:
         # Get paginated records for display
-        base_query, query_params = build_base_query(filters)
+        base_query, query_params = build_base_query(filters, after_id=after_id, before_id=before_id)
         
         with conn.cursor() as cursor:
             cursor.execute(base_query, query_params)
-            raw_records = cursor.fetchall()
+            raw_records, next_cursor, prev_cursor = keyset_page(
+                cursor.fetchall(), after_id, before_id, RECORDS_PER_PAGE)
             records = process_records(raw_records)
             
-            # Get unique values for other dropdowns from the database
-            cursor.execute("SELECT DISTINCT calendar_month FROM master_data WHERE calendar_month IS NOT NULL ORDER BY calendar_month")
-            calendar_month_options = [row['calendar_month'] for row in cursor.fetchall()]
-            
-            cursor.execute("SELECT DISTINCT month_report_pmo_21_20 FROM master_data WHERE month_report_pmo_21_20 IS NOT NULL ORDER BY month_report_pmo_21_20")
-            month_report_pmo_options = [row['month_report_pmo_21_20'] for row in cursor.fetchall()]
-            
-            cursor.execute("SELECT DISTINCT month_cd_key_26_25 FROM master_data WHERE month_cd_key_26_25 IS NOT NULL ORDER BY month_cd_key_26_25")
-            month_cd_key_options = [row['month_cd_key_26_25'] for row in cursor.fetchall()]
-            
-            cursor.execute("SELECT DISTINCT learning_hours FROM master_data WHERE learning_hours IS NOT NULL ORDER BY learning_hours")
-            learning_hours_options = [row['learning_hours'] for row in cursor.fetchall()]
-            
-            # Get training names from training_names table (all available training programs)
-            cursor.execute("SELECT DISTINCT Training_Name FROM training_names ORDER BY Training_Name")
-            training_options = [row['Training_Name'] for row in cursor.fetchall()]
-            
             template_vars.update({
                 'records': records,
-                'learning_hours_options': learning_hours_options,
-                'calendar_month_options': calendar_month_options,
-                'month_report_pmo_options': month_report_pmo_options,
-                'month_cd_key_options': month_cd_key_options,
-                'training_options': training_options
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor,
+                'learning_hours_options': filter_options.get('learning_hours', []),
+                'calendar_month_options': filter_options.get('calendar_month', []),
+                'month_report_pmo_options': filter_options.get('month_report_pmo_21_20', []),
+                'month_cd_key_options': filter_options.get('month_cd_key_26_25', []),
+                'training_options': filter_options.get('training_name', [])
             })
         return render_template('admin/master_data_table.html', **template_vars)
     except Exception as e:
@@ -1429,8 +829,8 @@ def download_excel():
                 day2 = bool(record_dict.get('day_2_attendance', False))
                 day3 = bool(record_dict.get('day_3_attendance', False))
                 
-                # Calculate learning hours with fallback to 0 if None
-                record_dict['learning_hours'] = calculate_learning_hours(record_dict) or 0
+                # Learning hours are already computed by the query (learning_hours_sql)
+                record_dict['learning_hours'] = int(record_dict.get('learning_hours') or 0)
                 
                 # Format dates and times with null checks
                 record_dict['start_date'] = format_date(record_dict.get('start_date')) if record_dict.get('start_date') else ''
@@ -1554,49 +954,7 @@ def get_pending_eor_employees(factory=None):
     Returns:
         list: List of dictionaries representing pending EOR employees.
     """
-    # Get EOR data
-    eor_df = load_eor_data(factory)
-    if eor_df.empty:
-        return []
-    # Get unique learners from master_data (permanent) for the same factory
-    conn = get_db_connection()
-    if not conn:
-        return []
-    try:
-        unique_query = """
-            SELECT DISTINCT per_no FROM master_data
-            WHERE employee_group = 'PERMANENT' 
-            AND per_no IS NOT NULL
-            AND per_no != ''
-        """
-        query_params = []
-        if factory and factory != 'All':
-            unique_query += " AND factory = %s"
-            query_params.append(factory)
-        with conn.cursor() as cursor:
-            cursor.execute(unique_query, query_params)
-            unique_learners = {row['per_no'] for row in cursor.fetchall()}
-        # Filter EOR data to get pending records
-        pending_eor_df = eor_df[~eor_df['per_no'].isin(unique_learners)]
-        # Convert to list of dictionaries
-        pending_employees = []
-        for _, row in pending_eor_df.iterrows():
-            emp = {
-                'per_no': row['per_no'],
-                'participants_name': row.get('participants_name', ''),
-                'bc_no': row.get('bc_no', ''),
-                'gender': row.get('gender', ''),
-                'employee_group': row.get('employee_group', ''),
-                'department': row.get('department', ''),
-                'factory': row.get('factory', '')
-            }
-            pending_employees.append(emp)
-        return pending_employees
-    except Exception as e:
-        print(f"Error getting pending EOR employees: {str(e)}")
-        return []
-    finally:
-        conn.close()
+    return pending_eor.get_pending_eor_employees({'factory': factory})
 
 @view_bp.route('/download_eor_data')
 def download_eor_data():
@@ -1664,7 +1022,6 @@ def download_eor_data():
 @view_bp.route('/download_pending_eor')
 def download_pending_eor():
     """Download Excel of pending EOR (EOR count - unique learners)"""
-    conn = None
     try:
         # Get current fiscal year
         current_fiscal_year = get_fiscal_year()
@@ -1675,61 +1032,12 @@ def download_pending_eor():
             'fiscal_year': request.args.get('fiscal_year', str(current_fiscal_year))
         }
         
-        # Get EOR data from database
-        conn_eor = get_db_connection()
-        if not conn_eor:
-            flash("Database connection failed", "error")
-            return redirect(url_for('view_bp.view_master_data'))
-        try:
-            query = "SELECT per_no, participants_name, bc_no, gender, employee_group, department, factory FROM eor_data WHERE 1=1"
-            query_params = []
-            
-            factory_filter = filters.get('factory')
-            if factory_filter and factory_filter != 'All':
-                query += " AND factory = %s"
-                query_params.append(factory_filter)
-                
-            with conn_eor.cursor() as cursor:
-                cursor.execute(query, query_params)
-                eor_records = cursor.fetchall()
-                
-            if not eor_records:
-                flash("EOR data not available", "error")
-                return redirect(url_for('view_bp.view_master_data'))
-                
-            # Convert to DataFrame for consistency with existing code
-            eor_df = pd.DataFrame(eor_records)
-            
-        finally:
-            conn_eor.close()
-        
-        # Get unique learners from master_data
-        unique_query = """
-            SELECT DISTINCT per_no, participants_name, bc_no, gender, 
-                   employee_group, department, factory
-            FROM master_data
-            WHERE employee_group = 'PERMANENT' 
-            AND per_no IS NOT NULL
-            AND per_no != ''
-        """
-        unique_params = []
-        
-        # Apply factory filter to unique learners query
-        if factory_filter and factory_filter != 'All':
-            unique_query += " AND factory = %s"
-            unique_params.append(factory_filter)
-        
-        conn = get_db_connection()
-        if not conn:
-            flash("Database connection failed.", "error")
+        if not get_eor_count(filters.get('factory')):
+            flash("EOR data not available", "error")
             return redirect(url_for('view_bp.view_master_data'))
         
-        with conn.cursor() as cursor:
-            cursor.execute(unique_query, unique_params)
-            unique_learners = {row['per_no'] for row in cursor.fetchall()}
-        
-        # Filter EOR data to get pending records (not in unique learners)
-        pending_eor_df = eor_df[~eor_df['per_no'].isin(unique_learners)]
+        # Pending EOR rows stream from the database anti-join into the sheet
+        pending_employees = pending_eor.iter_pending_eor({'factory': filters.get('factory')})
         
         # Define columns
         columns = [
@@ -1744,11 +1052,8 @@ def download_pending_eor():
         ]
         
         # Process records for export
-        processed_records = []
-        for row_num, (_, row) in enumerate(pending_eor_df.iterrows(), 1):
-            record_dict = dict(row)
-            record_dict['sr_no'] = row_num
-            processed_records.append(record_dict)
+        processed_records = (dict(record, sr_no=row_num)
+                             for row_num, record in enumerate(pending_employees, 1))
         
         # Create workbook
         column_headings = {key: header for key, header in columns}
@@ -1777,19 +1082,12 @@ def download_pending_eor():
     except Exception as e:
         flash(f"Error generating pending EOR report: {str(e)}", "error")
         return redirect(url_for('view_bp.view_master_data'))
-    finally:
-        if conn:
-            conn.close()
             
 # Generic download functions to reduce code duplication
 def download_filtered_hours_report(min_hours=None, max_hours=None, category_filter=None,
                                    exclude_she=False, title=None, filename_prefix=None,
                                    include_pending_eor=False):
     """Download filtered hours reports using same aggregation logic as metrics (grouped per unique per_no)."""
-    conn = get_db_connection()
-    if not conn:
-        flash("Database connection failed.", "error")
-        return redirect(url_for('view_bp.view_master_data'))
     try:
         # Get current filters (fiscal year, etc.)
         filters = get_current_filters(request.args)
@@ -1895,15 +1193,11 @@ def download_filtered_hours_report(min_hours=None, max_hours=None, category_filt
         print(f"Error generating {title}: {str(e)}")
         flash(f"Error generating report: {str(e)}", "error")
         return redirect(url_for('view_bp.view_master_data'))
-    finally:
-        if conn:
-            conn.close()
 
 def download_combined_hours_report(she_min_hours=6, pmo_min_hours=10, incomplete_only=False,
                                  title=None, filename_prefix=None,
                                  include_pending_eor=False):
     """Download Excel of employees with combined SHE and PMO hours"""
-    conn = None
     try:
         # Get current filters
         filters = get_current_filters(request.args)
@@ -2015,16 +1309,9 @@ def download_combined_hours_report(she_min_hours=6, pmo_min_hours=10, incomplete
         print(f"Error generating {title}: {str(e)}")  # Add debugging
         flash(f"Error generating report: {str(e)}", "error")
         return redirect(url_for('view_bp.view_master_data'))
-    finally:
-        if conn:
-            conn.close()
 
 def download_cumulative_hours_report(min_hours=None, title=None, filename_prefix=None):
     """Download cumulative hours reports (SHE + PMO) - Only for 16+ hours"""
-    conn = get_db_connection()
-    if not conn:
-        flash("Database connection failed.", "error")
-        return redirect(url_for('view_bp.view_master_data'))
     try:
         # Get current filters
         filters = get_current_filters(request.args)
@@ -2105,9 +1392,6 @@ def download_cumulative_hours_report(min_hours=None, title=None, filename_prefix
         print(f"Error generating {title}: {str(e)}")
         flash(f"Error generating report: {str(e)}", "error")
         return redirect(url_for('view_bp.view_master_data'))
-    finally:
-        if conn:
-            conn.close()
 
 # Specific download routes using the generic functions
 @view_bp.route('/download_she_6plus_hours')
@@ -2603,413 +1887,29 @@ def download_tni_remaining():
         if conn:
             conn.close()
 
-def get_pl_category_counts(filters):
+def get_pl_category_counts(filters, cube=None):
     """Get counts of unique permanent learners by PL category with annual targets and YTD metrics"""
-    conn = get_db_connection()
-    if not conn:
-        return {
-            'PL1': {
-                'unique_learners_count': 0,
-                'annual_target': 0,
-                'ytd_coverage': 0,
-                'ytd_target': 0,
-                'adherence': 0
-            },
-            'PL2': {
-                'unique_learners_count': 0,
-                'annual_target': 0,
-                'ytd_coverage': 0,
-                'ytd_target': 0,
-                'adherence': 0
-            },
-            'PL3': {
-                'unique_learners_count': 0,
-                'annual_target': 0,
-                'ytd_coverage': 0,
-                'ytd_target': 0,
-                'adherence': 0
-            }
-        }
-    
-    try:
-        # Build query to get counts by PL category for permanent employees
-        query = """
-            SELECT 
-                pl_category,
-                COUNT(DISTINCT per_no) as count
-            FROM master_data
-            WHERE employee_group = 'PERMANENT'
-            AND per_no IS NOT NULL
-            AND per_no != ''
-        """
-        query_params = []
-        
-        # Apply all filters
-        query, query_params = apply_standard_filters(query, query_params, filters)
-        
-        # Group by PL category
-        query += " GROUP BY pl_category"
-        
-        with conn.cursor() as cursor:
-            cursor.execute(query, query_params)
-            results = cursor.fetchall()
-            
-            # Initialize counts
-            counts = {'PL1': 0, 'PL2': 0, 'PL3': 0}
-            
-            # Update counts from results
-            for row in results:
-                pl_category = row['pl_category']
-                if pl_category in counts:
-                    counts[pl_category] = row['count']
-            
-            # Get current month index
-            month_index = get_month_index()
-            
-            # Initialize result dictionary with additional metrics
-            pl_metrics = {}
-            
-            # For each PL category, get annual target and YTD metrics
-            for category in ['PL1', 'PL2', 'PL3']:
-                # Create category-specific filters
-                category_filters = filters.copy()
-                category_filters['pl_category'] = category
-                
-                # Get dashboard metrics for this category
-                dashboard_metrics = calculate_dashboard_metrics(category_filters)
-                
-                if dashboard_metrics:
-                    annual_target = dashboard_metrics['target_metrics']['target']
-                    ytd_actual = dashboard_metrics['ytd_metrics']['ytd_actual']
-                    
-                    # Calculate YTD target
-                    if annual_target > 0 and month_index > 0:
-                        ytd_target = (annual_target / 10) * month_index
-                    else:
-                        ytd_target = 0
-                    
-                    # Calculate adherence percentage
-                    adherence = 0
-                    if ytd_target > 0:
-                        # REMOVED: adherence = min((ytd_actual / ytd_target) * 100, 100)
-                        adherence = (ytd_actual / ytd_target) * 100  # Allow values above 100%
-                    
-                    pl_metrics[category] = {
-                        'unique_learners_count': counts[category],
-                        'annual_target': annual_target,
-                        'ytd_coverage': ytd_actual,
-                        'ytd_target': int(ytd_target),
-                        'adherence': round(adherence, 1)
-                    }
-                else:
-                    # If no metrics available, use zeros
-                    pl_metrics[category] = {
-                        'unique_learners_count': counts[category],
-                        'annual_target': 0,
-                        'ytd_coverage': 0,
-                        'ytd_target': 0,
-                        'adherence': 0
-                    }
-            
-            return pl_metrics
-            
-    except Exception as e:
-        print(f"Error getting PL category counts: {str(e)}")
-        return {
-            'PL1': {
-                'unique_learners_count': 0,
-                'annual_target': 0,
-                'ytd_coverage': 0,
-                'ytd_target': 0,
-                'adherence': 0
-            },
-            'PL2': {
-                'unique_learners_count': 0,
-                'annual_target': 0,
-                'ytd_coverage': 0,
-                'ytd_target': 0,
-                'adherence': 0
-            },
-            'PL3': {
-                'unique_learners_count': 0,
-                'annual_target': 0,
-                'ytd_coverage': 0,
-                'ytd_target': 0,
-                'adherence': 0
-            }
-        }
-    finally:
-        if conn:
-            conn.close()
+    return compute_pl_category_counts(cube or get_metrics_cube(filters))
 
 from datetime import datetime
 
-def get_category_metrics(filters):
+def get_category_metrics(filters, cube=None):
     """Calculate category-wise metrics for training categories"""
-    categories = ['PMO', 'CESS', 'Digital', 'Functional Skills', 
-                 'Professional Skills', 'SHE (Safety+Health)', 'Sustainability']
-    
-    conn = None
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return []
-        
-        # Get current fiscal month number (1=April, 12=March)
-        now = datetime.now()
-        fiscal_year_start_month = 4  # April
-        fiscal_month_index = (now.month - fiscal_year_start_month + 12) % 12 + 1
-        
-        # Get Permanent EOR count
-        eor_per_nos = set()
-        query = "SELECT DISTINCT per_no FROM eor_data WHERE employee_group = 'Permanent'"
-        query_params = []
-        
-        factory_filter = filters.get('factory')
-        if factory_filter and factory_filter != 'All':
-            query += " AND factory = %s"
-            query_params.append(factory_filter)
-            
-        with conn.cursor() as cursor:
-            cursor.execute(query, query_params)
-            eor_results = cursor.fetchall()
-            eor_per_nos = {row['per_no'] for row in eor_results if row['per_no']}
-        
-        permanent_eor_count = len(eor_per_nos)
-        # ✅ Calculate EOR YTD Target
-        eor_ytd_target = int((permanent_eor_count / 10) * fiscal_month_index)
-        
-        # ---- Rest of your existing code ----
-        trained_per_nos_any = set()
-        query = "SELECT DISTINCT per_no FROM master_data WHERE employee_group = 'PERMANENT' AND per_no IS NOT NULL AND per_no != ''"
-        query_params = []
-        if factory_filter and factory_filter != 'All':
-            query += " AND factory = %s"
-            query_params.append(factory_filter)
-            
-        with conn.cursor() as cursor:
-            cursor.execute(query, query_params)
-            results = cursor.fetchall()
-            trained_per_nos_any = {row['per_no'] for row in results}
-        
-        actual_pending_eor = len(eor_per_nos - trained_per_nos_any) if eor_per_nos else 0
-        all_employees = get_employee_hours_breakdown(filters)
-        
-        completed_16_employees = set()
-        for per_no, emp in all_employees.items():
-            if emp['she_hours'] >= 6 and emp['pmo_hours'] >= 10:
-                completed_16_employees.add(per_no)
-        
-        category_employees_map = {}
-        for category in categories:
-            category_filters = filters.copy()
-            category_filters['pmo_training_category'] = category
-            
-            query = """
-                SELECT DISTINCT per_no 
-                FROM master_data 
-                WHERE employee_group = 'PERMANENT' 
-                AND per_no IS NOT NULL 
-                AND per_no != ''
-            """
-            query_params = []
-            query, query_params = apply_standard_filters(query, query_params, category_filters)
-            
-            with conn.cursor() as cursor:
-                cursor.execute(query, query_params)
-                emp_results = cursor.fetchall()
-                category_employees_map[category] = {row['per_no'] for row in emp_results}
-        
-        results = []
-        
-        for category in categories:
-            category_filters = filters.copy()
-            category_filters['pmo_training_category'] = category
-            
-            metrics = calculate_dashboard_metrics(category_filters)
-            hours_metrics = calculate_hours_metrics(category_filters, 0)
-            pl_counts = get_pl_category_counts(category_filters)
-            
-            completed_16_in_category = len(completed_16_employees & category_employees_map[category])
-            
-            if metrics and hours_metrics:
-                annual_target = metrics['target_metrics']['target']
-                ytd_target = metrics['ytd_metrics']['ytd_target']
-                ytd_actual = metrics['ytd_metrics']['ytd_actual']
-                
-                adherence = (ytd_actual / ytd_target * 100) if ytd_target > 0 else 0
-                tni_total_count = metrics['tni_metrics']['tni_total_count']
-                tni_matched_count = metrics['tni_metrics']['matched_count']
-                tni_adherence = (tni_matched_count / tni_total_count * 100) if tni_total_count > 0 else 0
-                unique_learners = metrics['unique_learners']
-                ul_adherence = (unique_learners / permanent_eor_count * 100) if permanent_eor_count > 0 else 0
-                
-                results.append({
-                    'category': category,
-                    'annual_target': annual_target,
-                    'ytd_target': ytd_target,
-                    'ytd_actual': ytd_actual,
-                    'adherence': round(adherence, 1),
-                    'unique_learners': unique_learners,
-                    'learning_hours': metrics['learning_hours'],
-                    'eor_count': permanent_eor_count,
-                    'pending_eor_count': actual_pending_eor,
-                    'permanent_eor_count': permanent_eor_count,
-                    'eor_ytd_target': eor_ytd_target,  # ✅ ADD THIS
-                    'tni_total_count': tni_total_count,
-                    'tni_matched_count': tni_matched_count,
-                    'tni_adherence': round(tni_adherence, 1),
-                    'ul_adherence': round(ul_adherence, 1),
-                    'pl1_count': pl_counts.get('PL1', 0),
-                    'pl2_count': pl_counts.get('PL2', 0),
-                    'pl3_count': pl_counts.get('PL3', 0),
-                    'she_6plus_count': hours_metrics.get('she_6plus_count', 0),
-                    'she_below_6_count': hours_metrics.get('she_below_6_count', 0),
-                    'pmo_10plus_count': hours_metrics.get('pmo_10plus_count', 0),
-                    'pmo_below_10_count': hours_metrics.get('pmo_below_10_count', 0),
-                    'completed_16_count': completed_16_in_category,
-                    'cumulative_16plus_count': hours_metrics.get('cumulative_16plus_count', 0),
-                    'below_16_count': hours_metrics.get('below_16_count', 0),
-                    'total_permanent': hours_metrics.get('total_permanent', 0)
-                })
-            else:
-                results.append({
-                    'category': category,
-                    'annual_target': 0,
-                    'ytd_target': 0,
-                    'ytd_actual': 0,
-                    'adherence': 0,
-                    'unique_learners': 0,
-                    'learning_hours': 0,
-                    'eor_count': permanent_eor_count,
-                    'pending_eor_count': actual_pending_eor,
-                    'permanent_eor_count': permanent_eor_count,
-                    'eor_ytd_target': eor_ytd_target,  # ✅ ADD THIS HERE TOO
-                    'tni_total_count': 0,
-                    'tni_matched_count': 0,
-                    'tni_adherence': 0,
-                    'ul_adherence': 0,
-                    'pl1_count': 0,
-                    'pl2_count': 0,
-                    'pl3_count': 0,
-                    'she_6plus_count': 0,
-                    'she_below_6_count': 0,
-                    'pmo_10plus_count': 0,
-                    'pmo_below_10_count': 0,
-                    'completed_16_count': 0,
-                    'cumulative_16plus_count': 0,
-                    'below_16_count': 0,
-                    'total_permanent': 0
-                })
-        
-        return results
-        
-    except Exception as e:
-        print(f"Error calculating category metrics: {str(e)}")
-        return []
-    finally:
-        if conn:
-            conn.close()
-
+    return compute_category_metrics(cube or get_metrics_cube(filters))
 
-def get_monthwise_ytd_metrics(filters):
+def get_monthwise_ytd_metrics(filters, cube=None):
     """Calculate month-wise YTD target and coverage for the fiscal year"""
-    # Create a copy of filters and remove month-specific filters for the chart
-    chart_filters = filters.copy()
-    chart_filters.pop('calendar_month', None)
-    chart_filters.pop('month_range_start', None)
-    chart_filters.pop('month_range_end', None)
-    chart_filters.pop('month_report_pmo_21_20', None)
-    chart_filters.pop('month_cd_key_26_25', None)
-    
-    # Get the annual target from dashboard metrics using modified filters
-    dashboard_metrics = calculate_dashboard_metrics(chart_filters)
-    annual_target = dashboard_metrics['target_metrics']['target'] if dashboard_metrics else 0
-    
-    # Define fiscal year month order (April to March)
-    fiscal_month_order = ['April', 'May', 'June', 'July', 'August', 'September', 
-                          'October', 'November', 'December', 'January', 'February', 'March']
-    
-    # Initialize monthly counts
-    monthly_counts = {month: 0 for month in fiscal_month_order}
-    
-    # Get monthly actual counts from database
-    conn = get_db_connection()
-    if not conn:
-        return []
-    
-    try:
-        # Build query to get monthly counts
-        query = """
-            SELECT calendar_month, COUNT(id) as count
-            FROM master_data
-            WHERE 1=1
-        """
-        query_params = []
-        
-        # Apply fiscal year filter
-        query, query_params = apply_fiscal_year_filter(query, query_params, chart_filters.get('fiscal_year'))
-        
-        # Apply other filters (using chart_filters which excludes month filters)
-        query, query_params = apply_standard_filters(query, query_params, chart_filters)
-        
-        # Group by calendar month
-        query += " GROUP BY calendar_month"
-        
-        with conn.cursor() as cursor:
-            cursor.execute(query, query_params)
-            results = cursor.fetchall()
-            
-            # Update monthly counts from results
-            for row in results:
-                month = row['calendar_month']
-                if month in monthly_counts:
-                    monthly_counts[month] = row['count']
-        
-        # Calculate cumulative metrics for each month
-        results = []
-        cumulative_coverage = 0
-        
-        for i, month in enumerate(fiscal_month_order, 1):
-            # Get count for this month
-            monthly_count = monthly_counts[month]
-            cumulative_coverage += monthly_count
-            
-            # Calculate month index (capped at 10)
-            month_index = i
-            capped_index = min(month_index, 10)
-            
-            # Calculate YTD target for this month
-            if annual_target > 0:
-                ytd_target = (annual_target / 10) * capped_index
-            else:
-                ytd_target = 0
-            
-            # Calculate adherence percentage
-            adherence = 0
-            if ytd_target > 0:
-                # REMOVED: adherence = min((cumulative_coverage / ytd_target) * 100, 100)
-                adherence = (cumulative_coverage / ytd_target) * 100  # Allow values above 100%
-            
-            results.append({
-                'month': month,
-                'ytd_target': int(ytd_target),
-                'ytd_coverage': cumulative_coverage,
-                'adherence': round(adherence, 1),
-                'monthly_count': monthly_count
-            })
-        
-        return results
-        
-    except Exception as e:
-        print(f"Error calculating month-wise YTD metrics: {str(e)}")
-        return []
-    finally:
-        if conn:
-            conn.close()
-            
-def get_training_wise_metrics(filters):
-    """Get metrics for each individual training name including annual target, YTD coverage, and adherence"""
+    return compute_monthwise_ytd_metrics(cube or get_metrics_cube(filters))
+
+def get_training_wise_metrics(filters, batched=True):
+    """Get metrics for each individual training name including annual target, YTD coverage, and adherence.
+
+    The batched mode answers every training from grouped queries; pass
+    batched=False to recompute the full dashboard metrics per training.
+    """
+    if batched:
+        return compute_training_wise_metrics(filters)
+
     conn = get_db_connection()
     if not conn:
         return []
@@ -3023,7 +1923,14 @@ def get_training_wise_metrics(filters):
                 ORDER BY Training_Name
             """)
             trainings = cursor.fetchall()
-        
+    except Exception as e:
+        print(f"Error getting training-wise metrics: {str(e)}")
+        return []
+    finally:
+        # Release it before calculate_dashboard_metrics checks out its own
+        conn.close()
+
+    try:
         results = []
         
         for training in trainings:
@@ -3070,15 +1977,17 @@ def get_training_wise_metrics(filters):
     except Exception as e:
         print(f"Error getting training-wise metrics: {str(e)}")
         return []
-    finally:
-        if conn:
-            conn.close()
             
+def empty_eor_stats(filters):
+    """EOR stats shown when they cannot be computed"""
+    return {'total_eor_count': 0, 'employee_category_breakdown': {}}
+
+@cached_metrics(fallback=empty_eor_stats)
 def get_employee_group_eor_stats(filters):
     """Get EOR count total and breakdown by employee category and gender"""
     conn = get_db_connection()
     if not conn:
-        return {'total_eor_count': 0, 'employee_category_breakdown': {}}
+        return None
     
     try:
         query = """
@@ -3136,20 +2045,25 @@ def get_employee_group_eor_stats(filters):
             
     except Exception as e:
         print(f"Error getting EOR stats: {str(e)}")
-        return {'total_eor_count': 0, 'employee_category_breakdown': {}}
+        return None
     finally:
         if conn:
             conn.close()
 
+def empty_unique_learners(filters):
+    """Unique learner figures shown when they cannot be computed"""
+    return {
+        'total_unique_learners': 0, 'male_count': 0, 'female_count': 0,
+        'total_eor_count': 0, 'male_eor_count': 0, 'female_eor_count': 0,
+        'eor_ytd_target': 0
+    }
+
+@cached_metrics(fallback=empty_unique_learners)
 def get_unique_learners_permanent(filters):
     """Get unique learners count for permanent employees only, including EOR count"""
     conn = get_db_connection()
     if not conn:
-        return {
-            'total_unique_learners': 0, 'male_count': 0, 'female_count': 0,
-            'total_eor_count': 0, 'male_eor_count': 0, 'female_eor_count': 0,
-            'eor_ytd_target': 0
-        }
+        return None
     try:
         # --- Unique Learners query ---
         query = """
@@ -3236,74 +2150,12 @@ def get_unique_learners_permanent(filters):
         }
     except Exception as e:
         print(f"Error getting unique learners: {str(e)}")
-        return {
-            'total_unique_learners': 0, 'male_count': 0, 'female_count': 0,
-            'total_eor_count': 0, 'male_eor_count': 0, 'female_eor_count': 0,
-            'eor_ytd_target': 0
-        }
+        return None
     finally:
         if conn:
             conn.close()
 
 
-def get_annual_ytd_metrics(filters):
+def get_annual_ytd_metrics(filters, cube=None):
     """Calculate overall annual target and YTD coverage for the fiscal year"""
-    chart_filters = filters.copy()
-    chart_filters.pop('calendar_month', None)
-    chart_filters.pop('month_range_start', None)
-    chart_filters.pop('month_range_end', None)
-    chart_filters.pop('month_report_pmo_21_20', None)
-    chart_filters.pop('month_cd_key_26_25', None)
-    
-    dashboard_metrics = calculate_dashboard_metrics(chart_filters)
-    annual_target = dashboard_metrics['target_metrics']['target'] if dashboard_metrics else 0
-    month_index = get_month_index()
-    ytd_coverage = 0
-    
-    conn = get_db_connection()
-    if not conn:
-        return {
-            'annual_target': annual_target,
-            'ytd_coverage': 0,
-            'ytd_target': 0,
-            'month_index': month_index
-        }
-    
-    try:
-        query = """
-            SELECT COUNT(id) as count
-            FROM master_data
-            WHERE 1=1
-        """
-        query_params = []
-        query, query_params = apply_fiscal_year_filter(query, query_params, chart_filters.get('fiscal_year'))
-        query, query_params = apply_standard_filters(query, query_params, chart_filters)
-        
-        with conn.cursor() as cursor:
-            cursor.execute(query, query_params)
-            result = cursor.fetchone()
-            ytd_coverage = result['count'] if result else 0
-        
-        if annual_target > 0 and month_index > 0:
-            ytd_target = (annual_target / 10) * month_index
-        else:
-            ytd_target = 0
-        
-        return {
-            'annual_target': annual_target,
-            'ytd_coverage': ytd_coverage,
-            'ytd_target': int(ytd_target),
-            'month_index': month_index
-        }
-        
-    except Exception as e:
-        print(f"Error calculating annual YTD metrics: {str(e)}")
-        return {
-            'annual_target': annual_target,
-            'ytd_coverage': 0,
-            'ytd_target': 0,
-            'month_index': month_index
-        }
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+    return compute_annual_ytd_metrics(cube or get_metrics_cube(filters))